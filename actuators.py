@@ -0,0 +1,131 @@
+import threading
+import time
+from typing import Any, Callable
+
+MISSING = object()
+
+
+class Device:
+    """An output device and the values waiting to be written to it."""
+
+    def __init__(self, name: str, write: Callable[[Any, Any], None], max_rate: float = 0):
+        self.name = name
+        self.write = write
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self.pending = {}
+        self.written = {}
+        self.next_write = 0.0
+        self.writes = 0
+        self.coalesced = 0
+        self.unchanged = 0
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self.pending),
+            "writes": self.writes,
+            "coalesced": self.coalesced,
+            "unchanged": self.unchanged,
+        }
+
+
+class Scheduler:
+    """Coalescing, rate-limited writer for slow actuators.
+
+    submit() only records the newest value for a device key (a servo
+    channel, an LCD row...) and returns at once. A worker thread writes
+    each device at most max_rate times a second, writing only the latest
+    value per key and skipping keys whose value hasn't changed since it
+    was last written.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.devices = {}
+        self.condition = threading.Condition()
+        self.thread = None
+        self.running = False
+
+    def add_device(self, name: str, write: Callable[[Any, Any], None], max_rate: float = 0) -> Device:
+        device = Device(name, write, max_rate)
+        self.devices[name] = device
+        return device
+
+    def submit(self, name: str, key, value):
+        with self.condition:
+            device = self.devices[name]
+            if key in device.pending:
+                device.coalesced += 1
+            device.pending[key] = value
+            self.condition.notify()
+
+    def forget(self, name: str):
+        """Forget what was last written, e.g. after the device was driven directly."""
+        with self.condition:
+            self.devices[name].written.clear()
+
+    def run_pending(self) -> float | None:
+        """Write whatever is due now.
+
+        Returns the seconds until the next write falls due, or None if
+        nothing is waiting.
+        """
+        due = []
+        wait = None
+        with self.condition:
+            now = self.clock()
+            for device in self.devices.values():
+                if not device.pending:
+                    continue
+                if now < device.next_write:
+                    remaining = device.next_write - now
+                    wait = remaining if wait is None else min(wait, remaining)
+                    continue
+                due.append((device, device.pending))
+                device.pending = {}
+                device.next_write = now + device.min_interval
+
+        for device, values in due:
+            for key, value in values.items():
+                if device.written.get(key, MISSING) == value:
+                    device.unchanged += 1
+                    continue
+                try:
+                    device.write(key, value)
+                except Exception as e:
+                    print(f"Failed to write {value!r} to {device.name} {key}: {e}")
+                    continue
+                device.written[key] = value
+                device.writes += 1
+        return wait
+
+    def worker(self):
+        while True:
+            wait = self.run_pending()
+            with self.condition:
+                if not self.running:
+                    return
+                if not any(device.pending for device in self.devices.values()):
+                    self.condition.wait()
+                elif wait is not None:
+                    self.condition.wait(wait)
+
+    def start(self) -> "Scheduler":
+        self.running = True
+        self.thread = threading.Thread(target=self.worker, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+        # Flush whatever was left, ignoring the rate limits
+        for device in self.devices.values():
+            device.next_write = 0.0
+        self.run_pending()
+
+    def stats(self) -> dict:
+        with self.condition:
+            return {name: device.stats() for name, device in self.devices.items()}
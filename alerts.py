@@ -0,0 +1,230 @@
+"""Streaming threshold and anomaly detection over decoded frames.
+
+Each watched field of each callsign keeps a handful of running statistics,
+all updated in constant time per frame so detection keeps up with a full
+rate replay of an archive as well as live beacons:
+
+    ewma / deviation   exponentially weighted mean and standard deviation
+    minimum / maximum  over the last `window` frames, from a ring buffer
+    change             difference from the previous frame's value
+
+Events are published as JSON to cubesatsim/alerts when a field crosses a
+configured threshold, jumps by more than its change limit, or strays more
+than `zscore` deviations from its EWMA. An alert fires once on entering
+that state and publishes a "cleared" event when it leaves, so a field
+sitting out of range doesn't repeat itself every frame. Changes are per
+frame rather than per second because frame timestamps are decode times,
+which would make every rate meaningless during a replay.
+"""
+
+from array import array
+from collections import deque
+import json
+import math
+import re
+
+from metrics import ALERTS
+
+# Fields that are watched unless told otherwise: the battery and the panel
+# voltages, and the BME280 environment readings
+WATCHED_FIELDS = re.compile(r"battery_.*|.*_voltage|bme_.*")
+
+
+class Rule:
+    """Limits for one field; any of them may be left out."""
+
+    def __init__(self, field: str, low: float | None = None, high: float | None = None, change: float | None = None):
+        self.field = field
+        self.low = low
+        self.high = high
+        self.change = change
+
+    def __repr__(self):
+        return f"Rule({self.field!r}, {self.low!r}, {self.high!r}, {self.change!r})"
+
+
+def parse_rule(spec: str) -> Rule:
+    """Parse "FIELD:LOW:HIGH[:CHANGE]", where any limit may be empty."""
+    field, *limits = spec.split(":")
+    if not field or not 1 <= len(limits) <= 3:
+        raise ValueError(f"Alert rule {spec!r} isn't FIELD:LOW:HIGH[:CHANGE]")
+    try:
+        values = [float(limit) if limit else None for limit in limits]
+    except ValueError:
+        raise ValueError(f"Alert rule {spec!r} has a limit that isn't a number") from None
+    return Rule(field, *values)
+
+
+class RollingExtremes:
+    """Minimum and maximum of the last `size` values.
+
+    Values live in a fixed-size ring buffer; two monotonic queues of
+    buffer positions make each update amortised O(1).
+    """
+
+    __slots__ = ("values", "count", "minima", "maxima")
+
+    def __init__(self, size: int):
+        self.values = array("d", bytes(8 * size))
+        self.count = 0
+        self.minima = deque()
+        self.maxima = deque()
+
+    def add(self, value: float):
+        # An int's __le__ returns NotImplemented, which is truthy, for a float
+        value = float(value)
+        size = len(self.values)
+        position = self.count
+        self.values[position % size] = value
+        self.count += 1
+        oldest = self.count - size
+        for queue, better in ((self.minima, value.__le__), (self.maxima, value.__ge__)):
+            while queue and better(self.values[queue[-1] % size]):
+                queue.pop()
+            queue.append(position)
+            if queue[0] < oldest:
+                queue.popleft()
+
+    @property
+    def minimum(self) -> float:
+        return self.values[self.minima[0] % len(self.values)]
+
+    @property
+    def maximum(self) -> float:
+        return self.values[self.maxima[0] % len(self.values)]
+
+
+class FieldStats:
+    __slots__ = ("alpha", "count", "ewma", "variance", "last", "change", "extremes")
+
+    def __init__(self, window: int, alpha: float):
+        self.alpha = alpha
+        self.count = 0
+        self.ewma = 0.0
+        self.variance = 0.0
+        self.last = None
+        self.change = 0.0
+        self.extremes = RollingExtremes(window)
+
+    def deviation(self) -> float:
+        return math.sqrt(self.variance)
+
+    def add(self, value: float):
+        if self.count:
+            self.change = value - self.last
+            difference = value - self.ewma
+            increment = self.alpha * difference
+            self.ewma += increment
+            self.variance = (1 - self.alpha) * (self.variance + difference * increment)
+        else:
+            self.ewma = value
+        self.last = value
+        self.count += 1
+        self.extremes.add(value)
+
+    def summary(self) -> dict:
+        return {
+            "ewma": self.ewma,
+            "deviation": self.deviation(),
+            "minimum": self.extremes.minimum,
+            "maximum": self.extremes.maximum,
+            "change": self.change,
+        }
+
+
+class AlertEngine:
+    def __init__(
+        self,
+        rules: list[Rule] | None = None,
+        window: int = 60,
+        alpha: float = 0.1,
+        zscore: float = 4.0,
+        warmup: int = 10,
+        fields: re.Pattern = WATCHED_FIELDS,
+    ):
+        self.rules = {rule.field: rule for rule in rules or ()}
+        self.window = window
+        self.alpha = alpha
+        self.zscore = zscore
+        self.warmup = warmup
+        self.fields = fields
+        self.stats = {}
+        self.active = set()
+        self.watched = {}
+
+    def is_watched(self, field: str) -> bool:
+        watched = self.watched.get(field)
+        if watched is None:
+            watched = self.watched[field] = field in self.rules or bool(self.fields.fullmatch(field))
+        return watched
+
+    def check(self, stats: FieldStats, rule: Rule | None, value: float) -> dict:
+        """Return the conditions this value is in, with the limit each broke."""
+        conditions = {}
+        if rule is not None:
+            if rule.low is not None and value < rule.low:
+                conditions["below"] = rule.low
+            if rule.high is not None and value > rule.high:
+                conditions["above"] = rule.high
+            if rule.change is not None and stats.count and abs(value - stats.last) > rule.change:
+                conditions["change"] = rule.change
+        if self.zscore and stats.count >= self.warmup:
+            deviation = stats.deviation()
+            if deviation and abs(value - stats.ewma) > self.zscore * deviation:
+                conditions["anomaly"] = self.zscore
+        return conditions
+
+    def update(self, data: dict) -> list[dict]:
+        """Feed a decoded frame in and return the events it raised or cleared."""
+        callsign = data.get("callsign", "")
+        events = []
+        for field, value in data.items():
+            if not isinstance(value, (int, float)) or not self.is_watched(field):
+                continue
+            key = (callsign, field)
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = FieldStats(self.window, self.alpha)
+
+            # Judge the value against the statistics from before it arrived
+            conditions = self.check(stats, self.rules.get(field), value)
+            stats.add(value)
+            for kind in ("below", "above", "change", "anomaly"):
+                state = (callsign, field, kind)
+                if kind in conditions and state not in self.active:
+                    self.active.add(state)
+                    events.append(self.event(data, field, kind, "raised", value, stats, conditions[kind]))
+                elif kind not in conditions and state in self.active:
+                    self.active.discard(state)
+                    events.append(self.event(data, field, kind, "cleared", value, stats))
+        return events
+
+    def event(self, data, field, kind, status, value, stats, limit=None) -> dict:
+        ALERTS.inc(f"{kind}_{status}")
+        event = {
+            "callsign": data.get("callsign", ""),
+            "field": field,
+            "kind": kind,
+            "status": status,
+            "value": value,
+            "limit": limit,
+            "timestamp": data.get("timestamp"),
+            **stats.summary(),
+        }
+        if "source" in data:
+            event["source"] = data["source"]
+        return event
+
+
+class AlertPublisher:
+    """Run frames through an AlertEngine and publish what it reports."""
+
+    def __init__(self, client, engine: AlertEngine, topic: str = "cubesatsim/alerts"):
+        self.client = client
+        self.engine = engine
+        self.topic = topic
+
+    def update(self, data: dict):
+        for event in self.engine.update(data):
+            self.client.publish(self.topic, json.dumps(event, separators=(",", ":")))
+            print(f"Alert: {event['callsign']} {event['field']} {event['kind']} {event['status']} at {event['value']}")
@@ -0,0 +1,222 @@
+import contextlib
+import csv
+import gzip
+import json
+import os
+import sys
+from typing import ContextManager, Generator, Iterable, TextIO
+
+import click
+
+from main import OUTBOX_DRAIN_SECONDS, SECTION_FIELDS, connect_to_mqtt, decode_aprs
+
+# Read captures a few MB at a time rather than one readline per frame
+CHUNK_SIZE = 4 * 1024 * 1024
+
+FIELDNAMES = ("callsign", "latitude", "longitude", *SECTION_FIELDS, "timestamp", "raw_aprs")
+
+
+def open_capture(path: str) -> ContextManager[TextIO]:
+    """Open a capture file for reading, transparently handling gzip.
+
+    "-" is stdin, which is left open when the with block ends.
+    """
+    if path == "-":
+        return contextlib.nullcontext(sys.stdin)
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def open_output(path: str) -> ContextManager[TextIO]:
+    if path == "-":
+        return contextlib.nullcontext(sys.stdout)
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+def aprs_line(line: str) -> str | None:
+    """Return a capture line stripped if it holds an APRS frame, else None."""
+    line = line.strip()
+    return line if line.startswith("APRS:") else None
+
+
+def read_capture(capture: TextIO, chunk_size: int = CHUNK_SIZE) -> Generator[str]:
+    """Yield the APRS lines of a capture, reading it in large chunks."""
+    while lines := capture.readlines(chunk_size):
+        for line in lines:
+            if (aprs := aprs_line(line)) is not None:
+                yield aprs
+
+
+def decode_capture(capture: TextIO, chunk_size: int = CHUNK_SIZE) -> Generator[dict]:
+    for aprs in read_capture(capture, chunk_size):
+        data = decode_aprs(aprs)
+        if data:
+            yield data
+
+
+def read_recording(recording: TextIO) -> Generator[tuple[int, str]]:
+    """Yield (arrival time in microseconds, line) for each line of a main.py --record_path recording."""
+    for entry in recording:
+        if entry.strip():
+            entry = json.loads(entry)
+            yield round(entry["time"] * 1e6), entry["line"].strip()
+
+
+def decode_recording(recording: TextIO) -> Generator[dict]:
+    """Decode a recording, timestamping frames with their arrival times."""
+    from wire import decode_timestamp
+
+    for arrival, line in read_recording(recording):
+        data = decode_aprs(line)
+        if data:
+            data["timestamp"] = decode_timestamp(arrival)
+            yield data
+
+
+def write_jsonl(frames: Iterable[dict], output: TextIO) -> int:
+    count = 0
+    for data in frames:
+        output.write(json.dumps(data) + "\n")
+        count += 1
+    return count
+
+
+def write_csv(frames: Iterable[dict], output: TextIO) -> int:
+    writer = csv.DictWriter(output, fieldnames=FIELDNAMES, extrasaction="ignore")
+    writer.writeheader()
+    count = 0
+    for data in frames:
+        writer.writerow(data)
+        count += 1
+    return count
+
+
+def write_store(frames: Iterable[dict], store) -> int:
+    count = 0
+    for data in frames:
+        store.append(data)
+        count += 1
+    return count
+
+
+def write_columns(input_path: str, output_path: str, output_format: str, recording: bool = False) -> int:
+    """Decode captures in bulk with the column decoder and save the arrays."""
+    # numpy (and pyarrow for Parquet) are only needed for these formats
+    try:
+        from columns import FrameColumns, iter_columns
+    except ImportError as e:
+        raise click.ClickException(str(e))
+    from parallel import capture_paths
+
+    chunks = []
+    for path in capture_paths(input_path):
+        with open_capture(path) as capture:
+            if recording:
+                entries = list(read_recording(capture))
+                lines = [line for _, line in entries]
+                chunks.extend(iter_columns(lines, timestamps=[arrival for arrival, _ in entries]))
+            else:
+                chunks.extend(iter_columns(read_capture(capture)))
+    columns = FrameColumns.concatenate(chunks)
+    if output_format == "parquet":
+        try:
+            columns.to_parquet(output_path)
+        except ImportError as e:
+            raise click.ClickException(str(e))
+    else:
+        columns.save_npz(sys.stdout.buffer if output_path == "-" else output_path)
+    return len(columns)
+
+
+def publish_mqtt(frames: Iterable[dict], client, mqtt_topic: str, tracker=None) -> int:
+    count = 0
+    for data in frames:
+        info = client.publish(mqtt_topic, json.dumps(data))
+        if tracker is not None:
+            tracker.track(info)
+        count += 1
+    return count
+
+
+@click.command()
+@click.option(
+    "--input",
+    "input_path",
+    required=True,
+    help="Capture file or directory of captures to decode, optionally gzipped ('-' for stdin)",
+)
+@click.option("--output", "output_path", default="-", help="File to write decoded frames to ('-' for stdout)")
+@click.option(
+    "--output_format",
+    type=click.Choice(["jsonl", "csv", "mqtt", "store", "npz", "parquet"]),
+    default="jsonl",
+    help="Write JSON Lines, CSV, a telemetry store directory, NumPy or Parquet columns, or publish to MQTT",
+)
+@click.option(
+    "--recording",
+    is_flag=True,
+    help="The input is a recording from main.py --record_path; frames keep their arrival times",
+)
+@click.option(
+    "--workers", default=1, help="Number of decoder processes (0 for one per CPU)"
+)
+@click.option("--mqtt_host", default="localhost", help="MQTT broker host")
+@click.option("--mqtt_port", default=1883, help="MQTT broker port")
+@click.option(
+    "--mqtt_topic", default="cubesatsim/data", help="MQTT topic to publish to"
+)
+@click.option("--mqtt_username", default=None, help="MQTT username (if required)")
+@click.option("--mqtt_password", default=None, help="MQTT password (if required)")
+def main(input_path, output_path, output_format, recording, workers, mqtt_host, mqtt_port, mqtt_topic, mqtt_username, mqtt_password):
+    """Decode a recorded capture file in one go."""
+    if output_format in ("npz", "parquet"):
+        count = write_columns(input_path, output_path, output_format, recording)
+        sys.stderr.write(f"Decoded {count} frames from {input_path}\n")
+        return
+
+    if output_format == "store" and not recording:
+        # Plain captures don't say when each frame was received
+        sys.stderr.write("Frames are stored with their decode time; use --recording to keep arrival times\n")
+
+    with contextlib.ExitStack() as stack:
+        if recording:
+            frames = decode_recording(stack.enter_context(open_capture(input_path)))
+        # stdin can't be split into byte ranges, so it's always decoded serially
+        elif input_path != "-" and (workers != 1 or os.path.isdir(input_path)):
+            # Imported here as parallel itself builds on this module
+            from parallel import decode_parallel
+
+            frames = decode_parallel(input_path, workers or None)
+        else:
+            frames = decode_capture(stack.enter_context(open_capture(input_path)))
+
+        if output_format == "mqtt":
+            from metrics import PublishTracker
+
+            client = connect_to_mqtt(mqtt_host, mqtt_port, mqtt_username, mqtt_password)
+            tracker = PublishTracker(client)
+            client.loop_start()
+            count = publish_mqtt(frames, client, mqtt_topic, tracker)
+            if not tracker.wait_sent(OUTBOX_DRAIN_SECONDS):
+                sys.stderr.write(f"Gave up waiting for {len(tracker.pending)} frame(s) to reach the broker\n")
+            client.disconnect()
+            client.loop_stop()
+        elif output_format == "store":
+            from store import TelemetryStore
+
+            store = TelemetryStore(output_path)
+            count = write_store(frames, store)
+            store.close()
+        else:
+            writer = write_csv if output_format == "csv" else write_jsonl
+            with open_output(output_path) as output:
+                count = writer(frames, output)
+    sys.stderr.write(f"Decoded {count} frames from {input_path}\n")
+
+
+if __name__ == "__main__":
+    main(auto_envvar_prefix="CUBESATSIM")
+    sys.exit(0)
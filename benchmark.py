@@ -0,0 +1,277 @@
+import collections
+import contextlib
+from datetime import UTC, datetime
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+import click
+
+import ingest
+import main
+from broker import Broker
+from synthetic import generate_line, generate_lines
+
+# Satellites heard in the end to end run
+CALLSIGNS = 5
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def position_token(line: str) -> str:
+    header = line[5:].strip().split(" ", 1)[0].split(">")
+    return header[1] if len(header) > 1 else header[0]
+
+
+def call_quietly(function, argument):
+    try:
+        return function(argument)
+    except Exception:
+        return None
+
+
+def benchmark_function(function, inputs: list[str], allocation_sample: int = 1000) -> dict:
+    """Time each call of function over inputs, then sample its allocations."""
+    timings = []
+    with contextlib.redirect_stderr(io.StringIO()):
+        started = time.perf_counter()
+        for argument in inputs:
+            call_started = time.perf_counter_ns()
+            call_quietly(function, argument)
+            timings.append(time.perf_counter_ns() - call_started)
+        elapsed = time.perf_counter() - started
+
+        peaks = []
+        tracemalloc.start()
+        for argument in inputs[:allocation_sample]:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            call_quietly(function, argument)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "calls": len(inputs),
+        "lines_per_second": len(inputs) / elapsed if elapsed else 0.0,
+        "p50_us": percentile(timings, 0.5) / 1000,
+        "p99_us": percentile(timings, 0.99) / 1000,
+        "mean_peak_bytes": statistics.fmean(peaks) if peaks else 0.0,
+    }
+
+
+def benchmark_decoders(lines: list[str]) -> dict:
+    positions = [position_token(line) for line in lines]
+    main.decode_position_strings.cache_clear()
+    results = {
+        "decode_aprs": benchmark_function(main.decode_aprs, lines),
+        "decode_aprs_bytes": benchmark_function(ingest.decode_aprs_bytes, [line.encode() for line in lines]),
+        "decode_sections": benchmark_function(main.decode_sections, lines),
+        "decode_position": benchmark_function(main.decode_position, positions),
+        "decode_position_strings": benchmark_function(main.decode_position_strings, positions),
+    }
+    for function in (
+        main.decode_battery,
+        main.decode_bme_sensor,
+        main.decode_mpu6050,
+        main.decode_voltages,
+        main.decode_gps,
+        main.decode_mcu_temp,
+    ):
+        results[function.__name__] = benchmark_function(function, lines)
+    info = main.decode_position_strings.cache_info()
+    results["decode_position_strings"]["cache_hits"] = info.hits
+    results["decode_position_strings"]["cache_misses"] = info.misses
+    return results
+
+
+def benchmark_end_to_end(count: int, seed: int, timeout: float = 60.0) -> dict:
+    """Pipe frames through main.py into an in-process broker and time each one."""
+    rng = random.Random(seed)
+    # A handful of satellites, as on a real pass; frames are matched back
+    # to the line that carried them by raw_aprs
+    lines = [generate_line(rng, "full", callsign=f"AMSAT-{index % CALLSIGNS + 1}") for index in range(count)]
+    indexes = collections.defaultdict(collections.deque)
+    for index, line in enumerate(lines):
+        indexes[line[5:].strip()].append(index)
+    sent = [0] * count
+    received = {}
+    done = threading.Event()
+
+    def on_publish(topic, payload):
+        if topic != "cubesatsim/data":
+            return
+        now = time.perf_counter()
+        for frame in json.loads(payload) if payload.startswith(b"[") else [json.loads(payload)]:
+            waiting = indexes.get(frame["raw_aprs"])
+            if waiting:
+                received[waiting.popleft()] = now
+        if len(received) >= count:
+            done.set()
+
+    broker = Broker().start()
+    broker.add_listener(on_publish)
+    parser = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py"),
+         "--mqtt_host", "127.0.0.1", "--mqtt_port", str(broker.port)],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        while not broker.sessions and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        started = time.perf_counter()
+        for index, line in enumerate(lines):
+            sent[index] = time.perf_counter()
+            parser.stdin.write(line.encode() + b"\n")
+            parser.stdin.flush()
+        done.wait(max(0.0, deadline - time.monotonic()))
+        elapsed = time.perf_counter() - started
+    finally:
+        parser.stdin.close()
+        parser.wait()
+        broker.stop()
+
+    latencies = sorted((received[index] - sent[index]) * 1e6 for index in received)
+    return {
+        "frames": count,
+        "received": len(received),
+        "frames_per_second": len(received) / elapsed if elapsed else 0.0,
+        "p50_us": percentile(latencies, 0.5),
+        "p99_us": percentile(latencies, 0.99),
+    }
+
+
+def benchmark_startup(runs: int, seed: int, timeout: float = 30.0) -> dict:
+    """Start main.py with a frame already waiting on stdin and time its first publish.
+
+    The broker is up throughout, as it is when the container restarts the
+    parser, so this covers interpreter startup, imports, connecting and
+    decoding the first frame.
+    """
+    line = generate_line(random.Random(seed), "full")
+    received = threading.Event()
+
+    def on_publish(topic, payload):
+        if topic == "cubesatsim/data":
+            received.set()
+
+    broker = Broker().start()
+    broker.add_listener(on_publish)
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    first_publish, exits = [], []
+    try:
+        for _ in range(runs):
+            received.clear()
+            started = time.perf_counter()
+            parser = subprocess.Popen(
+                [sys.executable, script, "--mqtt_host", "127.0.0.1", "--mqtt_port", str(broker.port)],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            parser.stdin.write(line.encode() + b"\n")
+            parser.stdin.flush()
+            if received.wait(timeout):
+                first_publish.append(time.perf_counter() - started)
+            parser.stdin.close()
+            parser.wait()
+            exits.append(time.perf_counter() - started)
+    finally:
+        broker.stop()
+
+    first_publish.sort()
+    return {
+        "runs": runs,
+        "published": len(first_publish),
+        "first_publish_p50_ms": percentile(first_publish, 0.5) * 1e3,
+        "first_publish_max_ms": first_publish[-1] * 1e3 if first_publish else 0.0,
+        "exit_p50_ms": percentile(sorted(exits), 0.5) * 1e3,
+    }
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """List every decoder whose throughput fell more than tolerance below the baseline."""
+    found = []
+    for name, result in results["decoders"].items():
+        previous = baseline.get("decoders", {}).get(name)
+        if previous and result["lines_per_second"] < previous["lines_per_second"] * (1 - tolerance):
+            found.append(
+                f"{name}: {result['lines_per_second']:.0f} lines/s, baseline {previous['lines_per_second']:.0f}"
+            )
+    return found
+
+
+@click.command()
+@click.option("--lines", "line_count", default=20000, help="Number of synthetic lines to decode")
+@click.option("--seed", default=0, help="Seed for the synthetic frame generator")
+@click.option("--end_to_end", "end_to_end_count", default=500, help="Frames to pipe through main.py (0 to skip)")
+@click.option("--startup", "startup_runs", default=5, help="Restarts of main.py to time to its first publish (0 to skip)")
+@click.option("--output", default="bench_results.json", help="File to write the results to as JSON")
+@click.option("--baseline", default=None, help="Earlier results file to compare against")
+@click.option("--tolerance", default=0.2, help="Allowed fractional slowdown against the baseline")
+def cli(line_count, seed, end_to_end_count, startup_runs, output, baseline, tolerance):
+    """Benchmark the decode pipeline and record the results."""
+    lines = list(generate_lines(line_count, seed))
+    results = {
+        "timestamp": datetime.now(UTC).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "lines": line_count,
+        "seed": seed,
+        "decoders": benchmark_decoders(lines),
+    }
+    if end_to_end_count:
+        results["end_to_end"] = benchmark_end_to_end(end_to_end_count, seed)
+    if startup_runs:
+        results["startup"] = benchmark_startup(startup_runs, seed)
+
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for name, result in results["decoders"].items():
+        print(
+            f"{name:24} {result['lines_per_second']:>12.0f} lines/s "
+            f"p50 {result['p50_us']:8.1f}us p99 {result['p99_us']:8.1f}us "
+            f"peak {result['mean_peak_bytes']:8.0f}B"
+        )
+    if "end_to_end" in results:
+        result = results["end_to_end"]
+        print(
+            f"{'end_to_end':24} {result['frames_per_second']:>12.0f} frames/s "
+            f"p50 {result['p50_us']:8.1f}us p99 {result['p99_us']:8.1f}us "
+            f"({result['received']}/{result['frames']} received)"
+        )
+    if "startup" in results:
+        result = results["startup"]
+        print(
+            f"{'startup':24} first publish p50 {result['first_publish_p50_ms']:8.1f}ms "
+            f"max {result['first_publish_max_ms']:8.1f}ms ({result['published']}/{result['runs']} published)"
+        )
+
+    if baseline:
+        with open(baseline) as f:
+            found = regressions(results, json.load(f), tolerance)
+        for regression in found:
+            print(f"Regression: {regression}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    cli()
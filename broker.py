@@ -0,0 +1,194 @@
+"""A minimal in-process MQTT 3.1.1 broker for benchmarks and replays.
+
+It understands just enough of the protocol for paho clients to connect,
+publish at QoS 0-2, subscribe with + and # wildcards and receive retained
+messages. Everything is delivered at QoS 0. It is a stand-in for
+mosquitto on a development machine, not a replacement for it.
+"""
+
+import socket
+import socketserver
+import struct
+import threading
+from typing import Callable
+
+CONNECT = 1
+PUBLISH = 3
+PUBREL = 6
+SUBSCRIBE = 8
+UNSUBSCRIBE = 10
+PINGREQ = 12
+DISCONNECT = 14
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    for index, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if index >= len(topic_levels):
+            return False
+        if level != "+" and level != topic_levels[index]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+def encode_length(length: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+
+def encode_string(value: str) -> bytes:
+    encoded = value.encode("utf-8")
+    return struct.pack("!H", len(encoded)) + encoded
+
+
+def publish_packet(topic: str, payload: bytes, retain: bool = False) -> bytes:
+    body = encode_string(topic) + payload
+    return bytes([0x30 | retain]) + encode_length(len(body)) + body
+
+
+class Session(socketserver.BaseRequestHandler):
+    def setup(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.subscriptions = set()
+        self.send_lock = threading.Lock()
+        self.server.broker.sessions.add(self)
+
+    def finish(self):
+        self.server.broker.sessions.discard(self)
+
+    def send(self, packet: bytes):
+        with self.send_lock:
+            try:
+                self.request.sendall(packet)
+            except OSError:
+                pass
+
+    def read_exactly(self, count: int) -> bytes:
+        data = bytearray()
+        while len(data) < count:
+            chunk = self.request.recv(count - len(data))
+            if not chunk:
+                raise ConnectionError("Client went away")
+            data += chunk
+        return bytes(data)
+
+    def read_packet(self) -> tuple[int, int, bytes]:
+        header = self.read_exactly(1)[0]
+        length = 0
+        multiplier = 1
+        while True:
+            byte = self.read_exactly(1)[0]
+            length += (byte & 0x7F) * multiplier
+            multiplier *= 128
+            if not byte & 0x80:
+                break
+        return header >> 4, header & 0x0F, self.read_exactly(length)
+
+    def handle(self):
+        broker = self.server.broker
+        try:
+            while True:
+                packet_type, flags, body = self.read_packet()
+                if packet_type == CONNECT:
+                    self.send(b"\x20\x02\x00\x00")
+                elif packet_type == PUBLISH:
+                    qos = (flags >> 1) & 0x03
+                    (topic_length,) = struct.unpack_from("!H", body)
+                    topic = body[2 : 2 + topic_length].decode("utf-8")
+                    offset = 2 + topic_length
+                    if qos:
+                        packet_id = body[offset : offset + 2]
+                        offset += 2
+                        # PUBACK for QoS 1, PUBREC for QoS 2
+                        self.send(bytes([0x40 if qos == 1 else 0x50, 2]) + packet_id)
+                    broker.publish(topic, body[offset:], bool(flags & 0x01))
+                elif packet_type == PUBREL:
+                    self.send(b"\x70\x02" + body[:2])
+                elif packet_type == SUBSCRIBE:
+                    packet_id, offset, granted = body[:2], 2, bytearray()
+                    new_filters = []
+                    while offset < len(body):
+                        (length,) = struct.unpack_from("!H", body, offset)
+                        topic_filter = body[offset + 2 : offset + 2 + length].decode("utf-8")
+                        offset += 3 + length
+                        new_filters.append(topic_filter)
+                        granted.append(0)
+                    self.subscriptions.update(new_filters)
+                    self.send(b"\x90" + encode_length(2 + len(granted)) + packet_id + granted)
+                    for topic, payload in broker.retained_matching(new_filters):
+                        self.send(publish_packet(topic, payload, retain=True))
+                elif packet_type == UNSUBSCRIBE:
+                    offset = 2
+                    while offset < len(body):
+                        (length,) = struct.unpack_from("!H", body, offset)
+                        self.subscriptions.discard(body[offset + 2 : offset + 2 + length].decode("utf-8"))
+                        offset += 2 + length
+                    self.send(b"\xb0\x02" + body[:2])
+                elif packet_type == PINGREQ:
+                    self.send(b"\xd0\x00")
+                elif packet_type == DISCONNECT:
+                    return
+        except (ConnectionError, OSError):
+            return
+
+
+class Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Broker:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.server = Server((host, port), Session)
+        self.server.broker = self
+        self.sessions = set()
+        self.retained = {}
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def add_listener(self, listener: Callable[[str, bytes], None]):
+        """Call listener(topic, payload) in-process for every publish."""
+        self.listeners.append(listener)
+
+    def publish(self, topic: str, payload: bytes, retain: bool = False):
+        if retain:
+            with self.lock:
+                if payload:
+                    self.retained[topic] = payload
+                else:
+                    self.retained.pop(topic, None)
+        for listener in self.listeners:
+            listener(topic, payload)
+        packet = publish_packet(topic, payload)
+        for session in list(self.sessions):
+            if any(topic_matches(topic_filter, topic) for topic_filter in session.subscriptions):
+                session.send(packet)
+
+    def retained_matching(self, topic_filters: list[str]) -> list[tuple[str, bytes]]:
+        with self.lock:
+            return [
+                (topic, payload)
+                for topic, payload in self.retained.items()
+                if any(topic_matches(topic_filter, topic) for topic_filter in topic_filters)
+            ]
+
+    def start(self) -> "Broker":
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -1,81 +1,244 @@
+"""Front panel buttons and mode LEDs.
+
+GPIO and MQTT callbacks never do the work themselves: they put an event
+on a queue and return. One worker thread takes events in order and runs
+the panel's state machine, so there is no state shared between threads:
+
+    idle ---aprs pressed---> aprs_requested ---data or photo---> idle
+    idle ---sstv pressed---> sstv_requested ---data or photo---> idle
+    any  --reset pressed---> idle
+
+Pressing a button publishes its action, at the configured QoS, from the
+worker; paho sends it on its own thread and the acknowledgement comes
+back as another event. LED effects that used to sleep, like holding the
+reset LED on after release, are timers the worker runs between events.
+Press-to-publish and press-to-acknowledgement times are exported as
+cubesatsim_button_seconds.
+"""
+
+import heapq
+import itertools
 import json
+import queue
+import random
+import threading
+import time
 from time import sleep
+from typing import Callable
 
 import click
-from gpiozero import Button, LED
 import paho.mqtt.client as mqtt
 
 import structlog
 
+from devices import SimulatedButton, SimulatedLed, real_button, real_led
+from metrics import BUTTON_PRESSES, BUTTON_SECONDS, serve as serve_metrics
+
 logging = structlog.get_logger()
 
-action_mqtt_topic = None
-action_mqtt_client = None
-
-reset_led = LED(24)
-telem_led = LED(6)
-sstv_led = LED(5)
-
-aprs_mode_requested = False
-sstv_mode_requested = False
-
-
-def reset_button_pressed():
-    reset_led.on()
-    action_mqtt_client.publish(action_mqtt_topic, json.dumps({"action": "reset"}))
-    logging.info("Reset button pressed, published 'reset' action to MQTT")
-    telem_led.off()
-    sstv_led.off()
-
-
-def reset_button_released():
-    logging.info("Reset button released")
-    sleep(0.5)
-    reset_led.off()
-
-
-def aprs_button_pressed():
-    global aprs_mode_requested, sstv_mode_requested
-    action_mqtt_client.publish(action_mqtt_topic, json.dumps({"action": "aprs"}))
-    logging.info("APRS button pressed, published 'aprs' action to MQTT")
-    aprs_mode_requested = True
-    sstv_mode_requested = False
-    telem_led.blink(on_time=0.2, off_time=0.2)
-    sstv_led.off()
-
-def sstv_button_pressed():
-    global aprs_mode_requested, sstv_mode_requested
-    action_mqtt_client.publish(action_mqtt_topic, json.dumps({"action": "sstv"}))
-    logging.info("SSTV button pressed, published 'sstv' action to MQTT")
-    aprs_mode_requested = False
-    sstv_mode_requested = True
-    sstv_led.blink(on_time=0.2, off_time=0.2)
-    telem_led.off()
-
-
-def on_message(client, userdata, msg):
-    global aprs_mode_requested, sstv_mode_requested
-    logging.info(f"Received message on topic {msg.topic}: {msg.payload.decode()}")
-    if msg.topic == "cubesatsim/photos":
-        logging.info("Processing photo message...")
-        if aprs_mode_requested:
-            logging.info("Requesting APRS mode...")
-        if sstv_mode_requested:
-            logging.info("SSTV mode requested but already active.")
-        aprs_mode_requested = False
-        sstv_mode_requested = False
-        telem_led.on()
-        sstv_led.off()
-    if msg.topic == "cubesatsim/data":
-        logging.info("Processing data message...")
-        if aprs_mode_requested:
-            logging.info("APRS mode requested but already active.")
-        if sstv_mode_requested:
-            logging.info("Requesting SSTV mode...")
-        aprs_mode_requested = False
-        sstv_mode_requested = False
-        telem_led.off()
-        sstv_led.on()
+# GPIO pins, by name
+BUTTON_PINS = {"reset": 17, "aprs": 22, "sstv": 27}
+LED_PINS = {"reset": 24, "telem": 6, "sstv": 5}
+
+# How long the reset LED stays on after the button is released
+RESET_LED_SECONDS = 0.5
+BLINK_SECONDS = 0.2
+
+
+class ButtonPanel:
+    def __init__(
+        self,
+        client,
+        topic: str = "cubesatsim/actions",
+        leds: dict | None = None,
+        qos: int = 1,
+        debounce: float = 0.2,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.client = client
+        self.topic = topic
+        self.leds = leds if leds is not None else {name: SimulatedLed(pin) for name, pin in LED_PINS.items()}
+        self.qos = qos
+        self.debounce = debounce
+        self.clock = clock
+
+        self.events = queue.Queue()
+        self.state = "idle"
+        self.last_press = {}
+        # Press time of each published action not yet acknowledged, by mid
+        self.unacknowledged = {}
+        self.timers = []
+        self.timer_ids = itertools.count()
+        self.thread = None
+        self.counts = {"pressed": 0, "debounced": 0, "published": 0, "acknowledged": 0, "failed": 0}
+
+    # Callbacks, on GPIO and paho threads: only queue an event
+
+    def pressed(self, button: str):
+        self.events.put(("pressed", button, self.clock()))
+
+    def released(self, button: str):
+        self.events.put(("released", button, self.clock()))
+
+    def on_message(self, client, userdata, message):
+        self.events.put(("message", message.topic, self.clock()))
+
+    def on_publish(self, client, userdata, mid):
+        self.events.put(("acknowledged", mid, self.clock()))
+
+    def attach(self, buttons: dict):
+        """Wire up gpiozero-style buttons, by name."""
+        for name, button in buttons.items():
+            button.when_pressed = lambda name=name: self.pressed(name)
+            button.when_released = lambda name=name: self.released(name)
+
+    # Everything below runs on the worker thread
+
+    def after(self, seconds: float, action: Callable[[], None]):
+        heapq.heappush(self.timers, (self.clock() + seconds, next(self.timer_ids), action))
+
+    def run_timers(self) -> float | None:
+        """Run the timers that are due; return the seconds until the next one."""
+        while self.timers:
+            due, _, action = self.timers[0]
+            now = self.clock()
+            if due > now:
+                return due - now
+            heapq.heappop(self.timers)
+            action()
+        return None
+
+    def handle(self, event: tuple):
+        kind, subject, at = event
+        if kind == "pressed":
+            self.on_pressed(subject, at)
+        elif kind == "released":
+            if subject == "reset":
+                logging.info("Reset button released")
+                self.after(RESET_LED_SECONDS, self.leds["reset"].off)
+        elif kind == "message":
+            self.on_mode_message(subject)
+        elif kind == "acknowledged":
+            pressed_at = self.unacknowledged.pop(subject, None)
+            if pressed_at is not None:
+                self.counts["acknowledged"] += 1
+                BUTTON_SECONDS.observe(self.clock() - pressed_at, "acknowledged")
+
+    def on_pressed(self, button: str, at: float):
+        self.counts["pressed"] += 1
+        if at - self.last_press.get(button, float("-inf")) < self.debounce:
+            self.counts["debounced"] += 1
+            return
+        self.last_press[button] = at
+        BUTTON_PRESSES.inc(button)
+
+        self.publish(button, at)
+        if button == "reset":
+            self.state = "idle"
+            self.leds["reset"].on()
+            self.leds["telem"].off()
+            self.leds["sstv"].off()
+        elif button == "aprs":
+            self.state = "aprs_requested"
+            self.leds["telem"].blink(on_time=BLINK_SECONDS, off_time=BLINK_SECONDS)
+            self.leds["sstv"].off()
+        elif button == "sstv":
+            self.state = "sstv_requested"
+            self.leds["sstv"].blink(on_time=BLINK_SECONDS, off_time=BLINK_SECONDS)
+            self.leds["telem"].off()
+        logging.info(f"{button} button pressed, now {self.state}")
+
+    def publish(self, action: str, pressed_at: float):
+        info = self.client.publish(self.topic, json.dumps({"action": action}), qos=self.qos)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            # paho only refuses while disconnected; it queues otherwise
+            self.counts["failed"] += 1
+            logging.error(f"Failed to publish '{action}' action: {mqtt.error_string(info.rc)}")
+            return
+        self.counts["published"] += 1
+        BUTTON_SECONDS.observe(self.clock() - pressed_at, "published")
+        self.unacknowledged[info.mid] = pressed_at
+        logging.info(f"Published '{action}' action to {self.topic}")
+
+    def on_mode_message(self, topic: str):
+        if topic == "cubesatsim/photos":
+            if self.state == "aprs_requested":
+                logging.info("Requesting APRS mode...")
+            elif self.state == "sstv_requested":
+                logging.info("SSTV mode requested but already active.")
+            self.leds["telem"].on()
+            self.leds["sstv"].off()
+        elif topic == "cubesatsim/data":
+            if self.state == "aprs_requested":
+                logging.info("APRS mode requested but already active.")
+            elif self.state == "sstv_requested":
+                logging.info("Requesting SSTV mode...")
+            self.leds["telem"].off()
+            self.leds["sstv"].on()
+        else:
+            return
+        self.state = "idle"
+
+    def run_pending(self, timeout: float | None = 0) -> bool:
+        """Handle the next event, waiting up to timeout for one; False if none came."""
+        wait = self.run_timers()
+        if timeout is None or (wait is not None and wait < timeout):
+            timeout = wait
+        try:
+            event = self.events.get(timeout=timeout) if timeout != 0 else self.events.get_nowait()
+        except queue.Empty:
+            self.run_timers()
+            return False
+        if event is None:
+            return False
+        self.handle(event)
+        return True
+
+    def worker(self):
+        while True:
+            wait = self.run_timers()
+            try:
+                event = self.events.get(timeout=wait)
+            except queue.Empty:
+                # A timer is due
+                continue
+            if event is None:
+                return
+            self.handle(event)
+
+    def start(self) -> "ButtonPanel":
+        self.thread = threading.Thread(target=self.worker, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.events.put(None)
+        if self.thread is not None:
+            self.thread.join()
+
+    def stats(self) -> dict:
+        return dict(self.counts, state=self.state, queued=self.events.qsize(), unacknowledged=len(self.unacknowledged))
+
+
+def create_buttons(backend: str) -> dict:
+    if backend == "simulated":
+        return {name: SimulatedButton(pin) for name, pin in BUTTON_PINS.items()}
+    return {name: real_button(pin, hold_time=0.2, bounce_time=0.1) for name, pin in BUTTON_PINS.items()}
+
+
+def create_leds(backend: str) -> dict:
+    if backend == "simulated":
+        return {name: SimulatedLed(pin) for name, pin in LED_PINS.items()}
+    return {name: real_led(pin) for name, pin in LED_PINS.items()}
+
+
+def press_randomly(buttons: dict, rate: float, stop: threading.Event):
+    """Press and release simulated buttons at random, rate times a second on average."""
+    names = list(buttons)
+    while not stop.wait(random.expovariate(rate)):
+        button = buttons[random.choice(names)]
+        button.press()
+        button.release()
 
 
 @click.command()
@@ -86,53 +249,66 @@ def on_message(client, userdata, msg):
 )
 @click.option("--mqtt_username", default=None, help="MQTT username (if required)")
 @click.option("--mqtt_password", default=None, help="MQTT password (if required)")
-def main(mqtt_host, mqtt_port, mqtt_topic, mqtt_username, mqtt_password):
+@click.option("--qos", type=click.IntRange(0, 2), default=1, help="MQTT QoS to publish actions with")
+@click.option("--debounce", default=0.2, help="Ignore presses of the same button closer together than this many seconds")
+@click.option(
+    "--backend",
+    type=click.Choice(["real", "simulated"]),
+    default="real",
+    help="Use the real GPIO buttons and LEDs or in-memory simulated ones",
+)
+@click.option(
+    "--press_rate",
+    default=0.0,
+    help="With the simulated backend, press random buttons this many times a second (0 to disable)",
+)
+@click.option(
+    "--metrics_port",
+    default=0,
+    help="Port to serve Prometheus metrics on at /metrics (0 to disable)",
+)
+def main(mqtt_host, mqtt_port, mqtt_topic, mqtt_username, mqtt_password, qos, debounce, backend, press_rate, metrics_port):
     """Connect to the MQTT broker and print connection status."""
+    if metrics_port:
+        serve_metrics(metrics_port)
 
-    global action_mqtt_topic
-    action_mqtt_topic = mqtt_topic
-    global action_mqtt_client
-    action_mqtt_client = mqtt.Client()
+    client = mqtt.Client()
     if mqtt_username and mqtt_password:
-        action_mqtt_client.username_pw_set(mqtt_username, mqtt_password)
-
-    try:
-        action_mqtt_client.connect(mqtt_host, mqtt_port, 60)
-        logging.info(f"Connected to MQTT broker at {mqtt_host}:{mqtt_port}")
-    except Exception as e:
-        logging.error(f"Failed to connect to MQTT broker: {e}")
-        return
-
-    action_mqtt_client.loop_start()
-
-    action_mqtt_client.subscribe(mqtt_topic)
-    logging.info(f"Subscribed to topic: {mqtt_topic}")
+        client.username_pw_set(mqtt_username, mqtt_password)
 
-    action_mqtt_client.subscribe("cubesatsim/photos")
-    logging.info("Subscribed to topic: cubesatsim/photos")
-    action_mqtt_client.subscribe("cubesatsim/data")
-    logging.info("Subscribed to topic: cubesatsim/data")
+    panel = ButtonPanel(client, mqtt_topic, create_leds(backend), qos, debounce)
+    client.on_message = panel.on_message
+    client.on_publish = panel.on_publish
 
-    action_mqtt_client.on_message = on_message
+    def on_connect(client, userdata, flags, rc):
+        # Subscribe again after every reconnect
+        if rc == 0:
+            logging.info(f"Connected to MQTT broker at {mqtt_host}:{mqtt_port}")
+            client.subscribe([(mqtt_topic, 0), ("cubesatsim/photos", 0), ("cubesatsim/data", 0)])
 
-    # Configure the buttons
-    button = Button(17, hold_time=0.2, bounce_time=0.1)
-    button.when_pressed = reset_button_pressed
-    button.when_released = reset_button_released
+    client.on_connect = on_connect
+    # Presses made before the broker is reachable are queued by paho and
+    # sent once it connects
+    client.connect_async(mqtt_host, mqtt_port, 60)
+    client.loop_start()
+    panel.start()
 
-    aprs_button = Button(22, hold_time=0.2, bounce_time=0.1)
-    aprs_button.when_pressed = aprs_button_pressed
+    buttons = create_buttons(backend)
+    panel.attach(buttons)
 
-    sstv_button = Button(27, hold_time=0.2, bounce_time=0.1)
-    sstv_button.when_pressed = sstv_button_pressed
+    stop = threading.Event()
+    if press_rate and backend == "simulated":
+        threading.Thread(target=press_randomly, args=(buttons, press_rate, stop), daemon=True).start()
 
     try:
         while True:
             sleep(0.1)  # Keep the script running
     except KeyboardInterrupt:
-        logging.info("Disconnecting from MQTT broker...")
-        action_mqtt_client.loop_stop()
-        action_mqtt_client.disconnect()
+        stop.set()
+        logging.info("Disconnecting from MQTT broker...", **panel.stats())
+        panel.stop()
+        client.loop_stop()
+        client.disconnect()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,300 @@
+"""Decode APRS lines in bulk straight into NumPy column arrays.
+
+decode_columns() gives the same values decode_aprs() would, but a chunk
+of lines at a time: one regex pass over the whole chunk finds every
+section, the numbers are parsed in a single array conversion and
+scattered into their columns, and positions are computed with array
+arithmetic. No per-line dicts are made.
+
+The arrays are plain contiguous float64 (NaN where a section is missing),
+so they can be handed to Arrow or Parquet without copying. numpy comes
+with the "columns" extra; pyarrow is only needed for to_arrow() and
+to_parquet().
+
+Lines carry no receive time of their own, so frames are stamped with one
+time for the whole call unless per-line timestamps are passed in, e.g.
+the arrival times from a recording.
+"""
+
+from datetime import UTC, datetime
+import itertools
+import re
+from typing import Iterable, Iterator
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError("Column decoding needs numpy: pip install 'aprs2mqtt[columns]'") from e
+
+from main import _ESCAPE_CONTROL, CALLSIGN_PATTERN, MINIMUM_VALUES, SECTIONS
+from wire import FIELDS
+
+CHUNK_LINES = 65536
+
+# These match every line exactly once: either the part they want or,
+# failing that, the whole line with empty groups.
+HEADER_PATTERN = re.compile(r"(?m)^APRS:[^\S\n]*([^ >\n]*)>([^ >\n]*)[^\n]*$|^[^\n]*$")
+POSITIONS_PATTERN = re.compile(
+    r"(?m)^[^\n]*?([0-9]{4}\.[0-9]{2}[A-Z])[^\n]*?([0-9]{4}\.[0-9]{2}[A-Z])[^\n]*$|^[^\n]*$"
+)
+# One pass finds every section in a chunk; newlines are matched too so
+# each section can be placed on its line.
+SCAN_PATTERN = re.compile(r"(\n)|\b(" + "|".join(SECTIONS) + r")((?: [+-]?\d+\.\d+)+)")
+TAG_INDEX = {"": -1, **{tag: index for index, tag in enumerate(SECTIONS)}}
+
+
+def line_matches(pattern: re.Pattern, text: str, rows: int) -> list:
+    matches = pattern.findall(text)
+    if len(matches) != rows:
+        raise ValueError(f"Expected {rows} lines, matched {len(matches)}")
+    return matches
+
+
+def value_counts(groups: list[str]) -> np.ndarray:
+    # Every value in a " 1.0 2.0 ..." group starts with a space
+    return np.fromiter(map(str.count, groups, itertools.repeat(" ")), np.intp, len(groups))
+
+
+def decode_values(groups: list[str], rows: np.ndarray, row_count: int, width: int) -> np.ndarray:
+    """Parse each " 1.0 2.0 ..." group into its row of a row_count x width array."""
+    values = np.full((row_count, width), np.nan)
+    counts = value_counts(groups)
+    numbers = np.array(" ".join(groups).split(), dtype=np.float64)
+    if not len(numbers):
+        return values
+    number_rows = np.repeat(rows, counts)
+    columns = np.arange(len(numbers)) - np.repeat(np.cumsum(counts) - counts, counts)
+    keep = columns < width
+    values[number_rows[keep], columns[keep]] = numbers[keep]
+    return values
+
+
+def decode_sections(text: str, row_count: int) -> dict[str, np.ndarray]:
+    """Decode every section of every line in a newline-joined chunk."""
+    matches = SCAN_PATTERN.findall(text)
+    newlines, tags, groups = zip(*matches) if matches else ((), (), ())
+    is_newline = np.fromiter(map(bool, newlines), bool, len(matches))
+    lines = np.cumsum(is_newline)
+    tag_indexes = np.fromiter(map(TAG_INDEX.__getitem__, tags), np.int8, len(matches))
+    counts = value_counts(groups)
+
+    values = {}
+    for index, (tag, fields) in enumerate(SECTIONS.items()):
+        (found,) = np.nonzero((tag_indexes == index) & (counts >= MINIMUM_VALUES[tag]))
+        # The first complete copy of a section on a line wins
+        rows, first = np.unique(lines[found], return_index=True)
+        found = found[first]
+        decoded = decode_values([groups[match] for match in found], rows, row_count, len(fields))
+        for column, field in enumerate(fields):
+            values[field] = decoded[:, column]
+    return values
+
+
+def decode_coordinates(tokens: list[str], hemispheres: str) -> tuple[np.ndarray, np.ndarray]:
+    """Vectorised main.decode_coordinate over ddmm.hhH tokens.
+
+    Returns the decimal degrees and a mask of the tokens that were valid.
+    """
+    valid = np.fromiter(map(bool, tokens), bool, len(tokens))
+    characters = np.zeros((len(tokens), 8), np.uint8)
+    if valid.any():
+        text = "".join(token for token in tokens if token).encode("ascii")
+        characters[valid] = np.frombuffer(text, np.uint8).reshape(-1, 8)
+    digits = characters.astype(np.float64) - ord("0")
+    hemisphere = characters[:, 7]
+    valid &= (hemisphere == ord(hemispheres[0])) | (hemisphere == ord(hemispheres[1]))
+
+    # Same operations in the same order as decode_coordinate, so the
+    # results are identical to the last bit
+    sign = np.where(hemisphere == ord(hemispheres[1]), -1.0, 1.0)
+    degrees = digits[:, 0] * 10 + digits[:, 1]
+    minutes = digits[:, 2] * 10 + digits[:, 3]
+    seconds = digits[:, 5] * 10 + digits[:, 6]
+    decimal_degree = sign * degrees + sign * minutes / 60.0 + sign * seconds / 3600.0
+
+    magnitude = np.abs(decimal_degree)
+    degree = magnitude // 1
+    decimal_minute = (magnitude - degree) * 60.0
+    minute = decimal_minute // 1
+    second = (decimal_minute - minute) * 60.0
+    sign = np.sign(decimal_degree)
+    return degree * sign + minute * sign / 60.0 + second * sign / 3600.0, valid
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Arrow and Parquet export need pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+class FrameColumns:
+    """Decoded frames as columns.
+
+    callsign_codes index into callsigns (dictionary encoding), timestamps
+    are datetime64[us] in UTC, and values maps each field in wire.FIELDS to
+    a float64 array.
+    """
+
+    def __init__(self, callsign_codes: np.ndarray, callsigns: list[str], timestamps: np.ndarray, values: dict):
+        self.callsign_codes = callsign_codes
+        self.callsigns = callsigns
+        self.timestamps = timestamps
+        self.values = values
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        if field == "callsign":
+            return np.array(self.callsigns, dtype=object)[self.callsign_codes]
+        if field == "timestamp":
+            return self.timestamps
+        return self.values[field]
+
+    @classmethod
+    def from_frames(cls, frames: list) -> "FrameColumns":
+        """Gather decoded frames, dicts or TelemetryFrames, into columns."""
+        callsigns = {}
+        codes = np.array([callsigns.setdefault(frame.get("callsign", ""), len(callsigns)) for frame in frames], np.int32)
+        timestamps = np.array(
+            [(frame.get("timestamp") or "NaT").removesuffix("Z") for frame in frames], "datetime64[us]"
+        )
+        values = {field: np.array([frame.get(field) for frame in frames], np.float64) for field in FIELDS}
+        return cls(codes, list(callsigns), timestamps, values)
+
+    def rows(self) -> Iterator[dict]:
+        """Yield each frame as a dict of plain Python values, None where missing."""
+        columns = {field: self.values[field].tolist() for field in FIELDS}
+        timestamps = self.timestamps.tolist()
+        for index, code in enumerate(self.callsign_codes.tolist()):
+            row = {"callsign": self.callsigns[code]}
+            for field in FIELDS:
+                value = columns[field][index]
+                row[field] = None if value != value else value
+            row["timestamp"] = None if timestamps[index] is None else timestamps[index].isoformat() + "Z"
+            yield row
+
+    @classmethod
+    def concatenate(cls, chunks: list["FrameColumns"]) -> "FrameColumns":
+        callsigns = {}
+        codes = []
+        for chunk in chunks:
+            remap = np.array(
+                [callsigns.setdefault(callsign, len(callsigns)) for callsign in chunk.callsigns], np.int32
+            )
+            codes.append(remap[chunk.callsign_codes] if len(remap) else chunk.callsign_codes)
+        return cls(
+            np.concatenate(codes) if codes else np.zeros(0, np.int32),
+            list(callsigns),
+            np.concatenate([chunk.timestamps for chunk in chunks]) if chunks else np.zeros(0, "datetime64[us]"),
+            {
+                field: np.concatenate([chunk.values[field] for chunk in chunks]) if chunks else np.zeros(0)
+                for field in FIELDS
+            },
+        )
+
+    def to_arrow(self):
+        """Build a pyarrow Table over the same buffers, without copying them."""
+        pa = import_pyarrow()
+        columns = {
+            "callsign": pa.DictionaryArray.from_arrays(
+                pa.array(self.callsign_codes), pa.array(self.callsigns, pa.string())
+            ),
+            "timestamp": pa.array(self.timestamps, pa.timestamp("us", tz="UTC")),
+        }
+        for field in FIELDS:
+            columns[field] = pa.array(self.values[field])
+        return pa.table(columns)
+
+    def to_parquet(self, path: str):
+        import_pyarrow().parquet.write_table(self.to_arrow(), path)
+
+    def save_npz(self, output):
+        np.savez(
+            output,
+            callsign_codes=self.callsign_codes,
+            callsigns=np.array(self.callsigns, dtype=str),
+            timestamp=self.timestamps,
+            **self.values,
+        )
+
+
+def decode_chunk(
+    lines: list[str], timestamp: datetime | None = None, timestamps: np.ndarray | None = None
+) -> FrameColumns:
+    """Decode one chunk of APRS lines, keeping the frames decode_aprs would.
+
+    As there, a frame with no position keeps its sections, with NaN for
+    its latitude and longitude. timestamps, one datetime64[us] per line,
+    gives each frame its own time; otherwise they all get timestamp, or
+    the current time.
+    """
+    lines = [line.strip().replace("\n", " ") for line in lines]
+    text = "\n".join(lines)
+    headers = line_matches(HEADER_PATTERN, text, len(lines))
+    encoded_positions = "\n".join(position for _, position in headers).translate(_ESCAPE_CONTROL)
+    positions = line_matches(POSITIONS_PATTERN, encoded_positions, len(lines))
+    latitude, latitude_valid = decode_coordinates([token for token, _ in positions], "NS")
+    longitude, longitude_valid = decode_coordinates([token for _, token in positions], "EW")
+    positioned = latitude_valid & longitude_valid
+    sections = decode_sections(text, len(lines))
+
+    has_section = np.zeros(len(lines), bool)
+    for column in sections.values():
+        has_section |= ~np.isnan(column)
+    valid = np.fromiter(
+        (bool(CALLSIGN_PATTERN.fullmatch(callsign)) for callsign, _ in headers), bool, len(lines)
+    ) & (positioned | has_section)
+
+    values = {
+        "latitude": np.where(positioned, latitude, np.nan)[valid],
+        "longitude": np.where(positioned, longitude, np.nan)[valid],
+    }
+    for field, column in sections.items():
+        values[field] = column[valid]
+
+    callsigns = np.array([callsign for callsign, _ in headers], dtype=str)[valid]
+    callsigns, codes = np.unique(callsigns, return_inverse=True)
+    if timestamps is not None:
+        timestamps = np.asarray(timestamps, "datetime64[us]")[valid]
+    else:
+        timestamp = (timestamp or datetime.now(UTC)).replace(tzinfo=None)
+        timestamps = np.full(int(valid.sum()), np.datetime64(timestamp, "us"))
+    return FrameColumns(codes.astype(np.int32), callsigns.tolist(), timestamps, values)
+
+
+def iter_columns(
+    lines: Iterable[str],
+    chunk_lines: int = CHUNK_LINES,
+    timestamp: datetime | None = None,
+    timestamps: Iterable | None = None,
+) -> Iterator[FrameColumns]:
+    """Decode a stream of APRS lines as a series of column chunks.
+
+    timestamps, if given, yields each line's time in step with lines.
+    """
+    lines = iter(lines)
+    times = iter(timestamps) if timestamps is not None else None
+    while chunk := list(itertools.islice(lines, chunk_lines)):
+        chunk_times = None
+        if times is not None:
+            chunk_times = np.array(list(itertools.islice(times, len(chunk))), "datetime64[us]")
+        yield decode_chunk(chunk, timestamp, chunk_times)
+
+
+def decode_columns(
+    lines: Iterable[str],
+    chunk_lines: int = CHUNK_LINES,
+    timestamp: datetime | None = None,
+    timestamps: Iterable | None = None,
+) -> FrameColumns:
+    """Decode APRS lines to columns in bulk.
+
+    Lines decode_aprs would reject are left out. Every frame is stamped
+    with its entry in timestamps, or else with timestamp, or the current
+    time if neither is given.
+    """
+    return FrameColumns.concatenate(list(iter_columns(lines, chunk_lines, timestamp, timestamps)))
@@ -0,0 +1,69 @@
+"""Suppress repeated copies of the same APRS frame.
+
+The same beacon is often heard directly and again through one or more
+digipeaters, and multimon-ng sometimes decodes a packet twice. Copies only
+differ in the digipeater path, so frames are compared on their source,
+destination and payload alone.
+"""
+
+from collections import OrderedDict
+import time
+from typing import Callable
+
+from metrics import FRAMES_DUPLICATE
+
+
+def normalize(aprs: str | bytes) -> str | bytes:
+    """Reduce an APRS line to the parts that are the same in every copy of it.
+
+    "APRS: SRC>DEST,DIGI*,WIDE2-1:payload" becomes "SRC>DEST:payload",
+    with runs of whitespace in the payload collapsed. Lines from the byte
+    ingest path are normalized as bytes.
+    """
+    prefix, colon, comma, space = ("APRS:", ":", ",", " ") if isinstance(aprs, str) else (b"APRS:", b":", b",", b" ")
+    if aprs.startswith(prefix):
+        aprs = aprs[5:]
+    header, _, payload = aprs.strip().partition(colon)
+    return header.split(comma, 1)[0] + colon + space.join(payload.split())
+
+
+class Deduplicator:
+    """Remember the frames seen in the last window seconds.
+
+    Only a hash of each normalized frame is kept, at most max_entries of
+    them, oldest dropped first. A frame's window runs from its first copy,
+    so a beacon that really does repeat identical telemetry is published
+    again once the window has passed.
+    """
+
+    def __init__(self, window: float = 30.0, max_entries: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self.max_entries = max_entries
+        self.clock = clock
+        self.seen = OrderedDict()
+        self.unique = 0
+        self.duplicates = 0
+
+    def expire(self, now: float):
+        while self.seen:
+            key, first_seen = next(iter(self.seen.items()))
+            if now - first_seen < self.window and len(self.seen) <= self.max_entries:
+                break
+            del self.seen[key]
+
+    def is_duplicate(self, aprs: str | bytes) -> bool:
+        """Record aprs and say whether a copy of it was already seen in the window."""
+        now = self.clock()
+        self.expire(now)
+        key = hash(normalize(aprs))
+        if key in self.seen:
+            self.duplicates += 1
+            FRAMES_DUPLICATE.inc()
+            return True
+        self.seen[key] = now
+        self.unique += 1
+        self.expire(now)
+        return False
+
+    def stats(self) -> dict:
+        return {"unique": self.unique, "duplicates": self.duplicates, "tracked": len(self.seen)}
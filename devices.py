@@ -0,0 +1,333 @@
+"""Device backends for the gauge and button hardware.
+
+The simulated classes mimic the subset of each real driver's interface
+that gauges.py and buttons.py use and keep what was written, so the
+display and button logic can be run and tested without a Raspberry Pi.
+The real drivers are only imported when a real device is first used.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import threading
+import time
+from typing import Any, Callable
+
+
+class SimulatedServo:
+    def __init__(self):
+        self.angle = None
+
+
+class SimulatedServoKit:
+    """Stands in for adafruit_servokit.ServoKit."""
+
+    def __init__(self, channels: int = 16):
+        self.servo = [SimulatedServo() for _ in range(channels)]
+
+
+class SimulatedSegmentDisplay:
+    """Stands in for ht16k33.HT16K33SegmentGen."""
+
+    def __init__(self, digits: int = 8):
+        self.characters = [" "] * digits
+        self.text = ""
+        self.draws = 0
+
+    def clear(self):
+        self.characters = [" "] * len(self.characters)
+
+    def set_character(self, char: str, digit: int):
+        self.characters[digit] = char
+
+    def draw(self):
+        self.text = "".join(self.characters)
+        self.draws += 1
+
+
+class SimulatedLcd:
+    """Stands in for adafruit_character_lcd's Character_LCD_SPI."""
+
+    def __init__(self, columns: int = 20, lines: int = 4):
+        self.columns = columns
+        self.rows = [" " * columns for _ in range(lines)]
+        self.cursor = (0, 0)
+
+    def clear(self):
+        self.rows = [" " * self.columns for _ in self.rows]
+        self.cursor = (0, 0)
+
+    def cursor_position(self, column: int, row: int):
+        self.cursor = (column, row)
+
+    @property
+    def message(self) -> str:
+        return "\n".join(self.rows)
+
+    @message.setter
+    def message(self, message: str):
+        column, row = self.cursor
+        for line in message.split("\n"):
+            if row >= len(self.rows):
+                break
+            text = self.rows[row]
+            self.rows[row] = (text[:column] + line + text[column + len(line):])[: self.columns]
+            row, column = row + 1, 0
+
+
+class Recording:
+    """Wrap a device and log every attribute write and method call made on it.
+
+    Entries are (time, device, action, arguments); they are kept in
+    memory and, if a file is given, appended to it as JSON lines.
+    """
+
+    def __init__(self, target, name: str, log: list, output=None):
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_log", log)
+        object.__setattr__(self, "_output", output)
+
+    def _record(self, action: str, arguments):
+        entry = (time.time(), self._name, action, arguments)
+        self._log.append(entry)
+        if self._output is not None:
+            self._output.write(json.dumps(entry, default=repr) + "\n")
+            self._output.flush()
+
+    def __getattr__(self, attribute):
+        value = getattr(self._target, attribute)
+        name = f"{self._name}.{attribute}"
+        if callable(value):
+
+            def call(*args, **kwargs):
+                self._record(attribute, list(args) + ([kwargs] if kwargs else []))
+                return value(*args, **kwargs)
+
+            return call
+        if hasattr(value, "__getitem__") and not isinstance(value, (str, bytes)):
+            # e.g. ServoKit.servo, indexed by channel
+            return RecordingSequence(value, name, self._log, self._output)
+        return value
+
+    def __setattr__(self, attribute, value):
+        self._record(f"set {attribute}", [value])
+        setattr(self._target, attribute, value)
+
+
+class RecordingSequence:
+    def __init__(self, target, name: str, log: list, output=None):
+        self.target = target
+        self.name = name
+        self.log = log
+        self.output = output
+
+    def __getitem__(self, index):
+        return Recording(self.target[index], f"{self.name}[{index}]", self.log, self.output)
+
+
+class SimulatedButton:
+    """Stands in for gpiozero.Button; press() and release() fire its callbacks."""
+
+    def __init__(self, pin: int):
+        self.pin = pin
+        self.is_pressed = False
+        self.when_pressed = None
+        self.when_released = None
+
+    def press(self):
+        self.is_pressed = True
+        if self.when_pressed is not None:
+            self.when_pressed()
+
+    def release(self):
+        self.is_pressed = False
+        if self.when_released is not None:
+            self.when_released()
+
+
+class SimulatedLed:
+    """Stands in for gpiozero.LED, keeping its state rather than driving a pin."""
+
+    def __init__(self, pin: int):
+        self.pin = pin
+        self.state = "off"
+        self.changes = 0
+
+    @property
+    def is_lit(self) -> bool:
+        return self.state != "off"
+
+    def set(self, state: str):
+        if state != self.state:
+            self.state = state
+            self.changes += 1
+
+    def on(self):
+        self.set("on")
+
+    def off(self):
+        self.set("off")
+
+    def blink(self, on_time: float = 1.0, off_time: float = 1.0):
+        self.set("blinking")
+
+
+def real_button(pin: int, hold_time: float, bounce_time: float):
+    from gpiozero import Button
+
+    return Button(pin, hold_time=hold_time, bounce_time=bounce_time)
+
+
+def real_led(pin: int):
+    from gpiozero import LED
+
+    return LED(pin)
+
+
+def real_servo_kit(channels: int):
+    from adafruit_servokit import ServoKit
+
+    return ServoKit(channels=channels)
+
+
+def real_segment_display(i2c, address: int):
+    from ht16k33 import HT16K33SegmentGen
+
+    return HT16K33SegmentGen(i2c, i2c_address=address, digits=8)
+
+
+def real_i2c():
+    import board
+    import busio
+
+    return busio.I2C(scl=board.SCL, sda=board.SDA)
+
+
+def real_lcd(columns: int, lines: int):
+    import adafruit_character_lcd.character_lcd_spi as character_lcd
+    import board
+    import busio
+    import digitalio
+
+    spi = busio.SPI(board.SCK, MOSI=board.MOSI)
+    latch = digitalio.DigitalInOut(board.D8)
+    return character_lcd.Character_LCD_SPI(spi, latch, columns, lines)
+
+
+class Hardware:
+    """The gauge panel's devices, created on first use.
+
+    The backend is "real" for the Pi's I2C/SPI hardware or "simulated" for
+    the in-memory stand-ins above. With record set, every device is wrapped
+    in a Recording that logs to self.log, and to record_path if given.
+    initialize() brings all devices up in parallel in the background;
+    anything that touches a device before then just waits for that one.
+    """
+
+    FRAME_DISPLAY = 0x71
+    RX_FREQ_DISPLAY = 0x70
+    TX_FREQ_DISPLAY = 0x72
+
+    def __init__(
+        self,
+        backend: str = "real",
+        channels: int = 16,
+        columns: int = 20,
+        lines: int = 4,
+        record: bool = False,
+        record_path: str | None = None,
+    ):
+        if backend not in ("real", "simulated"):
+            raise ValueError(f"Unknown device backend {backend}")
+        self.backend = backend
+        self.channels = channels
+        self.columns = columns
+        self.lines = lines
+        self.devices = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+        self.record = record or bool(record_path)
+        self.log = []
+        self.record_file = open(record_path, "a", encoding="utf-8") if record_path else None
+
+    def device(self, name: str, create: Callable[[], Any]):
+        with self.lock:
+            lock = self.locks.setdefault(name, threading.Lock())
+        with lock:
+            if name not in self.devices:
+                started = time.monotonic()
+                try:
+                    device = create()
+                except Exception as e:
+                    print(f"Failed to initialize {name}: {e}")
+                    device = None
+                if device is not None and self.record:
+                    device = Recording(device, name, self.log, self.record_file)
+                self.devices[name] = device
+                print(f"Initialized {name} in {time.monotonic() - started:.3f}s")
+            return self.devices[name]
+
+    def i2c(self):
+        return self.device("i2c", real_i2c)
+
+    @property
+    def servo_kit(self):
+        if self.backend == "simulated":
+            return self.device("servo_kit", lambda: SimulatedServoKit(self.channels))
+        return self.device("servo_kit", lambda: real_servo_kit(self.channels))
+
+    def segment_display(self, name: str, address: int):
+        if self.backend == "simulated":
+            return self.device(name, SimulatedSegmentDisplay)
+        return self.device(name, lambda: real_segment_display(self.i2c(), address))
+
+    @property
+    def frame_display(self):
+        return self.segment_display("frame_display", self.FRAME_DISPLAY)
+
+    @property
+    def rx_freq_display(self):
+        return self.segment_display("rx_freq_display", self.RX_FREQ_DISPLAY)
+
+    @property
+    def tx_freq_display(self):
+        return self.segment_display("tx_freq_display", self.TX_FREQ_DISPLAY)
+
+    @property
+    def displays_enabled(self) -> bool:
+        return all((self.frame_display, self.rx_freq_display, self.tx_freq_display))
+
+    @property
+    def displays_failed(self) -> bool:
+        """Whether a segment display has failed to initialize, without waiting for any."""
+        return any(
+            name in self.devices and self.devices[name] is None
+            for name in ("frame_display", "rx_freq_display", "tx_freq_display")
+        )
+
+    @property
+    def lcd(self):
+        if self.backend == "simulated":
+            return self.device("lcd", lambda: SimulatedLcd(self.columns, self.lines))
+        return self.device("lcd", lambda: real_lcd(self.columns, self.lines))
+
+    def initialize(self, then: Callable[[], None] | None = None) -> threading.Thread:
+        """Bring every device up in parallel on background threads, then call then()."""
+
+        def run():
+            getters = (
+                lambda: self.servo_kit,
+                lambda: self.frame_display,
+                lambda: self.rx_freq_display,
+                lambda: self.tx_freq_display,
+                lambda: self.lcd,
+            )
+            with ThreadPoolExecutor(max_workers=len(getters)) as executor:
+                for future in [executor.submit(getter) for getter in getters]:
+                    future.result()
+            if then is not None:
+                then()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
@@ -17,7 +17,8 @@ target "parser" {
     tags = [
         "qualifier:5000/cubesatsim-aprs-parser-parser:main",
         "qualifier:5000/cubesatsim-aprs-parser-gauges:main",
-        "qualifier:5000/cubesatsim-aprs-parser-buttons:main"
+        "qualifier:5000/cubesatsim-aprs-parser-buttons:main",
+        "qualifier:5000/cubesatsim-aprs-parser-feed:main"
     ]
     output = [ "type=registry" ]
 }
@@ -0,0 +1,181 @@
+"""Dashboard feed: a decimated, delta-encoded view of the telemetry.
+
+Subscribes to the full data stream and, once per display interval,
+publishes only what changed since the last push:
+
+    cubesatsim/dashboard          {"seq": n, "time": ..., "callsigns": {callsign: {field: value}}}
+    cubesatsim/dashboard/state    the same, retained, but holding every field
+
+A field that received one sample in the interval is sent as that value;
+one that received several is sent as [min, max, mean]. Values are rounded
+to the display precision first, so noise below it doesn't cause a push,
+and nothing is published for an interval in which nothing changed.
+Clients load the retained state once, then apply deltas, and reload the
+state if they see a gap in seq.
+
+At most max_callsigns callsigns are kept; the one heard from least
+recently is dropped to make room, and sent as null so clients drop it too.
+"""
+
+from collections import OrderedDict
+from datetime import UTC, datetime
+import json
+import struct
+import threading
+from time import sleep
+
+import click
+import paho.mqtt.client as mqtt
+
+from frame import TelemetryFrame
+from snapshot import MAX_CALLSIGNS
+from wire import FIELDS
+
+
+class Series:
+    """Samples of one field within the current display interval."""
+
+    __slots__ = ("count", "minimum", "maximum", "total")
+
+    def __init__(self):
+        self.count = 0
+        self.minimum = float("inf")
+        self.maximum = float("-inf")
+        self.total = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        self.total += value
+
+    def display(self, precision: int):
+        if self.count == 1:
+            return round(self.total, precision)
+        return [
+            round(self.minimum, precision),
+            round(self.maximum, precision),
+            round(self.total / self.count, precision),
+        ]
+
+
+class DashboardFeed:
+    def __init__(self, precision: int = 2, max_callsigns: int = MAX_CALLSIGNS):
+        self.precision = precision
+        self.max_callsigns = max_callsigns
+        # callsign: {field: Series}, least recently heard first
+        self.series = OrderedDict()
+        self.state = OrderedDict()
+        self.sequence = 0
+        self.lock = threading.Lock()
+
+    def add(self, frame: TelemetryFrame):
+        with self.lock:
+            series = self.series.get(frame.callsign)
+            if series is None:
+                series = self.series[frame.callsign] = {}
+                while len(self.series) > self.max_callsigns:
+                    self.series.popitem(last=False)
+            else:
+                self.series.move_to_end(frame.callsign)
+            for field in FIELDS:
+                value = getattr(frame, field)
+                if value is None:
+                    continue
+                try:
+                    value = float(value)
+                except ValueError:
+                    continue
+                series.setdefault(field, Series()).add(value)
+
+    def tick(self) -> dict | None:
+        """Close the current interval and return its delta, or None if nothing changed."""
+        with self.lock:
+            series, self.series = self.series, OrderedDict()
+        changes = {}
+        for callsign, samples in series.items():
+            fields = self.state.get(callsign)
+            if fields is None:
+                fields = self.state[callsign] = {}
+                while len(self.state) > self.max_callsigns:
+                    evicted, _ = self.state.popitem(last=False)
+                    changes[evicted] = None
+            else:
+                self.state.move_to_end(callsign)
+            for field, values in samples.items():
+                value = values.display(self.precision)
+                if fields.get(field) != value:
+                    fields[field] = changes.setdefault(callsign, {})[field] = value
+        if not changes:
+            return None
+        self.sequence += 1
+        return self.message(changes)
+
+    def message(self, callsigns: dict) -> dict:
+        return {
+            "seq": self.sequence,
+            "time": datetime.now(UTC).isoformat().replace("+00:00", "Z"),
+            "callsigns": callsigns,
+        }
+
+    def snapshot(self) -> dict:
+        return self.message(self.state)
+
+
+def encode(message: dict) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode("utf-8")
+
+
+@click.command()
+@click.option("--mqtt_host", default="localhost", help="MQTT broker host")
+@click.option("--mqtt_port", default=1883, help="MQTT broker port")
+@click.option("--mqtt_topic", default="cubesatsim/data", help="MQTT topic to read frames from")
+@click.option("--dashboard_topic", default="cubesatsim/dashboard", help="MQTT topic to publish the feed to")
+@click.option("--mqtt_username", default=None, help="MQTT username (if required)")
+@click.option("--mqtt_password", default=None, help="MQTT password (if required)")
+@click.option("--interval", default=1.0, help="Seconds per display interval")
+@click.option("--precision", default=2, help="Decimal places values are rounded to before comparing")
+def main(mqtt_host, mqtt_port, mqtt_topic, dashboard_topic, mqtt_username, mqtt_password, interval, precision):
+    """Publish a decimated, delta-encoded dashboard feed."""
+    feed = DashboardFeed(precision)
+    state_topic = f"{dashboard_topic}/state"
+
+    def on_connect(client, userdata, flags, rc):
+        if rc == 0:
+            client.subscribe(mqtt_topic)
+            print(f"Subscribed to topic: {mqtt_topic}")
+
+    def on_message(client, userdata, message):
+        try:
+            frames = TelemetryFrame.from_payload(message.payload)
+        except (ValueError, struct.error) as e:
+            print(f"Failed to decode message: {e}")
+            return
+        for frame in frames:
+            feed.add(frame)
+
+    client = mqtt.Client()
+    if mqtt_username and mqtt_password:
+        client.username_pw_set(mqtt_username, mqtt_password)
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect_async(mqtt_host, mqtt_port, 60)
+    client.loop_start()
+
+    try:
+        while True:
+            sleep(interval)
+            delta = feed.tick()
+            if delta is None:
+                continue
+            client.publish(dashboard_topic, encode(delta))
+            client.publish(state_topic, encode(feed.snapshot()), retain=True)
+            print(f"Published dashboard update {delta['seq']}")
+    except KeyboardInterrupt:
+        print("Disconnecting from MQTT broker...")
+        client.disconnect()
+        client.loop_stop()
+
+
+if __name__ == "__main__":
+    main(auto_envvar_prefix="CUBESATSIM")
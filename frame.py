@@ -0,0 +1,108 @@
+"""A typed, slotted model of one decoded telemetry frame.
+
+The fields are declared once, from SECTIONS in main.py, so the parser's
+dicts, the wire formats, the columns and the gauges can't drift apart. A
+TelemetryFrame holds its values in __slots__ rather than a per-frame
+dict, which keeps buffered frames small, and it converts to and from
+the dict, JSON, binary and columnar forms the rest of the code uses.
+"""
+
+import json
+
+from main import SECTION_FIELDS
+from wire import decode_payload, encode_payload
+
+# Every field of a frame, and the type of its value when present
+SCHEMA = {
+    "callsign": str,
+    "latitude": str,
+    "longitude": str,
+    **dict.fromkeys(SECTION_FIELDS, float),
+    "timestamp": str,
+    "raw_aprs": str,
+    "source": str,
+}
+FRAME_FIELDS = tuple(SCHEMA)
+# Left out of to_dict() when unset, as decode_aprs() leaves them out
+OPTIONAL_FIELDS = ("raw_aprs", "source")
+POSITION_FIELDS = ("latitude", "longitude")
+
+
+class TelemetryFrame:
+    __slots__ = FRAME_FIELDS
+
+    def __init__(self, callsign: str = "", **fields):
+        self.callsign = callsign
+        for name in FRAME_FIELDS[1:]:
+            setattr(self, name, fields.pop(name, None))
+        if fields:
+            raise TypeError(f"Unknown telemetry fields: {', '.join(fields)}")
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in FRAME_FIELDS if getattr(self, name) is not None)
+        return f"TelemetryFrame({values})"
+
+    def __eq__(self, other):
+        if not isinstance(other, TelemetryFrame):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in FRAME_FIELDS)
+
+    def get(self, name: str, default=None):
+        """Read a field by name, like dict.get, so frames can go where dicts do."""
+        value = getattr(self, name, None) if name in SCHEMA else None
+        return default if value is None else value
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TelemetryFrame":
+        """Build a frame from a decoded dict; keys outside the schema are ignored."""
+        frame = cls.__new__(cls)
+        for name in FRAME_FIELDS:
+            setattr(frame, name, data.get(name))
+        if frame.callsign is None:
+            frame.callsign = ""
+        return frame
+
+    def to_dict(self) -> dict:
+        data = {name: getattr(self, name) for name in FRAME_FIELDS}
+        for name in OPTIONAL_FIELDS:
+            if data[name] is None:
+                del data[name]
+        return data
+
+    @classmethod
+    def from_json(cls, text: str | bytes) -> "TelemetryFrame":
+        return cls.from_dict(json.loads(text))
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    def position_strings(self) -> "TelemetryFrame":
+        """Turn a position carried as a number back into decode_aprs()'s string."""
+        for name in POSITION_FIELDS:
+            value = getattr(self, name)
+            if isinstance(value, float):
+                setattr(self, name, str(value))
+        return self
+
+    @classmethod
+    def from_payload(cls, payload: bytes) -> list["TelemetryFrame"]:
+        """Decode a data topic payload, JSON or binary, into frames."""
+        return [cls.from_dict(data).position_strings() for data in decode_payload(payload)]
+
+    @staticmethod
+    def to_payload(frames: list["TelemetryFrame"], payload_format: str = "json") -> bytes | str:
+        if payload_format == "binary":
+            # pack_frames reads fields with get(), so frames pack directly
+            return encode_payload(frames, payload_format)
+        return encode_payload([frame.to_dict() for frame in frames], payload_format)
+
+    @staticmethod
+    def to_columns(frames: list["TelemetryFrame"]):
+        """Gather frames into a columns.FrameColumns."""
+        from columns import FrameColumns
+
+        return FrameColumns.from_frames(frames)
+
+    @classmethod
+    def from_columns(cls, columns) -> list["TelemetryFrame"]:
+        return [cls.from_dict(row).position_strings() for row in columns.rows()]
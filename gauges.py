@@ -1,16 +1,16 @@
 from datetime import datetime
 import json
+import struct
+import threading
 from time import sleep
 
-from adafruit_servokit import ServoKit
-from ht16k33 import HT16K33SegmentGen
-import busio
-import board
-import digitalio
-import adafruit_character_lcd.character_lcd_spi as character_lcd
 import paho.mqtt.client as mqtt
 import click
 
+from actuators import Scheduler
+from devices import Hardware
+from frame import TelemetryFrame
+
 number_channels = 16
 servos = {
     "battery_current": 0,
@@ -23,32 +23,17 @@ servos = {
     "PLUS_Z_voltage": 7,
 }
 
-pca = ServoKit(channels=number_channels)
-
-i2c = busio.I2C(scl=board.SCL, sda=board.SDA)
-displays_enabled = False
-try:
-    frame_display = HT16K33SegmentGen(i2c, i2c_address=0x71, digits=8)
-    rx_freq_display = HT16K33SegmentGen(i2c, i2c_address=0x70, digits=8)
-    tx_freq_display = HT16K33SegmentGen(i2c, i2c_address=0x72, digits=8)
-    displays_enabled = True
-except OSError as e:
-    frame_display = None
-    rx_freq_display = None
-    tx_freq_display = None
-    print(f"Failed to initialize HT16K33 displays: {e}")
-
-spi = busio.SPI(board.SCK, MOSI=board.MOSI)
-latch = digitalio.DigitalInOut(board.D8)
-cols = 20
-rows = 4
-lcd = character_lcd.Character_LCD_SPI(spi, latch, cols, rows)
+# Devices are created on first use, so importing this module needs no hardware.
+# main() swaps in the backend chosen on the command line.
+hardware = Hardware()
 
 frame_count = 0
+# Timestamp of the newest retained snapshot shown
+restored_timestamp = ""
 
 
-def segment_display(led: HT16K33SegmentGen, message: str):
-    if not displays_enabled:
+def segment_display(led, message: str):
+    if not hardware.displays_enabled:
         print("Displays are not enabled.")
         return
     if len(message) < 8:
@@ -61,22 +46,26 @@ def segment_display(led: HT16K33SegmentGen, message: str):
     led.draw()
 
 
-def matrix_display(lcd: character_lcd.Character_LCD_SPI, payload: dict):
-    """Display a message on the LCD."""
-    if not displays_enabled:
-        print("Displays are not enabled.")
-        return
+def lcd_lines(frame: TelemetryFrame) -> list[str]:
+    return [
+        frame.callsign or "Unknown",
+        f"{frame.get('battery_voltage', 0.0)}V {frame.get('battery_current', 0.0)}mA",
+        f"{frame.get('mpu_roll', 0.0)}, {frame.get('mpu_pitch', 0.0)}, {frame.get('mpu_yaw', 0.0)}",
+        f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+    ]
 
-    lcd.clear()
 
-    message = ""
-    message += payload.get("callsign", "Unknown") + "\n"
-    message += f"{payload.get('battery_voltage', '0.0')}V {payload.get('battery_current', '0.0')}mA\n"
-    message += f"{payload.get('mpu_roll', '0.0')}, {payload.get('mpu_pitch', '0.0')}, {payload.get('mpu_yaw', '0.0')}\n"
-    message += f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+def write_lcd_line(row: int, text: str):
+    """Rewrite a single LCD row in place, padded to clear what was there."""
+    lcd = hardware.lcd
+    lcd.cursor_position(0, row)
+    lcd.message = text[: hardware.columns].ljust(hardware.columns)
+    print(f"LCD row {row}: {text}")
 
-    lcd.message = message
-    print(f"LCD Display: {message}")
+
+def write_servo(channel: int, servo_position: int):
+    print(f"Setting servo {channel} to position {servo_position}")
+    hardware.servo_kit.servo[channel].angle = servo_position
 
 
 def scale_voltage_to_servo(voltage):
@@ -87,41 +76,90 @@ def scale_voltage_to_servo(voltage):
     return int((voltage / 6.0) * 90)
 
 
+def servo_position_for(key: str, voltage):
+    if voltage is None:
+        return None
+    if key != "battery_current":
+        return scale_voltage_to_servo(voltage)
+    # For battery current, scale to a different range if needed
+    # Here we assume battery current is in mA and scale it to 0-90 degrees
+    # For battery current, center at 45 degrees and scale +/-45 degrees
+    # Assuming a typical range of 0-1000 mA
+    servo_position = 45 + int(((voltage / 1000.0) * 90) - 45)
+    # Ensure we stay within valid servo range (0-90)
+    return max(0, min(90, servo_position))
+
+
+# Displays and servos are slow I2C/SPI devices, so frames only queue up the
+# latest values here and the scheduler's own thread writes them out.
+scheduler = Scheduler()
+
+# The latest telemetry position for each servo channel, restored after a sweep
+servo_targets = {}
+latest_frame = None
+sweep_servos = True
+sweep_timer = None
+
+
+def add_devices(servo_rate: float, display_rate: float, lcd_rate: float):
+    scheduler.add_device("servos", write_servo, servo_rate)
+    scheduler.add_device("frame_display", lambda key, text: segment_display(hardware.frame_display, text), display_rate)
+    # The frequency displays are written once at startup, on the same bus
+    scheduler.add_device("freq_displays", lambda name, text: segment_display(getattr(hardware, name), text))
+    scheduler.add_device("lcd", write_lcd_line, lcd_rate)
+
+
+def show_frame(frame: TelemetryFrame, count: bool = True):
+    """Queue the display and servo updates for one decoded frame."""
+    global frame_count, latest_frame
+    latest_frame = frame
+    if count:
+        frame_count = frame_count + 1
+    # This runs on paho's network thread, so it mustn't wait for devices
+    # still initializing; the scheduler writes to them once they're up
+    if not hardware.displays_failed:
+        scheduler.submit("frame_display", 0, str(frame_count).zfill(8))
+        for row, line in enumerate(lcd_lines(frame)):
+            scheduler.submit("lcd", row, line)
+
+    for key, channel in servos.items():
+        servo_position = servo_position_for(key, getattr(frame, key))
+        if servo_position is not None:
+            servo_targets[channel] = servo_position
+            scheduler.submit("servos", channel, servo_position)
+        else:
+            print(f"No valid voltage for {key}, skipping servo {channel}")
+
+
 def on_message(client, userdata, message):
     """Callback function to handle incoming MQTT messages."""
+    global frame_count, restored_timestamp
     if message.topic == "cubesatsim/data":
         try:
-            data = json.loads(message.payload.decode("utf-8"))
-            print(f"Received message on topic {message.topic}: {data}")
-            global frame_count
-            frame_count = frame_count + 1
-            if displays_enabled:
-                segment_display(frame_display, str(frame_count).zfill(8))
-                matrix_display(lcd, data)
-        except json.JSONDecodeError as e:
-            print(f"Failed to decode JSON from message: {e}")
+            # Payloads may be JSON or packed binary, and may carry a batch of frames
+            frames = TelemetryFrame.from_payload(message.payload)
+        except (ValueError, struct.error) as e:
+            print(f"Failed to decode message: {e}")
             return
 
-        for key, channel in servos.items():
-            if key in data:
-                voltage = data[key]
-                if key != "battery_current":
-                    servo_position = scale_voltage_to_servo(voltage)
-                else:
-                    # For battery current, scale to a different range if needed
-                    # Here we assume battery current is in mA and scale it to 0-90 degrees
-                    # For battery current, center at 45 degrees and scale +/-45 degrees
-                    # Assuming a typical range of 0-1000 mA
-                    servo_position = 45 + int(((voltage / 1000.0) * 90) - 45)
-                    # Ensure we stay within valid servo range (0-90)
-                    servo_position = max(0, min(90, servo_position))
-                if servo_position is not None:
-                    print(f"Setting servo {channel} to position {servo_position} for {key}")
-                    pca.servo[channel].angle = servo_position
-                else:
-                    print(f"No valid voltage for {key}, skipping servo {channel}")
-            else:
-                print(f"{key} not found in message data, skipping servo {channel}")
+        for frame in frames:
+            print(f"Received message on topic {message.topic}: {frame}")
+            show_frame(frame)
+    elif message.topic.startswith("cubesatsim/snapshot/callsigns/"):
+        # Only the retained copies sent when we subscribe matter; live updates
+        # repeat what cubesatsim/data already delivered. Each callsign's
+        # arrives separately, so show whichever is newest.
+        if not message.retain or not message.payload:
+            return
+        try:
+            frame = TelemetryFrame.from_json(message.payload)
+        except ValueError as e:
+            print(f"Failed to decode snapshot: {e}")
+            return
+        if (frame.timestamp or "") > restored_timestamp:
+            restored_timestamp = frame.timestamp
+            print(f"Restoring last known state from snapshot: {frame}")
+            show_frame(frame, count=False)
     elif message.topic == "cubesatsim/actions":
         # Handle action messages
         try:
@@ -129,31 +167,47 @@ def on_message(client, userdata, message):
             print(f"Received action on topic {message.topic}: {action}")
 
             if action.get("action") == "reset":
-                init_servos()
+                servo_targets.clear()
+                init_servos(sweep_servos)
                 frame_count = 0
-                segment_display(frame_display, str(frame_count).zfill(8))
+                scheduler.submit("frame_display", 0, str(frame_count).zfill(8))
         except json.JSONDecodeError as e:
             print(f"Failed to decode JSON from action message: {e}")
             return
 
-def init_servos():
-    # Sweep all servos because it looks cool
-    for channel in range(number_channels):
-        pca.servo[channel].angle = 0
-        print(f"Sweeping servo {channel} to position 0")
-    sleep(1)
-    for channel in range(number_channels):
-        pca.servo[channel].angle = 90
-        print(f"Sweeping servo {channel} to position 90")
-    sleep(1)
-
-    # Zero all servos at startup
-    for channel in range(number_channels):
-        if channel == 0:
-            pca.servo[channel].angle = 45  # Center battery current servo
-        else:
-            pca.servo[channel].angle = 0
-        print(f"Initialized servo {channel} to position 0")
+def rest_position(channel: int) -> int:
+    # The battery current servo rests in the centre, the rest at zero
+    return 45 if channel == 0 else 0
+
+
+def init_servos(sweep: bool = True, step_seconds: float = 1.0):
+    """Move every servo to rest, sweeping them first because it looks cool.
+
+    The sweep runs on timers through the scheduler, so this returns at once
+    and frames keep flowing; when it finishes the servos go back to the
+    latest telemetry received during it.
+    """
+    global sweep_timer
+    if sweep_timer is not None:
+        sweep_timer.cancel()
+    steps = [lambda channel: 0, lambda channel: 90] if sweep else []
+    steps.append(rest_position)
+
+    def step(index: int):
+        global sweep_timer
+        for channel in range(hardware.channels):
+            scheduler.submit("servos", channel, steps[index](channel))
+        if index + 1 < len(steps):
+            sweep_timer = threading.Timer(step_seconds, step, (index + 1,))
+            sweep_timer.daemon = True
+            sweep_timer.start()
+            return
+        sweep_timer = None
+        for channel, servo_position in servo_targets.items():
+            scheduler.submit("servos", channel, servo_position)
+        print("Servos initialized")
+
+    step(0)
 
 
 @click.command()
@@ -167,7 +221,31 @@ def init_servos():
 )
 @click.option("--mqtt_username", default=None, help="MQTT username (if required)")
 @click.option("--mqtt_password", default=None, help="MQTT password (if required)")
-def main(mqtt_host, mqtt_port, mqtt_topic, action_mqtt_topic, mqtt_username, mqtt_password):
+@click.option("--servo_rate", default=10.0, help="Most servo updates per second (0 for no limit)")
+@click.option("--display_rate", default=5.0, help="Most segment display updates per second (0 for no limit)")
+@click.option("--lcd_rate", default=2.0, help="Most LCD updates per second (0 for no limit)")
+@click.option(
+    "--backend",
+    type=click.Choice(["real", "simulated"]),
+    default="real",
+    help="Drive the real gauge hardware or in-memory simulated devices",
+)
+@click.option("--record_path", default=None, help="Log every device write to this file as JSON lines")
+@click.option("--sweep/--no_sweep", default=True, help="Sweep the servos at startup and on reset")
+def main(
+    mqtt_host,
+    mqtt_port,
+    mqtt_topic,
+    action_mqtt_topic,
+    mqtt_username,
+    mqtt_password,
+    servo_rate,
+    display_rate,
+    lcd_rate,
+    backend,
+    record_path,
+    sweep,
+):
     """Connect to the MQTT broker and print connection status."""
     client = mqtt.Client()
     if mqtt_username and mqtt_password:
@@ -182,14 +260,26 @@ def main(mqtt_host, mqtt_port, mqtt_topic, action_mqtt_topic, mqtt_username, mqt
 
     client.loop_start()
 
-    # Initialize displays
-    segment_display(frame_display, "0")
-    segment_display(rx_freq_display, "434900")
-    segment_display(tx_freq_display, "435000")
-
-    matrix_display(lcd, {"callsign": "WAITING"})
-
-    init_servos()
+    global hardware, sweep_servos
+    hardware = Hardware(backend, number_channels, record_path=record_path)
+    sweep_servos = sweep
+    add_devices(servo_rate, display_rate, lcd_rate)
+    scheduler.start()
+
+    def hardware_ready():
+        # Runs on the initialization thread; the scheduler's thread owns the bus
+        scheduler.submit("freq_displays", "rx_freq_display", "434900")
+        scheduler.submit("freq_displays", "tx_freq_display", "435000")
+        if latest_frame is None:
+            if hardware.displays_enabled:
+                scheduler.submit("frame_display", 0, "0".zfill(8))
+            for row, line in enumerate(lcd_lines(TelemetryFrame("WAITING"))):
+                scheduler.submit("lcd", row, line)
+        init_servos(sweep_servos)
+
+    # Bring the devices up in the background; frames that arrive first are
+    # queued by the scheduler and written once each device is ready.
+    hardware.initialize(then=hardware_ready)
 
     client.subscribe(mqtt_topic)
     print(f"Subscribed to topic: {mqtt_topic}")
@@ -198,6 +288,10 @@ def main(mqtt_host, mqtt_port, mqtt_topic, action_mqtt_topic, mqtt_username, mqt
     client.subscribe(action_mqtt_topic)
     print(f"Subscribed to action topic: {action_mqtt_topic}")
 
+    # The parser keeps the latest frame retained here, so the gauges show
+    # it straight away rather than waiting for the next beacon
+    client.subscribe("cubesatsim/snapshot/callsigns/+")
+
     try:
         while True:
             sleep(0.1)  # Keep the script running
@@ -205,6 +299,7 @@ def main(mqtt_host, mqtt_port, mqtt_topic, action_mqtt_topic, mqtt_username, mqt
         print("Disconnecting from MQTT broker...")
         client.loop_stop()
         client.disconnect()
+        scheduler.stop()
 
 
 if __name__ == "__main__":
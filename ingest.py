@@ -0,0 +1,140 @@
+"""Byte-level stdin ingest for low-powered receivers.
+
+capture_stdin() decodes, strips and echoes every line as text, and
+decode_aprs() then slices and splits it again. On a Pi Zero 2 that churn
+costs more than the decoding itself. capture_stdin_bytes() instead reads
+sys.stdin.buffer into one reusable buffer and finds the APRS: lines with
+a single regex pass over each block, so other lines are never copied out
+at all. decode_aprs_bytes() parses the fields straight from the bytes,
+and only the callsign and raw_aprs, which are published, become text.
+
+Both give exactly what the text path gives. Lines with control or
+non-ASCII bytes, which the text path escapes and normalises, are rare
+and just handed to decode_aprs().
+"""
+
+from datetime import datetime
+import functools
+import re
+import sys
+from typing import BinaryIO, Generator
+
+from main import (
+    DIAGNOSTICS,
+    FRAMES_DECODED,
+    FRAMES_PARTIAL,
+    FRAMES_READ,
+    POSITION_CACHE_SIZE,
+    SECTION_FIELDS,
+    SECTION_PATTERN,
+    SECTIONS,
+    MINIMUM_VALUES,
+    STAGE_SECONDS,
+    check_header,
+    decode_aprs,
+    decode_position_strings,
+    truncated_sections,
+)
+
+BLOCK_BYTES = 64 * 1024
+
+# An APRS: line, after any leading whitespace str.strip() would remove
+LINE_PATTERN = re.compile(rb"(?m)^[ \t\r\x0b-\x0c\x1c-\x1f]*(APRS:[^\n]*)")
+BYTE_SECTION_PATTERN = re.compile(SECTION_PATTERN.pattern.encode("ascii"))
+BYTE_SECTIONS = {tag.encode("ascii"): (fields, MINIMUM_VALUES[tag]) for tag, fields in SECTIONS.items()}
+BYTE_TAGS = {tag.encode("ascii"): fields for tag, fields in SECTIONS.items()}
+# Bytes the text path would escape or treat differently
+UNUSUAL_BYTES = re.compile(rb"[^\t\n\r\x20-\x7e]")
+
+
+def capture_stdin_bytes(
+    stream: BinaryIO | None = None, block_bytes: int = BLOCK_BYTES, recorder=None
+) -> Generator[bytes]:
+    """Yield each stripped APRS: line of stream, stdin by default, as bytes.
+
+    Unlike capture_stdin() the lines aren't echoed.
+    """
+    if stream is None:
+        stream = sys.stdin.buffer
+    buffer = bytearray(block_bytes)
+    filled = 0
+    try:
+        print("Listening for APRS data on stdin. Press Ctrl+C to exit.")
+        while True:
+            if filled == len(buffer):
+                # A line longer than the buffer
+                buffer.extend(bytes(len(buffer)))
+            with STAGE_SECONDS.time("read"):
+                with memoryview(buffer) as view:
+                    # readinto1 returns what's available rather than waiting
+                    # for a whole block, so live frames aren't held back
+                    count = stream.readinto1(view[filled:])
+            if not count:
+                break
+            filled += count
+            end = buffer.rfind(b"\n", filled - count, filled) + 1
+            if not end:
+                continue
+            for match in LINE_PATTERN.finditer(buffer, 0, end):
+                FRAMES_READ.inc()
+                line = match.group(1).rstrip()
+                if recorder is not None:
+                    recorder.write(line.decode("utf-8", errors="replace"))
+                yield line
+            buffer[: filled - end] = buffer[end:filled]
+            filled -= end
+        # A last line with no newline
+        for match in LINE_PATTERN.finditer(buffer, 0, filled):
+            FRAMES_READ.inc()
+            line = match.group(1).rstrip()
+            if recorder is not None:
+                recorder.write(line.decode("utf-8", errors="replace"))
+            yield line
+    except KeyboardInterrupt:
+        pass
+
+
+@functools.lru_cache(maxsize=POSITION_CACHE_SIZE)
+def decode_position_bytes(encoded_position: bytes) -> tuple[str, str] | None:
+    return decode_position_strings(encoded_position.decode("ascii"))
+
+
+def decode_sections_bytes(encoded: bytes) -> dict:
+    data = dict.fromkeys(SECTION_FIELDS)
+    for match in BYTE_SECTION_PATTERN.finditer(encoded):
+        fields, minimum = BYTE_SECTIONS[match.group(1)]
+        values = match.group(2).split()
+        if len(values) >= minimum and data[fields[0]] is None:
+            data.update(zip(fields, map(float, values)))
+    return data
+
+
+def decode_aprs_bytes(aprs: bytes) -> dict:
+    """Decode an APRS: line given as bytes, as decode_aprs() would.
+
+    Only frames with a good header and position are decoded here; the
+    rest are rare enough to hand to decode_aprs() to reject or salvage.
+    """
+    if UNUSUAL_BYTES.search(aprs):
+        return decode_aprs(aprs.decode("utf-8", errors="replace").strip())
+    with STAGE_SECONDS.time("decode"):
+        aprs = aprs[5:].strip()
+
+        header = aprs.split(b" ", 1)[0].split(b">")
+        callsign = header[0].decode("ascii")
+        position = decode_position_bytes(header[1]) if len(header) > 1 else None
+        if position is None or check_header([callsign]) is not None:
+            return decode_aprs("APRS:" + aprs.decode("ascii"))
+        data = {"callsign": callsign}
+        data["latitude"], data["longitude"] = position
+
+        data.update(decode_sections_bytes(aprs))
+
+        data["timestamp"] = datetime.utcnow().isoformat() + "Z"
+        data["raw_aprs"] = aprs.decode("ascii")
+
+    if truncated_sections(aprs, data, BYTE_TAGS):
+        FRAMES_PARTIAL.inc("truncated_sections")
+        DIAGNOSTICS.report("truncated_sections", data["raw_aprs"])
+    FRAMES_DECODED.inc()
+    return data
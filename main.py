@@ -1,33 +1,115 @@
+"""Decode CubeSatSim APRS beacons from stdin and publish them over MQTT.
+
+The container restarts this at the end of a pipe, so imports are kept to
+what reading and decoding need: paho is imported when the client is
+created, latloncalc only by decode_position(), which the parser itself
+no longer uses, and everything behind an option when it's enabled.
+"""
+
+import collections
 from datetime import datetime
-import json
+import functools
 import sys
 import re
-from typing import Generator
+import threading
+import time
+from typing import TYPE_CHECKING, Generator
 
 import click
-from latloncalc.latlon import LatLon, string2latlon
-import paho.mqtt.client as mqtt
 
+from metrics import (
+    FRAMES_DECODED,
+    FRAMES_FAILED,
+    FRAMES_PARTIAL,
+    FRAMES_READ,
+    MQTT_RECONNECTS,
+    STAGE_SECONDS,
+    STARTUP_DROPPED,
+    PublishTracker,
+    serve as serve_metrics,
+)
+
+if TYPE_CHECKING:
+    from latloncalc.latlon import LatLon
 
-def capture_stdin() -> Generator[str]:
+
+def capture_stdin(recorder=None) -> Generator[str]:
     try:
         print("Listening for APRS data on stdin. Press Ctrl+C to exit.")
-        for line in iter(sys.stdin.readline, ""):
-            line = line.strip()
-            if line.startswith("APRS:"):
+        while True:
+            # Waiting for the next line is idle time, not parser cost
+            line = sys.stdin.readline()
+            if not line:
+                break
+            with STAGE_SECONDS.time("read"):
+                line = line.strip()
+                if not line.startswith("APRS:"):
+                    continue
+                FRAMES_READ.inc()
+                if recorder is not None:
+                    recorder.write(line)
                 sys.stdout.write(f"Received line: {line}\n")
                 sys.stdout.flush()
-                yield line
+            yield line
     except KeyboardInterrupt:
         sys.stdout.flush()
         pass
 
 
-def decode_position(encoded_position: str) -> LatLon:
-    positions = re.findall(
-        r"[0-9]{4}\.[0-9]{2}[A-Z]",
-        encoded_position.encode("unicode_escape").replace(b"\\x", b"").decode(),
-    )
+# Telemetry sections the CubeSatSim firmware appends to each beacon, keyed on
+# the tag that introduces them. Each tag is followed by its values in the
+# order of the field names listed here.
+SECTIONS = {
+    "BAT": ("battery_voltage", "battery_current"),
+    "BME280": ("bme_temperature", "bme_pressure", "bme_altitude", "bme_humidity"),
+    "MPU6050": ("mpu_yaw", "mpu_pitch", "mpu_roll"),
+    "VOL": (
+        "PLUS_X_voltage",
+        "MINUS_X_voltage",
+        "PLUS_Y_voltage",
+        "MINUS_Y_voltage",
+        "PLUS_Z_voltage",
+        "MINUS_Z_voltage",
+        "BAT_voltage",
+        "BUS_voltage",
+    ),
+    "GPS": ("gps_latitude", "gps_longitude", "gps_altitude"),
+    "TMP": ("mcu_temperature",),
+}
+SECTION_FIELDS = tuple(field for fields in SECTIONS.values() for field in fields)
+# Trailing values not every firmware version sends; a section without
+# them still decodes, with those fields left as None.
+OPTIONAL_FIELDS = {"VOL": ("BUS_voltage",)}
+MINIMUM_VALUES = {
+    tag: len(fields) - len(OPTIONAL_FIELDS.get(tag, ())) for tag, fields in SECTIONS.items()
+}
+
+SECTION_PATTERN = re.compile(
+    r"\b(" + "|".join(SECTIONS) + r")((?: [+-]?\d+\.\d+)+)"
+)
+POSITION_PATTERN = re.compile(r"[0-9]{4}\.[0-9]{2}[A-Z]")
+# An AX.25 style callsign with an optional SSID; anything else in front of
+# the path is taken to be noise that got past the receiver's CRC check
+CALLSIGN_PATTERN = re.compile(r"[A-Za-z0-9]{1,9}(?:-[A-Za-z0-9]{1,3})?")
+POSITION_CACHE_SIZE = 1024
+# How long to keep sending queued frames after the input ends
+OUTBOX_DRAIN_SECONDS = 5.0
+# How often to check for passes whose gap has gone by
+PASS_EXPIRY_INTERVAL = 30.0
+
+# multimon-ng passes control bytes in the position through untouched; spell
+# them out as hex digits the same way a unicode_escape round trip would.
+_ESCAPE_CONTROL = {
+    code: f"{code:02x}"
+    for code in (*range(0x20), *range(0x7F, 0x100))
+    if chr(code) not in "\t\n\r"
+}
+
+
+def decode_position(encoded_position: str) -> "LatLon":
+    from latloncalc.latlon import string2latlon
+
+    positions = POSITION_PATTERN.findall(encoded_position.translate(_ESCAPE_CONTROL))
 
     spaced_latitude = (
         f"{positions[0][:2]} {positions[0][2:4]} {positions[0][5:7]} {positions[0][7:]}"
@@ -38,108 +120,193 @@ def decode_position(encoded_position: str) -> LatLon:
     return string2latlon(spaced_latitude, spaced_longitude, "d% %m% %S% %H")
 
 
+def decode_coordinate(token: str, hemispheres: str) -> float:
+    """Convert a ddmm.hhH position token to decimal degrees without latloncalc.
+
+    Gives exactly the value string2latlon reports for the spaced form built
+    in decode_position, including its degree/minute/second normalisation.
+    """
+    if token[7] not in hemispheres:
+        raise ValueError(f"Unexpected hemisphere in position {token}")
+    sign = -1.0 if token[7] == hemispheres[1] else 1.0
+    decimal_degree = (
+        sign * float(token[:2]) + sign * float(token[2:4]) / 60.0 + sign * float(token[5:7]) / 3600.0
+    )
+
+    magnitude = abs(decimal_degree)
+    degree = magnitude // 1
+    decimal_minute = (magnitude - degree) * 60.0
+    minute = decimal_minute // 1
+    second = (decimal_minute - minute) * 60.0
+    sign = (decimal_degree > 0) - (decimal_degree < 0)
+    return degree * sign + minute * sign / 60.0 + second * sign / 3600.0
+
+
+@functools.lru_cache(maxsize=POSITION_CACHE_SIZE)
+def decode_position_strings(encoded_position: str) -> tuple[str, str] | None:
+    """Decode a position token to latitude and longitude decimal degree strings.
+
+    Returns None, rather than raising, when the token doesn't hold a
+    latitude and a longitude. Beacons repeat the same position, so results
+    are cached on the raw token; decode_position_strings.cache_info()
+    reports the hits and misses.
+    """
+    positions = POSITION_PATTERN.findall(encoded_position.translate(_ESCAPE_CONTROL))
+    if len(positions) < 2 or positions[0][7] not in "NS" or positions[1][7] not in "EW":
+        return None
+    return (
+        str(decode_coordinate(positions[0], "NS")),
+        str(decode_coordinate(positions[1], "EW")),
+    )
+
+
+def decode_sections(encoded: str) -> dict:
+    """Decode every telemetry section in a single pass over the line.
+
+    Fields belonging to sections that are missing or truncated are None.
+    """
+    data = dict.fromkeys(SECTION_FIELDS)
+    for match in SECTION_PATTERN.finditer(encoded):
+        tag = match.group(1)
+        fields = SECTIONS[tag]
+        values = match.group(2).split()
+        # The first complete copy of a section wins
+        if len(values) >= MINIMUM_VALUES[tag] and data[fields[0]] is None:
+            data.update(zip(fields, map(float, values)))
+    return data
+
+
+def decode_section(encoded: str, tag: str) -> dict:
+    decoded = decode_sections(encoded)
+    return {field: decoded[field] for field in SECTIONS[tag]}
+
+
 def decode_battery(encoded_battery: str) -> dict:
-    search = re.search("BAT ([\\d]+\\.[\\d]+) ([+-]?\\d+\\.\\d+) ", encoded_battery)
-    return {
-        "battery_voltage": float(search.group(1)) if search else None,
-        "battery_current": float(search.group(2)) if search else None,
-    }
+    return decode_section(encoded_battery, "BAT")
 
 
 def decode_bme_sensor(encoded_bme: str) -> dict:
-    search = re.search(
-        "BME280 ([\\d]+\\.[\\d]+) ([\\d]+\\.[\\d]+) ([\\d]+\\.[\\d]+) ([\\d]+\\.[\\d]+)",
-        encoded_bme,
-    )
-    return {
-        "bme_temperature": float(search.group(1)) if search else None,
-        "bme_pressure": float(search.group(2)) if search else None,
-        "bme_altitude": float(search.group(3)) if search else None,
-        "bme_humidity": float(search.group(4)) if search else None,
-    }
+    return decode_section(encoded_bme, "BME280")
 
 
 def decode_mpu6050(encoded_mpu: str) -> dict:
-    search = re.search(
-        "MPU6050 ([+-]?[\\d]+\\.[\\d]+) ([+-]?[\\d]+\\.[\\d]+) ([+-]?[\\d]+\\.[\\d]+)",
-        encoded_mpu,
-    )
-    return {
-        "mpu_yaw": float(search.group(1)) if search else None,
-        "mpu_pitch": float(search.group(2)) if search else None,
-        "mpu_roll": float(search.group(3)) if search else None,
-    }
+    return decode_section(encoded_mpu, "MPU6050")
 
 
 def decode_gps(encoded_gps: str) -> dict:
-    search = re.search(
-        "GPS ([+-]?[\\d]+\\.[\\d]+) ([+-]?[\\d]+\\.[\\d]+) ([+-]?[\\d]+\\.[\\d]+)",
-        encoded_gps,
-    )
-    return {
-        "gps_latitude": float(search.group(1)) if search else None,
-        "gps_longitude": float(search.group(2)) if search else None,
-        "gps_altitude": float(search.group(3)) if search else None,
-    }
+    return decode_section(encoded_gps, "GPS")
 
 
 def decode_mcu_temp(encoded_mcu: str) -> dict:
-    search = re.search("TMP ([\\d]+\\.[\\d]+)", encoded_mcu)
-    return {
-        "mcu_temperature": float(search.group(1)) if search else None,
-    }
+    return decode_section(encoded_mcu, "TMP")
 
 
 def decode_voltages(encoded_voltages: str) -> dict:
-    search = re.search(
-        "VOL ([\\d]+\\.[\\d]+) ([\\d]+\\.[\\d]+) ([\\d]+\\.[\\d]+) ([\\d]+\\.[\\d]+) ([\\d]+\\.[\\d]+) ([\\d]+\\.[\\d]+) ([\\d]+\\.[\\d]+)",
-        encoded_voltages,
-    )
-    return {
-        "PLUS_X_voltage": float(search.group(1)) if search else None,
-        "MINUS_X_voltage": float(search.group(2)) if search else None,
-        "PLUS_Y_voltage": float(search.group(3)) if search else None,
-        "MINUS_Y_voltage": float(search.group(4)) if search else None,
-        "PLUS_Z_voltage": float(search.group(5)) if search else None,
-        "MINUS_Z_voltage": float(search.group(6)) if search else None,
-        "BAT_voltage": float(search.group(7)) if search else None,
-    }
+    return decode_section(encoded_voltages, "VOL")
+
+
+class DiagnosticLog:
+    """Report rejected and partial frames on stderr, sampled and rate limited.
+
+    The first frame of each reason in every `interval` seconds is written
+    out, with a count of those passed over since, so a noisy pass costs
+    one line per reason rather than one per frame.
+    """
+
+    def __init__(self, interval: float = 10.0, clock=time.monotonic):
+        self.interval = interval
+        self.clock = clock
+        self.next_report = {}
+        self.suppressed = collections.Counter()
+
+    def report(self, reason: str, aprs: str):
+        now = self.clock()
+        if now < self.next_report.get(reason, now):
+            self.suppressed[reason] += 1
+            return
+        self.next_report[reason] = now + self.interval
+        suppressed = self.suppressed.pop(reason, 0)
+        more = f" (and {suppressed} more since the last)" if suppressed else ""
+        sys.stderr.write(f"Malformed APRS data, {reason.replace('_', ' ')}{more}: {aprs[:120]!r}\n")
+        sys.stderr.flush()
+
+
+DIAGNOSTICS = DiagnosticLog()
+
+
+def reject(reason: str, aprs: str) -> dict:
+    FRAMES_FAILED.inc(reason)
+    DIAGNOSTICS.report(reason, aprs)
+    return {}
+
+
+def check_header(header: list) -> str | None:
+    """Say what's wrong with a line's "CALLSIGN>PATH" token, split on ">"."""
+    if not CALLSIGN_PATTERN.fullmatch(header[0]):
+        return "noise"
+    if len(header) < 2:
+        return "bad_header"
+    return None
+
+
+def truncated_sections(encoded: str | bytes, data: dict, tags: dict = SECTIONS) -> bool:
+    """Whether a section is named in the line but didn't decode, being cut short."""
+    return any(data[fields[0]] is None and tag in encoded for tag, fields in tags.items())
 
 
 def decode_aprs(aprs: str) -> dict:
-    """Decode the APRS data."""
-    data = {}
-    try:
+    """Decode the APRS data.
+
+    Lines are checked as they're taken apart rather than decoded under a
+    try/except, so a malformed line costs a comparison or two. Lines with
+    no callsign and path are rejected as "noise" or "bad_header". A frame
+    with no position ("no_position") or with sections cut short
+    ("truncated_sections") keeps whatever did decode, with the rest None;
+    only one with neither a position nor any section is rejected.
+    """
+    with STAGE_SECONDS.time("decode"):
         # Remove the 'APRS:' prefix
         aprs = aprs[5:].strip()
 
-        # Split the APRS data into parts
-        parts = aprs.split(" ")
+        # Extract the callsign and position from the header
+        header = aprs.split(" ", 1)[0].split(">")
+        reason = check_header(header)
+        if reason is not None:
+            return reject(reason, aprs)
 
-        # Extract the callsign and position
-        callsign, position = parts[0].split(">")[0], parts[0].split(">")[1]
-        data["callsign"] = callsign
-        latlng = decode_position(position)
-        data["latitude"] = latlng.lat.to_string("D")
-        data["longitude"] = latlng.lon.to_string("D")
+        data = {"callsign": header[0]}
+        position = decode_position_strings(header[1])
+        data["latitude"], data["longitude"] = position or (None, None)
 
-        data.update(decode_battery(aprs))
-        data.update(decode_bme_sensor(aprs))
-        data.update(decode_mpu6050(aprs))
-        data.update(decode_voltages(aprs))
+        data.update(decode_sections(aprs))
+        if position is None:
+            if all(data[field] is None for field in SECTION_FIELDS):
+                return reject("no_position", aprs)
+            reason = "no_position"
+        elif truncated_sections(aprs, data):
+            reason = "truncated_sections"
 
         data["timestamp"] = datetime.utcnow().isoformat() + "Z"
 
         # Add raw APRS data
         data["raw_aprs"] = aprs
 
-    except Exception as e:
-        sys.stderr.write(f"Error decoding APRS data: {e}\n")
-        sys.stderr.flush()
-        return {}
+    if reason is not None:
+        FRAMES_PARTIAL.inc(reason)
+        DIAGNOSTICS.report(reason, aprs)
+    FRAMES_DECODED.inc()
     return data
 
 
+def create_mqtt_client(mqtt_username: str, mqtt_password: str):
+    import paho.mqtt.client as mqtt
+
+    client = mqtt.Client()
+    if mqtt_username and mqtt_password:
+        client.username_pw_set(mqtt_username, mqtt_password)
+    return client
+
+
 def connect_to_mqtt(
     mqtt_host: str,
     mqtt_port: int,
@@ -147,21 +314,66 @@ def connect_to_mqtt(
     mqtt_password: str,
 ):
 
-    client = mqtt.Client()
-    if mqtt_username and mqtt_password:
-        client.username_pw_set(mqtt_username, mqtt_password)
-
+    client = create_mqtt_client(mqtt_username, mqtt_password)
     client.connect(mqtt_host, mqtt_port, 60)
     return client
 
 
+class StartupBuffer:
+    """Hold messages published before the first connection and send them once it's up.
+
+    paho drops QoS 0 messages published while it isn't connected, which
+    would lose the frames read while a restarted parser reaches the
+    broker. After the first connection, publishes go straight to paho.
+    Once max_messages are held the oldest are dropped, and counted in
+    cubesatsim_startup_dropped_total.
+    """
+
+    def __init__(self, client, max_messages: int = 1000):
+        self.client = client
+        self.pending = collections.deque(maxlen=max_messages)
+        self.connected = False
+        self.flushed = threading.Event()
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def publish(self, topic: str, payload=None, qos: int = 0, retain: bool = False, tracker=None):
+        """Publish like client.publish, passing what paho returns to tracker.track() if given."""
+        if not self.connected:
+            with self.lock:
+                if not self.connected:
+                    if len(self.pending) == self.pending.maxlen:
+                        if not self.dropped:
+                            sys.stderr.write("Startup buffer full, dropping the oldest messages until the broker connects\n")
+                        self.dropped += 1
+                        STARTUP_DROPPED.inc()
+                    self.pending.append((topic, payload, qos, retain, tracker))
+                    return None
+        info = self.client.publish(topic, payload, qos, retain)
+        return info if tracker is None else tracker.track(info)
+
+    def on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            return
+        with self.lock:
+            while self.pending:
+                topic, payload, qos, retain, tracker = self.pending.popleft()
+                info = client.publish(topic, payload, qos, retain)
+                if tracker is not None:
+                    tracker.track(info)
+            self.connected = True
+        if self.dropped:
+            sys.stderr.write(f"Startup buffer dropped {self.dropped} message(s) before the broker connected\n")
+        self.flushed.set()
+
+
 def reconnect_to_mqtt(client, userdata, rc):
-    """Reconnect to the MQTT broker."""
+    """Report a lost connection; paho's network loop reconnects with backoff."""
     if rc != 0:
+        MQTT_RECONNECTS.inc()
         print(f"MQTT connection failed with code {rc}. Reconnecting...")
-        client.reconnect()
     else:
-        print("Connected to MQTT broker successfully.")
+        print("Disconnected from MQTT broker.")
 
 @click.command()
 @click.option("--mqtt_host", default="localhost", help="MQTT broker host")
@@ -171,19 +383,380 @@ def reconnect_to_mqtt(client, userdata, rc):
 )
 @click.option("--mqtt_username", default=None, help="MQTT username (if required)")
 @click.option("--mqtt_password", default=None, help="MQTT password (if required)")
-def main(mqtt_host, mqtt_port, mqtt_topic, mqtt_username, mqtt_password):
+@click.option(
+    "--async_pipeline",
+    is_flag=True,
+    help="Read, decode and publish in separate asyncio stages",
+)
+@click.option(
+    "--source",
+    "source_specs",
+    multiple=True,
+    help="Read from this source as well as or instead of stdin; repeat for more "
+    "receivers (stdin, pipe:PATH, tcp:HOST:PORT, listen:HOST:PORT, udp:HOST:PORT, cmd:COMMAND, "
+    "each optionally prefixed with NAME=). Implies --async_pipeline",
+)
+@click.option(
+    "--byte_ingest",
+    is_flag=True,
+    help="Read stdin as bytes in large blocks and decode frames straight from them, without echoing each line",
+)
+@click.option(
+    "--queue_size", default=1000, help="Capacity of each asyncio pipeline queue"
+)
+@click.option(
+    "--overflow",
+    type=click.Choice(["block", "drop_oldest"]),
+    default="drop_oldest",
+    help="What a full asyncio pipeline queue does with new frames",
+)
+@click.option(
+    "--stats_interval",
+    default=0.0,
+    help="Seconds between asyncio pipeline queue reports (0 to disable)",
+)
+@click.option(
+    "--payload_format",
+    type=click.Choice(["json", "binary"]),
+    default="json",
+    help="Publish JSON, or the compact packed binary format from wire.py",
+)
+@click.option("--batch_size", default=1, help="Publish up to this many frames per message")
+@click.option(
+    "--batch_ms",
+    default=0,
+    help="Publish a partial batch this many milliseconds after its first frame (0 to wait for a full batch)",
+)
+@click.option(
+    "--store_path",
+    default=None,
+    help="Directory to keep a queryable history of decoded frames in",
+)
+@click.option(
+    "--record_path",
+    default=None,
+    help="Append every APRS: line read, with its arrival time, to this file for replay.py",
+)
+@click.option(
+    "--dedup_window",
+    default=0.0,
+    help="Drop repeats of a frame seen within this many seconds, e.g. via digipeaters (0, the default, keeps every frame)",
+)
+@click.option(
+    "--dedup_size", default=10000, help="Most recent frames to remember for deduplication"
+)
+@click.option(
+    "--qos",
+    type=click.IntRange(0, 2),
+    default=0,
+    help="MQTT QoS to publish frames with",
+)
+@click.option(
+    "--outbox_path",
+    default=None,
+    help="Directory to queue frames in on disk until the broker acknowledges them",
+)
+@click.option(
+    "--outbox_rate", default=20.0, help="Most outbox messages to send per second, e.g. when replaying after an outage"
+)
+@click.option(
+    "--outbox_size_mb", default=64, help="Largest the outbox may grow before its oldest messages are dropped"
+)
+@click.option(
+    "--snapshot_topic",
+    default="cubesatsim/snapshot",
+    help="Prefix for a retained latest frame per callsign under /callsigns/, answering requests on its /get subtopic "
+    "(empty to disable)",
+)
+@click.option(
+    "--field_topic",
+    default="cubesatsim/latest",
+    help="Prefix for retained per-callsign, per-field latest value topics (empty to disable)",
+)
+@click.option(
+    "--alert_topic",
+    default="cubesatsim/alerts",
+    help="Topic for threshold and anomaly alerts on the battery, panel voltages and BME280 readings (empty to disable)",
+)
+@click.option(
+    "--alert_rule",
+    "alert_rules",
+    multiple=True,
+    help="Alert when FIELD leaves LOW..HIGH or changes by more than CHANGE in one frame, "
+    "as FIELD:LOW:HIGH[:CHANGE] with any limit left empty; repeat for more fields",
+)
+@click.option("--alert_window", default=60, help="Frames the rolling minimum and maximum cover")
+@click.option(
+    "--alert_zscore",
+    default=4.0,
+    help="Flag values this many standard deviations from their moving average as anomalies (0 to disable)",
+)
+@click.option(
+    "--pass_topic",
+    default="cubesatsim/passes",
+    help="Topic for a summary of each pass of each callsign as it ends (empty to disable)",
+)
+@click.option(
+    "--pass_path", default=None, help="Also append each pass summary to this file, for passes.py to roll up"
+)
+@click.option("--pass_gap", default=600.0, help="Seconds without a frame from a callsign that end its pass")
+@click.option(
+    "--pass_interval",
+    default=None,
+    type=float,
+    help="Seconds between beacons, for pass loss rates (default: the shortest gap seen in the pass)",
+)
+@click.option(
+    "--diagnostic_interval",
+    default=10.0,
+    help="Seconds between reports of malformed frames of the same kind on stderr",
+)
+@click.option(
+    "--metrics_port",
+    default=0,
+    help="Port to serve Prometheus metrics on at /metrics (0 to disable)",
+)
+def main(
+    mqtt_host,
+    mqtt_port,
+    mqtt_topic,
+    mqtt_username,
+    mqtt_password,
+    async_pipeline,
+    source_specs,
+    byte_ingest,
+    queue_size,
+    overflow,
+    stats_interval,
+    payload_format,
+    batch_size,
+    batch_ms,
+    store_path,
+    record_path,
+    dedup_window,
+    dedup_size,
+    qos,
+    outbox_path,
+    outbox_rate,
+    outbox_size_mb,
+    snapshot_topic,
+    field_topic,
+    alert_topic,
+    alert_rules,
+    alert_window,
+    alert_zscore,
+    pass_topic,
+    pass_path,
+    pass_gap,
+    pass_interval,
+    diagnostic_interval,
+    metrics_port,
+):
     """Capture stdin and print each line."""
-    client = connect_to_mqtt(
-        mqtt_host, mqtt_port, mqtt_username, mqtt_password
-    )
-    client.on_disconnect = reconnect_to_mqtt
-    for aprs in capture_stdin():
-        data = decode_aprs(aprs)
+    DIAGNOSTICS.interval = diagnostic_interval
+    if metrics_port:
+        serve_metrics(metrics_port)
+
+    store = None
+    if store_path:
+        from store import TelemetryStore
+
+        store = TelemetryStore(store_path)
+
+    dedup = None
+    if dedup_window:
+        from dedup import Deduplicator
+
+        dedup = Deduplicator(dedup_window, dedup_size)
+
+    recorder = None
+    if record_path:
+        from recorder import LineRecorder
+
+        recorder = LineRecorder(record_path)
+
+    sources = None
+    if source_specs:
+        from sources import parse_source
+
+        try:
+            sources = [parse_source(spec) for spec in source_specs]
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--source")
+        async_pipeline = True
+    if byte_ingest and async_pipeline:
+        raise click.UsageError("--byte_ingest can't be combined with --async_pipeline or --source")
+
+    rules = None
+    if alert_topic:
+        from alerts import parse_rule
+
+        try:
+            rules = [parse_rule(spec) for spec in alert_rules]
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--alert_rule")
+
+    def create_alerts(client):
+        if not alert_topic:
+            return None
+        from alerts import AlertEngine, AlertPublisher
+
+        return AlertPublisher(client, AlertEngine(rules, alert_window, zscore=alert_zscore), alert_topic)
+
+    def create_passes(client):
+        if not pass_topic and not pass_path:
+            return None
+        from passes import PassAggregator, PassPublisher
+
+        return PassPublisher(client, PassAggregator(pass_gap, pass_interval), pass_topic, pass_path)
+
+    if async_pipeline:
+        import asyncio
+
+        from pipeline import run
+
+        client = create_mqtt_client(mqtt_username, mqtt_password)
+        outbox = None
+        if outbox_path:
+            from outbox import Outbox
+
+            outbox = Outbox(outbox_path, client, qos, outbox_rate, max_bytes=outbox_size_mb * 1024 * 1024).start()
+        snapshots = None
+        if snapshot_topic:
+            from snapshot import SnapshotPublisher
+
+            snapshots = SnapshotPublisher(client, snapshot_topic, field_topic)
+        asyncio.run(
+            run(
+                client,
+                mqtt_host,
+                mqtt_port,
+                mqtt_topic,
+                queue_size=queue_size,
+                overflow=overflow,
+                stats_interval=stats_interval,
+                payload_format=payload_format,
+                batch_size=batch_size,
+                batch_ms=batch_ms,
+                store=store,
+                dedup=dedup,
+                sources=sources,
+                recorder=recorder,
+                snapshots=snapshots,
+                alerts=create_alerts(client),
+                passes=create_passes(client),
+                qos=qos,
+                outbox=outbox,
+            )
+        )
+        if outbox is not None:
+            outbox.close()
+        if store is not None:
+            store.close()
+        return
+
+    # Connect in the background: paho's network loop keeps retrying, with
+    # backoff, until the broker is reachable, and again after any outage.
+    # Reading stdin starts straight away; frames, snapshots, alerts and pass
+    # summaries published before the first connection wait in startup_buffer.
+    client = create_mqtt_client(mqtt_username, mqtt_password)
+    client.reconnect_delay_set(1, 30)
+    client.connect_async(mqtt_host, mqtt_port, 60)
+    startup_buffer = StartupBuffer(client)
+
+    from wire import Batcher, encode_payload
+
+    tracker = PublishTracker(client)
+    outbox = None
+    if outbox_path:
+        from outbox import Outbox
+
+        outbox = Outbox(outbox_path, client, qos, outbox_rate, max_bytes=outbox_size_mb * 1024 * 1024)
+        outbox.attach(tracker)
+
+    def on_disconnect(client, userdata, rc):
+        reconnect_to_mqtt(client, userdata, rc)
+        if outbox is not None:
+            outbox.on_disconnect(client, userdata, rc)
+
+    client.on_disconnect = on_disconnect
+    snapshots = None
+    if snapshot_topic:
+        from snapshot import SnapshotPublisher
+
+        snapshots = SnapshotPublisher(client, snapshot_topic, field_topic, publisher=startup_buffer)
+
+    def on_connect(client, userdata, flags, rc):
+        startup_buffer.on_connect(client, userdata, flags, rc)
+        if snapshots is not None:
+            snapshots.on_connect(client, userdata, flags, rc)
+
+    client.on_connect = on_connect
+    alerts = create_alerts(startup_buffer)
+    passes = create_passes(startup_buffer)
+    client.loop_start()
+    if passes is not None:
+        passes.start(PASS_EXPIRY_INTERVAL)
+    if outbox is not None:
+        outbox.start()
+
+    def publish(frames):
+        with STAGE_SECONDS.time("serialize"):
+            payload = encode_payload(frames, payload_format)
+        with STAGE_SECONDS.time("publish"):
+            if outbox is not None:
+                outbox.publish(mqtt_topic, payload)
+            else:
+                startup_buffer.publish(mqtt_topic, payload, qos, tracker=tracker)
+        print(f"Published {len(frames)} frame(s) to {mqtt_topic}")
+        if snapshots is not None:
+            for data in frames:
+                snapshots.update(data)
+        if alerts is not None:
+            for data in frames:
+                alerts.update(data)
+        if passes is not None:
+            for data in frames:
+                passes.update(data)
+        if store is not None:
+            for data in frames:
+                store.append(data)
+            store.flush()
+
+    if byte_ingest:
+        from ingest import capture_stdin_bytes, decode_aprs_bytes
+
+        lines, decode = capture_stdin_bytes(recorder=recorder), decode_aprs_bytes
+    else:
+        lines, decode = capture_stdin(recorder), decode_aprs
+
+    batcher = Batcher(publish, batch_size, batch_ms)
+    for aprs in lines:
+        if dedup is not None and dedup.is_duplicate(aprs):
+            print("Duplicate frame, not publishing.")
+            continue
+        data = decode(aprs)
         if data:
-            client.publish(mqtt_topic, json.dumps(data))
-            print(f"Published to {mqtt_topic}: {data}")
+            batcher.add(data)
+            print(f"Decoded: {data}")
         else:
             print("No valid APRS data to publish.")
+    batcher.drain()
+    if passes is not None:
+        passes.close(tracker)
+    if store is not None:
+        store.close()
+    if outbox is not None:
+        # Whatever the broker hasn't taken by then stays on disk for next time
+        outbox.wait_drained(OUTBOX_DRAIN_SECONDS)
+        # Pass summaries skip the outbox, so wait for them on their own
+        tracker.wait_sent(OUTBOX_DRAIN_SECONDS)
+        outbox.close()
+    elif not (startup_buffer.flushed.wait(OUTBOX_DRAIN_SECONDS) and tracker.wait_sent(OUTBOX_DRAIN_SECONDS)):
+        unsent = len(tracker.pending) + len(startup_buffer.pending)
+        sys.stderr.write(f"Gave up waiting for {unsent} message(s) to reach the broker\n")
+    client.disconnect()
+    client.loop_stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,238 @@
+"""Lightweight parser instrumentation exposed in the Prometheus text format.
+
+Metrics are plain in-process counters, gauges and fixed-bucket histograms,
+cheap enough to update on every frame. serve() starts an HTTP endpoint
+that renders them on /metrics; http.server is only imported then, as it
+would otherwise add to the parser's startup.
+"""
+
+import bisect
+import threading
+import time
+from typing import Callable
+
+REGISTRY = []
+
+# Latency buckets in seconds, from 10 microseconds up to 10 seconds
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def format_labels(label_name: str | None, label: str | None, extra: str = "") -> str:
+    labels = [f'{label_name}="{label}"'] if label_name and label is not None else []
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_name: str | None = None):
+        self.name = name
+        self.help_text = help_text
+        self.label_name = label_name
+        self.values = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, label: str | None = None, amount: float = 1):
+        with self.lock:
+            self.values[label] = self.values.get(label, 0) + amount
+
+    def value(self, label: str | None = None) -> float:
+        return self.values.get(label, 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label, value in sorted(self.values.items(), key=lambda item: str(item[0])):
+            lines.append(f"{self.name}{format_labels(self.label_name, label)} {value}")
+        return lines
+
+
+class Gauge:
+    """A gauge whose values are either set directly or read from callbacks."""
+
+    def __init__(self, name: str, help_text: str, label_name: str | None = None):
+        self.name = name
+        self.help_text = help_text
+        self.label_name = label_name
+        self.values = {}
+        self.callbacks = {}
+        REGISTRY.append(self)
+
+    def set(self, value: float, label: str | None = None):
+        self.values[label] = value
+
+    def set_function(self, function: Callable[[], float], label: str | None = None):
+        self.callbacks[label] = function
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        values = dict(self.values)
+        for label, function in list(self.callbacks.items()):
+            values[label] = function()
+        for label, value in sorted(values.items(), key=lambda item: str(item[0])):
+            lines.append(f"{self.name}{format_labels(self.label_name, label)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_name: str | None = None, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_name = label_name
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, label: str | None = None):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label)
+            if series is None:
+                # Per-bucket counts plus one for +Inf, then the running sum
+                series = self.series[label] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def time(self, label: str | None = None) -> "Timer":
+        return Timer(self, label)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label, (counts, total) in sorted(self.series.items(), key=lambda item: str(item[0])):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                labels = format_labels(self.label_name, label, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_name, label)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.label_name, label)} {cumulative}")
+        return lines
+
+
+class Timer:
+    def __init__(self, histogram: Histogram, label: str | None):
+        self.histogram = histogram
+        self.label = label
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, self.label)
+
+
+FRAMES_READ = Counter("cubesatsim_frames_read_total", "APRS lines read from the input", "source")
+FRAMES_DECODED = Counter("cubesatsim_frames_decoded_total", "APRS lines decoded into frames")
+FRAMES_FAILED = Counter(
+    "cubesatsim_frames_failed_total", "APRS lines that failed to decode", "reason"
+)
+FRAMES_PARTIAL = Counter(
+    "cubesatsim_frames_partial_total", "Frames published with the parts that decoded, by what was missing", "reason"
+)
+FRAMES_DUPLICATE = Counter(
+    "cubesatsim_frames_duplicate_total", "APRS lines dropped as repeats of a recently seen frame"
+)
+FRAMES_PUBLISHED = Counter("cubesatsim_frames_published_total", "Frames handed to the MQTT client")
+STAGE_SECONDS = Histogram(
+    "cubesatsim_stage_seconds", "Time spent in each stage of the parser per frame", "stage"
+)
+PUBLISH_QUEUE = Gauge(
+    "cubesatsim_mqtt_publish_queue", "MQTT messages published but not yet sent to the broker"
+)
+QUEUE_DEPTH = Gauge("cubesatsim_pipeline_queue_depth", "Items waiting in each pipeline queue", "queue")
+OUTBOX_PENDING = Gauge("cubesatsim_outbox_pending", "Messages in the outbox not yet acknowledged by the broker")
+OUTBOX_DROPPED = Counter("cubesatsim_outbox_dropped_total", "Unsent messages dropped because the outbox was full")
+ALERTS = Counter("cubesatsim_alerts_total", "Alert events raised and cleared", "event")
+BUTTON_PRESSES = Counter("cubesatsim_button_presses_total", "Button presses acted on, after debouncing", "button")
+BUTTON_SECONDS = Histogram(
+    "cubesatsim_button_seconds", "Seconds from a button press until its action was published or acknowledged", "stage"
+)
+STARTUP_DROPPED = Counter(
+    "cubesatsim_startup_dropped_total", "Messages dropped because the startup buffer filled before the first connection"
+)
+MQTT_RECONNECTS = Counter("cubesatsim_mqtt_reconnects_total", "Times the MQTT connection was lost")
+
+
+class PublishTracker:
+    """Keep the message IDs of frames handed to paho until it reports them sent.
+
+    Only IDs returned by track() are counted, so other messages sharing
+    the client, like snapshots and alerts, don't skew the queue gauge.
+    """
+
+    # Sent IDs not tracked yet, in case paho reports one before track() sees it
+    UNMATCHED_SIZE = 1024
+
+    def __init__(self, client):
+        self.pending = set()
+        self.unmatched = {}
+        self.condition = threading.Condition()
+        client.on_publish = self.on_publish
+        PUBLISH_QUEUE.set_function(lambda: len(self.pending))
+
+    def track(self, message_info):
+        FRAMES_PUBLISHED.inc()
+        return self.watch(message_info)
+
+    def watch(self, message_info):
+        """Wait for a message that isn't a frame, like a pass summary, in wait_sent()."""
+        # rc 0 is MQTT_ERR_SUCCESS; anything else was never queued
+        if message_info is not None and message_info.rc == 0:
+            with self.condition:
+                if self.unmatched.pop(message_info.mid, None) is None and not message_info.is_published():
+                    self.pending.add(message_info.mid)
+        return message_info
+
+    def on_publish(self, client, userdata, mid):
+        with self.condition:
+            if mid in self.pending:
+                self.pending.discard(mid)
+                if not self.pending:
+                    self.condition.notify_all()
+            else:
+                self.unmatched[mid] = True
+                if len(self.unmatched) > self.UNMATCHED_SIZE:
+                    del self.unmatched[next(iter(self.unmatched))]
+
+    def wait_sent(self, timeout: float) -> bool:
+        """Wait until every tracked message has been sent, or acknowledged for QoS 1 and 2."""
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.pending, timeout)
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def serve(port: int, host: str = "0.0.0.0"):
+    """Serve /metrics from a background thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
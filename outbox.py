@@ -0,0 +1,322 @@
+"""Durable store-and-forward outbox for MQTT publishing.
+
+Every message is appended to a log on disk before it is sent, and only
+forgotten once the broker has acknowledged it (at QoS 0, once paho has
+written it to the socket). While the broker is unreachable messages pile
+up on disk; when it comes back they are replayed in their original order,
+at a limited rate so a long outage doesn't flood the broker or the gauges.
+
+The log is split into segment files named after their first sequence
+number, each a run of records:
+
+    sequence (u64) | crc32 (u32) | payload length (u32) | topic length (u16) | topic | payload
+
+Segments are deleted once every record in them is acknowledged, and the
+oldest are dropped if the outbox grows past max_bytes. The highest
+contiguous acknowledged sequence is kept in the "acked" file. Appends are
+flushed to the OS at once but fsynced in batches, every sync_every
+messages or sync_interval seconds.
+"""
+
+from collections import deque
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Callable
+
+import paho.mqtt.client as mqtt
+
+from metrics import OUTBOX_DROPPED, OUTBOX_PENDING
+
+RECORD = struct.Struct("<QIIH")
+ACKED = struct.Struct("<Q")
+SEGMENT_SUFFIX = ".log"
+
+
+def read_segment(path: str) -> tuple[list[tuple[int, str, bytes]], int]:
+    """Read a segment's records, stopping at the first torn or corrupt one.
+
+    Returns the records and the length of the intact part of the file.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    records = []
+    offset = 0
+    while offset + RECORD.size <= len(data):
+        sequence, crc, payload_length, topic_length = RECORD.unpack_from(data, offset)
+        end = offset + RECORD.size + topic_length + payload_length
+        body = data[offset + RECORD.size : end]
+        if end > len(data) or zlib.crc32(body) != crc:
+            break
+        records.append((sequence, body[:topic_length].decode("utf-8"), body[topic_length:]))
+        offset = end
+    return records, offset
+
+
+class Outbox:
+    def __init__(
+        self,
+        path: str,
+        client: mqtt.Client,
+        qos: int = 1,
+        rate: float = 20.0,
+        max_inflight: int = 20,
+        max_bytes: int = 64 * 1024 * 1024,
+        segment_bytes: int = 1024 * 1024,
+        sync_every: int = 100,
+        sync_interval: float = 1.0,
+        retry_interval: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.path = path
+        self.client = client
+        self.qos = qos
+        self.rate = rate
+        self.max_inflight = max_inflight
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.retry_interval = retry_interval
+        self.clock = clock
+        self.tracker = None
+
+        self.condition = threading.Condition(threading.RLock())
+        self.thread = None
+        self.running = False
+        self.pending = deque()
+        self.inflight = {}
+        self.done = set()
+        self.dropped = 0
+        self.tokens = 1.0
+        self.last_refill = clock()
+        self.unsynced = 0
+        self.last_sync = clock()
+        self.persisted_acked = None
+
+        os.makedirs(path, exist_ok=True)
+        self.acked = self.read_acked()
+        # [first sequence, file size] per segment, oldest first
+        self.segments = []
+        self.next_sequence = self.acked + 1
+        for name in sorted(os.listdir(path)):
+            if not name.endswith(SEGMENT_SUFFIX):
+                continue
+            segment_path = os.path.join(path, name)
+            records, intact = read_segment(segment_path)
+            if intact < os.path.getsize(segment_path):
+                print(f"Outbox: discarding a torn record at the end of {name}")
+                os.truncate(segment_path, intact)
+            self.segments.append([int(name[: -len(SEGMENT_SUFFIX)]), intact])
+            for record in records:
+                if record[0] > self.acked:
+                    self.pending.append(record)
+                self.next_sequence = max(self.next_sequence, record[0] + 1)
+        if self.pending:
+            print(f"Outbox: {len(self.pending)} message(s) waiting to be replayed")
+        self.file = None
+        OUTBOX_PENDING.set_function(lambda: len(self.pending) + len(self.inflight))
+
+    def segment_path(self, first_sequence: int) -> str:
+        return os.path.join(self.path, f"{first_sequence:020d}{SEGMENT_SUFFIX}")
+
+    def read_acked(self) -> int:
+        try:
+            with open(os.path.join(self.path, "acked"), "rb") as f:
+                return ACKED.unpack(f.read(ACKED.size))[0]
+        except (FileNotFoundError, struct.error):
+            return 0
+
+    def write_acked(self):
+        temporary = os.path.join(self.path, "acked.tmp")
+        with open(temporary, "wb") as f:
+            f.write(ACKED.pack(self.acked))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, os.path.join(self.path, "acked"))
+        self.persisted_acked = self.acked
+
+    def publish(self, topic: str, payload: str | bytes) -> int:
+        """Append a message to the outbox; it's sent when the broker allows."""
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        encoded_topic = topic.encode("utf-8")
+        with self.condition:
+            sequence = self.next_sequence
+            self.next_sequence += 1
+            body = encoded_topic + payload
+            record = RECORD.pack(sequence, zlib.crc32(body), len(payload), len(encoded_topic)) + body
+
+            if self.file is None or self.segments[-1][1] + len(record) > self.segment_bytes:
+                self.rotate(sequence)
+            self.file.write(record)
+            self.file.flush()
+            self.segments[-1][1] += len(record)
+            self.pending.append((sequence, topic, payload))
+
+            self.unsynced += 1
+            if self.unsynced >= self.sync_every:
+                self.sync()
+            self.enforce_limit()
+            self.condition.notify()
+        return sequence
+
+    def rotate(self, sequence: int):
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+        if self.segments and not self.segments[-1][1]:
+            # An empty segment left over from a previous run
+            os.remove(self.segment_path(self.segments.pop()[0]))
+        self.segments.append([sequence, 0])
+        self.file = open(self.segment_path(sequence), "ab")
+
+    def enforce_limit(self):
+        """Drop the oldest segments, sent or not, while the outbox is over max_bytes."""
+        while len(self.segments) > 1 and sum(size for _, size in self.segments) > self.max_bytes:
+            first, _ = self.segments.pop(0)
+            boundary = self.segments[0][0]
+            lost = 0
+            while self.pending and self.pending[0][0] < boundary:
+                self.pending.popleft()
+                lost += 1
+            for mid, record in list(self.inflight.items()):
+                if record[0] < boundary:
+                    del self.inflight[mid]
+            self.done = {sequence for sequence in self.done if sequence >= boundary}
+            self.acked = max(self.acked, boundary - 1)
+            self.advance()
+            os.remove(self.segment_path(first))
+            if lost:
+                self.dropped += lost
+                OUTBOX_DROPPED.inc(amount=lost)
+                print(f"Outbox: over {self.max_bytes} bytes, dropped {lost} unsent message(s)")
+
+    def sync(self):
+        """fsync the log and the acknowledged position, and delete finished segments."""
+        with self.condition:
+            if self.file is not None:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+            if self.acked != self.persisted_acked:
+                self.write_acked()
+            while len(self.segments) > 1 and self.segments[1][0] <= self.acked + 1:
+                first, _ = self.segments.pop(0)
+                os.remove(self.segment_path(first))
+            self.unsynced = 0
+            self.last_sync = self.clock()
+
+    def advance(self):
+        while self.acked + 1 in self.done:
+            self.acked += 1
+            self.done.discard(self.acked)
+
+    def attach(self, tracker=None):
+        """Take over the client's on_publish callback, passing it on to tracker."""
+        self.tracker = tracker
+        self.client.on_publish = self.on_publish
+
+    def on_publish(self, client, userdata, mid):
+        with self.condition:
+            record = self.inflight.pop(mid, None)
+            if record is not None:
+                self.done.add(record[0])
+                self.advance()
+                self.condition.notify()
+        if self.tracker is not None:
+            self.tracker.on_publish(client, userdata, mid)
+
+    def on_disconnect(self, client, userdata, rc):
+        # paho resends unacknowledged QoS 1 and 2 messages itself after a
+        # reconnect, but QoS 0 messages still in flight are simply lost
+        if self.qos:
+            return
+        with self.condition:
+            if self.inflight:
+                self.pending.extendleft(sorted(self.inflight.values(), reverse=True))
+                self.inflight.clear()
+
+    def pump(self) -> float | None:
+        """Send what the rate limit allows.
+
+        Returns the seconds until more can be sent, or None if waiting on
+        acknowledgements or new messages.
+        """
+        with self.condition:
+            now = self.clock()
+            if (self.unsynced or self.acked != self.persisted_acked) and now - self.last_sync >= self.sync_interval:
+                self.sync()
+            if not self.pending:
+                return None
+            if not self.client.is_connected():
+                return self.retry_interval
+
+            self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            while self.pending and len(self.inflight) < self.max_inflight and self.tokens >= 1:
+                record = self.pending[0]
+                info = self.client.publish(record[1], record[2], self.qos)
+                if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                    return self.retry_interval
+                self.pending.popleft()
+                self.inflight[info.mid] = record
+                self.tokens -= 1
+                if self.tracker is not None:
+                    self.tracker.track(info)
+            if not self.pending or len(self.inflight) >= self.max_inflight:
+                return None
+            return (1 - self.tokens) / self.rate
+
+    def worker(self):
+        while True:
+            wait = self.pump()
+            with self.condition:
+                if not self.running:
+                    return
+                self.condition.wait(self.sync_interval if wait is None else min(wait, self.sync_interval))
+
+    def start(self) -> "Outbox":
+        self.running = True
+        self.thread = threading.Thread(target=self.worker, daemon=True)
+        self.thread.start()
+        return self
+
+    def wait_drained(self, timeout: float) -> bool:
+        """Wait up to timeout seconds for everything to be acknowledged."""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while self.pending or self.inflight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.notify()
+                self.condition.wait(min(remaining, 0.1))
+        return True
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        self.sync()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        waiting = len(self.pending) + len(self.inflight)
+        if waiting:
+            print(f"Outbox: {waiting} message(s) kept on disk for the next run")
+
+    def stats(self) -> dict:
+        with self.condition:
+            return {
+                "pending": len(self.pending),
+                "inflight": len(self.inflight),
+                "acked": self.acked,
+                "dropped": self.dropped,
+                "segments": len(self.segments),
+                "bytes": sum(size for _, size in self.segments),
+            }
@@ -0,0 +1,89 @@
+import collections
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Generator
+
+from batch import aprs_line, open_capture, decode_capture
+from main import decode_aprs
+
+# Size of the byte range each worker decodes in one task
+CHUNK_BYTES = 8 * 1024 * 1024
+# Chunks submitted ahead of the one being yielded, per worker, so memory
+# stays bounded however large the input is
+CHUNKS_IN_FLIGHT = 2
+
+
+def capture_paths(path: str) -> list[str]:
+    """Expand a capture file or a directory of captures into a sorted file list."""
+    if not os.path.isdir(path):
+        return [path]
+    return sorted(
+        os.path.join(path, name)
+        for name in os.listdir(path)
+        if os.path.isfile(os.path.join(path, name)) and not name.startswith(".")
+    )
+
+
+def is_gzip(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(2) == b"\x1f\x8b"
+
+
+def plan_chunks(paths: list[str], chunk_bytes: int = CHUNK_BYTES) -> list[tuple[str, int, int]]:
+    """Split captures into (path, start, end) byte ranges in input order.
+
+    Gzip streams can't be seeked into, so each one is a single task with
+    an end of -1.
+    """
+    chunks = []
+    for path in paths:
+        if is_gzip(path):
+            chunks.append((path, 0, -1))
+            continue
+        size = os.path.getsize(path)
+        for start in range(0, size, chunk_bytes):
+            chunks.append((path, start, min(start + chunk_bytes, size)))
+    return chunks
+
+
+def decode_range(path: str, start: int, end: int) -> list[dict]:
+    """Decode the lines that begin inside [start, end) of a capture."""
+    if end < 0:
+        with open_capture(path) as capture:
+            return list(decode_capture(capture))
+
+    frames = []
+    with open(path, "rb") as f:
+        if start > 0:
+            # Skip the line straddling the boundary; the previous chunk owns it
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            aprs = aprs_line(line.decode("utf-8", errors="replace"))
+            if aprs is not None and (data := decode_aprs(aprs)):
+                frames.append(data)
+    return frames
+
+
+def decode_parallel(
+    path: str, workers: int | None = None, chunk_bytes: int = CHUNK_BYTES
+) -> Generator[dict]:
+    """Decode a capture file or directory across a process pool.
+
+    Frames are yielded in input order regardless of which worker finishes first.
+    """
+    chunks = plan_chunks(capture_paths(path), chunk_bytes)
+    if not chunks:
+        return
+    window = CHUNKS_IN_FLIGHT * (workers or os.process_cpu_count() or 1)
+    in_flight = collections.deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk in chunks:
+            in_flight.append(executor.submit(decode_range, *chunk))
+            if len(in_flight) >= window:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
@@ -0,0 +1,277 @@
+"""Per-pass summaries of the decoded stream, and monthly rollups of them.
+
+A pass of a callsign is a run of its frames with no gap in `timestamp`
+longer than `gap` seconds. While a pass is open only running totals are
+kept, so memory doesn't grow with its length. When a pass closes, because
+a later frame or the clock has moved more than `gap` past its last frame,
+its summary is published to cubesatsim/passes and appended to a JSON
+lines file:
+
+    frames, expected_frames, loss_rate
+        frames decoded, and how many beacons `beacon_interval` apart
+        would have covered the pass; the interval is the shortest gap
+        seen unless one is given
+    battery_voltage, solar_voltage, PLUS_X_voltage ... MINUS_Z_voltage,
+    bme_temperature, mcu_temperature
+        {"count", "total", "min", "max", "mean"}, solar_voltage being
+        the sum of the six panel voltages of each frame
+
+Counts and totals are kept rather than just means so summaries combine
+exactly: rollup() builds monthly figures from the summary file alone,
+without going back to the frames. Run this module to print them.
+"""
+
+import json
+import sys
+import threading
+import time
+
+import click
+
+from wire import decode_timestamp, encode_timestamp
+
+PANEL_FIELDS = (
+    "PLUS_X_voltage",
+    "MINUS_X_voltage",
+    "PLUS_Y_voltage",
+    "MINUS_Y_voltage",
+    "PLUS_Z_voltage",
+    "MINUS_Z_voltage",
+)
+SUMMARY_FIELDS = ("battery_voltage", "solar_voltage", *PANEL_FIELDS, "bme_temperature", "mcu_temperature")
+# Gaps shorter than this are repeats rather than the beacon interval
+MINIMUM_INTERVAL = 1.0
+
+
+class FieldSummary:
+    """Count, total, minimum and maximum of one field's values."""
+
+    __slots__ = ("count", "total", "minimum", "maximum")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = float("inf")
+        self.maximum = float("-inf")
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+
+    def merge(self, summary: dict):
+        if summary["count"]:
+            self.count += summary["count"]
+            self.total += summary["total"]
+            self.minimum = min(self.minimum, summary["min"])
+            self.maximum = max(self.maximum, summary["max"])
+
+    def to_dict(self) -> dict:
+        if not self.count:
+            return {"count": 0, "total": 0.0, "min": None, "max": None, "mean": None}
+        return {
+            "count": self.count,
+            "total": self.total,
+            "min": self.minimum,
+            "max": self.maximum,
+            "mean": self.total / self.count,
+        }
+
+
+class Pass:
+    """Running totals for one open pass."""
+
+    def __init__(self, callsign: str, start: int):
+        self.callsign = callsign
+        self.start = start
+        self.end = start
+        self.frames = 0
+        self.shortest_gap = None
+        self.fields = {field: FieldSummary() for field in SUMMARY_FIELDS}
+
+    def add(self, data: dict, moment: int):
+        gap = (moment - self.end) / 1e6
+        if gap >= MINIMUM_INTERVAL and (self.shortest_gap is None or gap < self.shortest_gap):
+            self.shortest_gap = gap
+        self.end = max(self.end, moment)
+        self.frames += 1
+
+        for field in SUMMARY_FIELDS:
+            value = data.get(field)
+            if value is not None:
+                self.fields[field].add(value)
+        panels = [data.get(field) for field in PANEL_FIELDS]
+        if None not in panels:
+            self.fields["solar_voltage"].add(sum(panels))
+
+    def summary(self, beacon_interval: float | None = None) -> dict:
+        duration = (self.end - self.start) / 1e6
+        interval = beacon_interval or self.shortest_gap
+        expected = max(self.frames, round(duration / interval) + 1) if interval else self.frames
+        return {
+            "callsign": self.callsign,
+            "start": decode_timestamp(self.start),
+            "end": decode_timestamp(self.end),
+            "duration_seconds": duration,
+            "frames": self.frames,
+            "expected_frames": expected,
+            "loss_rate": 1 - self.frames / expected,
+            "beacon_interval": interval,
+            **{field: summary.to_dict() for field, summary in self.fields.items()},
+        }
+
+
+class PassAggregator:
+    """Split each callsign's frames into passes and summarise each as it closes."""
+
+    def __init__(self, gap: float = 600.0, beacon_interval: float | None = None):
+        self.gap = gap
+        self.beacon_interval = beacon_interval
+        self.open = {}
+
+    def update(self, data: dict) -> list[dict]:
+        """Add a frame; return the summaries of any passes it closed."""
+        moment = encode_timestamp(data.get("timestamp"))
+        if not moment:
+            return []
+        closed = self.expire(moment)
+        callsign = data.get("callsign", "")
+        current = self.open.get(callsign)
+        if current is None:
+            current = self.open[callsign] = Pass(callsign, moment)
+        current.add(data, moment)
+        return closed
+
+    def expire(self, moment: int) -> list[dict]:
+        """Close the passes with no frame in the gap before moment, in microseconds."""
+        limit = moment - self.gap * 1e6
+        stale = [callsign for callsign, current in self.open.items() if current.end < limit]
+        return [self.open.pop(callsign).summary(self.beacon_interval) for callsign in stale]
+
+    def close(self) -> list[dict]:
+        """Close every open pass, e.g. when the input ends."""
+        closed = [current.summary(self.beacon_interval) for current in self.open.values()]
+        self.open.clear()
+        return closed
+
+
+class PassPublisher:
+    """Feed frames to a PassAggregator, publishing and saving each pass summary.
+
+    start() also closes passes from a background thread once their gap
+    has passed, rather than waiting for the next pass to begin.
+    """
+
+    def __init__(self, client, aggregator: PassAggregator, topic: str | None = "cubesatsim/passes", path: str | None = None):
+        self.client = client
+        self.aggregator = aggregator
+        self.topic = topic
+        self.file = open(path, "a", encoding="utf-8") if path else None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def update(self, data: dict):
+        with self.lock:
+            self.emit(self.aggregator.update(data))
+
+    def expire(self):
+        with self.lock:
+            self.emit(self.aggregator.expire(time.time_ns() // 1000))
+
+    def emit(self, summaries: list[dict], tracker=None):
+        for summary in summaries:
+            line = json.dumps(summary, separators=(",", ":"))
+            if self.topic:
+                info = self.client.publish(self.topic, line)
+                if tracker is not None:
+                    tracker.watch(info)
+            if self.file is not None:
+                self.file.write(line + "\n")
+                self.file.flush()
+            print(
+                f"Pass closed: {summary['callsign']} {summary['start']} to {summary['end']}, "
+                f"{summary['frames']} frames, {summary['loss_rate']:.0%} lost"
+            )
+
+    def start(self, interval: float = 60.0) -> "PassPublisher":
+        def run():
+            while not self.stopped.wait(interval):
+                self.expire()
+
+        threading.Thread(target=run, daemon=True).start()
+        return self
+
+    def close(self, tracker=None):
+        """Publish the passes still open; with a PublishTracker, its wait_sent() covers them too."""
+        self.stopped.set()
+        with self.lock:
+            self.emit(self.aggregator.close(), tracker)
+        if self.file is not None:
+            self.file.close()
+
+
+def read_passes(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def rollup(summaries: list[dict], period: int = 7) -> list[dict]:
+    """Combine pass summaries per callsign and month (the first period characters of start)."""
+    groups = {}
+    for summary in summaries:
+        key = (summary["callsign"], summary["start"][:period])
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                "passes": 0,
+                "frames": 0,
+                "expected_frames": 0,
+                "duration_seconds": 0.0,
+                "fields": {field: FieldSummary() for field in SUMMARY_FIELDS},
+            }
+        group["passes"] += 1
+        group["frames"] += summary["frames"]
+        group["expected_frames"] += summary["expected_frames"]
+        group["duration_seconds"] += summary["duration_seconds"]
+        for field, fields in group["fields"].items():
+            if field in summary:
+                fields.merge(summary[field])
+
+    rollups = []
+    for (callsign, period_start), group in sorted(groups.items()):
+        fields = group.pop("fields")
+        rollups.append(
+            {
+                "callsign": callsign,
+                "period": period_start,
+                **group,
+                "loss_rate": 1 - group["frames"] / group["expected_frames"] if group["expected_frames"] else 0.0,
+                **{field: summary.to_dict() for field, summary in fields.items()},
+            }
+        )
+    return rollups
+
+
+@click.command()
+@click.option("--pass_path", required=True, help="Pass summaries written by main.py --pass_path")
+@click.option(
+    "--period",
+    type=click.Choice(["day", "month", "year"]),
+    default="month",
+    help="Length of each rollup period",
+)
+@click.option("--callsign", default=None, help="Only roll up this callsign")
+def cli(pass_path, period, callsign):
+    """Print a rollup of pass summaries per callsign and period, one JSON object per line."""
+    started = time.perf_counter()
+    summaries = [summary for summary in read_passes(pass_path) if callsign is None or summary["callsign"] == callsign]
+    for result in rollup(summaries, {"day": 10, "month": 7, "year": 4}[period]):
+        print(json.dumps(result))
+    print(f"Rolled up {len(summaries)} passes in {time.perf_counter() - started:.3f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    cli(auto_envvar_prefix="CUBESATSIM")
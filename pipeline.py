@@ -0,0 +1,325 @@
+import asyncio
+import json
+import sys
+
+import paho.mqtt.client as mqtt
+
+from main import OUTBOX_DRAIN_SECONDS, PASS_EXPIRY_INTERVAL, decode_aprs
+from metrics import FRAMES_READ, MQTT_RECONNECTS, QUEUE_DEPTH, STAGE_SECONDS, PublishTracker
+from sources import Source
+from wire import encode_payload
+
+OVERFLOW_POLICIES = ("block", "drop_oldest")
+
+
+class StageQueue:
+    """A bounded queue between two pipeline stages.
+
+    When full, put() either waits for room ("block") or discards the oldest
+    queued item to make room ("drop_oldest"). Depth and drop counts are kept
+    so backpressure can be reported.
+    """
+
+    def __init__(self, name: str, maxsize: int, overflow: str = "block"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow}")
+        self.name = name
+        self.overflow = overflow
+        self.queue = asyncio.Queue(maxsize)
+        self.put_count = 0
+        self.dropped = 0
+        self.high_watermark = 0
+        QUEUE_DEPTH.set_function(self.queue.qsize, name)
+
+    async def put(self, item):
+        if self.overflow == "drop_oldest":
+            while self.queue.full():
+                self.queue.get_nowait()
+                self.queue.task_done()
+                self.dropped += 1
+            self.queue.put_nowait(item)
+        else:
+            await self.queue.put(item)
+        self.put_count += 1
+        self.high_watermark = max(self.high_watermark, self.queue.qsize())
+
+    async def get(self):
+        item = await self.queue.get()
+        self.queue.task_done()
+        return item
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.queue.qsize(),
+            "maxsize": self.queue.maxsize,
+            "high_watermark": self.high_watermark,
+            "put": self.put_count,
+            "dropped": self.dropped,
+        }
+
+
+class AsyncioMqtt:
+    """Drive a paho client's network I/O from the asyncio event loop.
+
+    This replaces loop_start()/loop_forever(): paho tells us when its socket
+    opens, closes or has data to write, and we hook those into the loop's
+    reader and writer callbacks, so publish() never blocks the pipeline.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, client: mqtt.Client):
+        self.loop = loop
+        self.client = client
+        self.misc = None
+        client.on_socket_open = self.on_socket_open
+        client.on_socket_close = self.on_socket_close
+        client.on_socket_register_write = self.on_socket_register_write
+        client.on_socket_unregister_write = self.on_socket_unregister_write
+
+    def on_loop(self, callback, *args):
+        """Run callback now on the event loop thread, or hand it over from another.
+
+        The initial connect runs in an executor thread, so its socket must be
+        handed over; but a socket closed on the loop thread has to be
+        unregistered straight away, before paho closes it.
+        """
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def on_socket_open(self, client, userdata, sock):
+        self.on_loop(self.watch, sock)
+
+    def on_socket_close(self, client, userdata, sock):
+        self.on_loop(self.unwatch, sock)
+
+    def on_socket_register_write(self, client, userdata, sock):
+        self.on_loop(self.loop.add_writer, sock, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self.on_loop(self.loop.remove_writer, sock)
+
+    def watch(self, sock):
+        self.loop.add_reader(sock, self.client.loop_read)
+        self.misc = self.loop.create_task(self.misc_loop())
+
+    def unwatch(self, sock):
+        self.loop.remove_reader(sock)
+        self.loop.remove_writer(sock)
+        if self.misc is not None:
+            self.misc.cancel()
+            self.misc = None
+
+    async def misc_loop(self):
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                break
+
+
+async def connect(client: mqtt.Client, mqtt_host: str, mqtt_port: int, retry_interval: float = 5.0):
+    """Connect (or reconnect) without blocking the event loop, retrying until it succeeds."""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, client.connect, mqtt_host, mqtt_port, 60)
+            return
+        except OSError as e:
+            sys.stderr.write(f"MQTT connection failed: {e}. Retrying in {retry_interval}s\n")
+            await asyncio.sleep(retry_interval)
+
+
+async def read_source(source: Source, output: StageQueue, tag: bool = True, recorder=None):
+    async for line in source.lines():
+        if line.startswith("APRS:"):
+            FRAMES_READ.inc(source.name if tag else None)
+            if recorder is not None:
+                recorder.write(line, source.name if tag else None)
+            await output.put((source.name if tag else None, line))
+
+
+async def read_stage(output: StageQueue, sources: list[Source] | None = None, recorder=None):
+    """Read APRS lines from every source at once as soon as they arrive.
+
+    Lines are queued as (source name, line); with no sources given this
+    reads stdin and leaves frames untagged.
+    """
+    tag = bool(sources)
+    sources = sources or [Source("stdin", "stdin")]
+
+    async def read(source: Source):
+        try:
+            await read_source(source, output, tag, recorder)
+        except Exception as e:
+            sys.stderr.write(f"Source {source.name} failed: {e}\n")
+
+    await asyncio.gather(*(read(source) for source in sources))
+    await output.put(None)
+
+
+async def decode_stage(source: StageQueue, output: StageQueue, store=None, dedup=None):
+    while (item := await source.get()) is not None:
+        name, aprs = item
+        if dedup is None or not dedup.is_duplicate(aprs):
+            data = decode_aprs(aprs)
+            if data:
+                if name is not None:
+                    data["source"] = name
+                if store is not None:
+                    store.append(data)
+                await output.put(data)
+        # Flush the store once whatever arrived together has been written
+        if store is not None and source.queue.empty():
+            store.flush()
+    await output.put(None)
+
+
+async def publish_stage(
+    source: StageQueue,
+    client: mqtt.Client,
+    mqtt_topic: str,
+    payload_format: str = "json",
+    batch_size: int = 1,
+    batch_ms: int = 0,
+    snapshots=None,
+    qos: int = 0,
+    outbox=None,
+    alerts=None,
+    passes=None,
+):
+    """Publish frames, batching up to batch_size frames or batch_ms milliseconds.
+
+    With an outbox, frames are queued on disk and its own thread sends them.
+    """
+    loop = asyncio.get_running_loop()
+    tracker = PublishTracker(client)
+    if outbox is not None:
+        outbox.attach(tracker)
+    finished = False
+    while not finished and (data := await source.get()) is not None:
+        frames = [data]
+        deadline = loop.time() + batch_ms / 1000
+        while len(frames) < batch_size:
+            timeout = deadline - loop.time() if batch_ms else None
+            if timeout is not None and timeout <= 0:
+                break
+            try:
+                data = await asyncio.wait_for(source.get(), timeout)
+            except TimeoutError:
+                break
+            if data is None:
+                finished = True
+                break
+            frames.append(data)
+        with STAGE_SECONDS.time("serialize"):
+            payload = encode_payload(frames, payload_format)
+        with STAGE_SECONDS.time("publish"):
+            if outbox is not None:
+                outbox.publish(mqtt_topic, payload)
+            else:
+                tracker.track(client.publish(mqtt_topic, payload, qos))
+        if snapshots is not None:
+            for frame in frames:
+                snapshots.update(frame)
+        if alerts is not None:
+            for frame in frames:
+                alerts.update(frame)
+        if passes is not None:
+            for frame in frames:
+                passes.update(frame)
+    return tracker
+
+
+async def expire_passes(passes, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        passes.expire()
+
+
+async def report_stats(queues: list[StageQueue], interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        stats = {queue.name: queue.stats() for queue in queues}
+        sys.stderr.write(f"Pipeline queues: {json.dumps(stats)}\n")
+
+
+async def run(
+    client: mqtt.Client,
+    mqtt_host: str,
+    mqtt_port: int,
+    mqtt_topic: str,
+    queue_size: int = 1000,
+    overflow: str = "block",
+    stats_interval: float = 0,
+    payload_format: str = "json",
+    batch_size: int = 1,
+    batch_ms: int = 0,
+    store=None,
+    dedup=None,
+    sources: list[Source] | None = None,
+    recorder=None,
+    snapshots=None,
+    qos: int = 0,
+    outbox=None,
+    alerts=None,
+    passes=None,
+):
+    """Run the reader, decoder and publisher as separate stages.
+
+    The reader never waits on the broker: publishing happens on the event
+    loop's own socket callbacks, and a slow or absent broker only fills
+    the bounded queues, which then apply the chosen overflow policy.
+    """
+    loop = asyncio.get_running_loop()
+    AsyncioMqtt(loop, client)
+
+    def on_disconnect(client, userdata, rc):
+        if rc != 0:
+            MQTT_RECONNECTS.inc()
+            print(f"MQTT connection lost with code {rc}. Reconnecting...")
+            loop.create_task(connect(client, mqtt_host, mqtt_port))
+        if outbox is not None:
+            outbox.on_disconnect(client, userdata, rc)
+
+    client.on_disconnect = on_disconnect
+    connecting = loop.create_task(connect(client, mqtt_host, mqtt_port))
+
+    lines = StageQueue("lines", queue_size, overflow)
+    frames = StageQueue("frames", queue_size, overflow)
+    reporter = None
+    if stats_interval:
+        reporter = loop.create_task(report_stats([lines, frames], stats_interval))
+    expiring = None
+    if passes is not None:
+        expiring = loop.create_task(expire_passes(passes, PASS_EXPIRY_INTERVAL))
+
+    if sources:
+        print(f"Listening for APRS data on {', '.join(source.name for source in sources)}.")
+    else:
+        print("Listening for APRS data on stdin. Press Ctrl+C to exit.")
+    _, _, tracker = await asyncio.gather(
+        read_stage(lines, sources, recorder),
+        decode_stage(lines, frames, store, dedup),
+        publish_stage(frames, client, mqtt_topic, payload_format, batch_size, batch_ms, snapshots, qos, outbox, alerts, passes),
+    )
+
+    if passes is not None:
+        expiring.cancel()
+        passes.close(tracker)
+
+    if outbox is not None:
+        # Whatever the broker hasn't taken by then stays on disk for next time
+        await loop.run_in_executor(None, outbox.wait_drained, OUTBOX_DRAIN_SECONDS)
+        # Pass summaries skip the outbox, so wait for them on their own
+        await loop.run_in_executor(None, tracker.wait_sent, OUTBOX_DRAIN_SECONDS)
+    elif not await loop.run_in_executor(None, tracker.wait_sent, OUTBOX_DRAIN_SECONDS):
+        sys.stderr.write(f"Gave up waiting for {len(tracker.pending)} frame(s) to reach the broker\n")
+    connecting.cancel()
+    if reporter is not None:
+        reporter.cancel()
+    client.disconnect()
@@ -0,0 +1,51 @@
+"""Record APRS lines with their arrival times, for replay.py to play back.
+
+Each line becomes one JSON object, {"time": seconds since the epoch,
+"line": "APRS: ..."}, plus "source" for lines from a named --source.
+"""
+
+import json
+import threading
+import time
+
+
+class LineRecorder:
+    """Append each received line, with its arrival time, to a recording."""
+
+    def __init__(self, path: str):
+        self.file = open(path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+
+    def write(self, line: str, source: str | None = None):
+        entry = {"time": time.time(), "line": line}
+        if source is not None:
+            entry["source"] = source
+        with self.lock:
+            self.file.write(json.dumps(entry) + "\n")
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_recording(path: str, max_gap: float | None = None) -> list[tuple[float, str]]:
+    """Read a recording as (seconds since its first line, line) pairs.
+
+    Silences longer than max_gap, e.g. between passes, are cut to max_gap.
+    """
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                entries.append((entry["time"], entry["line"]))
+    entries.sort(key=lambda entry: entry[0])
+
+    recording = []
+    offset = 0.0
+    for index, (arrival, line) in enumerate(entries):
+        if index:
+            gap = arrival - entries[index - 1][0]
+            offset += gap if max_gap is None else min(gap, max_gap)
+        recording.append((offset, line))
+    return recording
@@ -0,0 +1,385 @@
+"""Replay recorded APRS lines end to end and measure the latency.
+
+    main.py --record_path pass.jsonl        record a live pass
+    replay.py pass.jsonl                    replay it in real time
+    replay.py pass.jsonl --speed 10         ten times faster
+    replay.py pass.jsonl --speed 0          as fast as the parser takes them
+    replay.py pass.jsonl --sweep            find the highest sustained frame rate
+
+Recordings come from recorder.py. A replay runs main.py as a subprocess
+and writes the lines to its stdin on the recorded timing, against the
+in-process broker from broker.py unless --mqtt_host is given. The gauges and
+buttons subscribe in this process on simulated hardware. Latency is
+measured per frame from writing its line to the parser until the
+gauges' subscriber has it ("delivered") and until each gauge device has
+applied a state at least that new ("servos", "lcd" ...), so coalescing
+and rate limits in the scheduler are part of the figures. Frames are
+matched to their lines by raw_aprs, which only the JSON payload format
+carries, so the parser always publishes JSON.
+"""
+
+import contextlib
+import json
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+
+import click
+import paho.mqtt.client as mqtt
+
+from actuators import Scheduler
+from benchmark import percentile
+from broker import Broker
+from devices import Hardware
+import gauges
+from recorder import read_recording
+from wire import decode_payload
+
+
+def frame_key(line: str) -> str:
+    # What main.py publishes as raw_aprs for this line
+    return line.strip()[5:].strip()
+
+
+def latency_summary(latencies: list[float]) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "frames": len(latencies),
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p90_ms": percentile(latencies, 0.9) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+    }
+
+
+class GaugeProbe:
+    """Run gauges.on_message on simulated hardware and time what it does.
+
+    Frames are numbered in the order the gauges receive them; after every
+    scheduler pass, each device that has nothing left pending has caught
+    up with every frame handed to the gauges before that pass began.
+    """
+
+    def __init__(self, servo_rate: float = 10.0, display_rate: float = 5.0, lcd_rate: float = 2.0):
+        self.lock = threading.Lock()
+        self.sent = {}
+        self.frames = []
+        self.delivered = []
+        self.submitted = 0
+        self.actuated = {}
+        self.last_message = time.monotonic()
+        self.last_delivered = 0.0
+
+        gauges.hardware = Hardware("simulated", gauges.number_channels)
+        gauges.scheduler = self.scheduler = Scheduler()
+        gauges.servo_targets = {}
+        gauges.frame_count = 0
+        gauges.latest_frame = None
+        gauges.add_devices(servo_rate, display_rate, lcd_rate)
+        self.caught_up = {name: 0 for name in self.scheduler.devices}
+        self.run_pending = self.scheduler.run_pending
+        self.scheduler.run_pending = self.timed_run_pending
+        self.scheduler.start()
+
+    def expect(self, index: int, line: str, sent: float):
+        with self.lock:
+            self.sent.setdefault(frame_key(line), []).append((index, sent))
+
+    def timed_run_pending(self):
+        with self.lock:
+            submitted = self.submitted
+        wait = self.run_pending()
+        now = time.perf_counter()
+        with self.lock:
+            for name, device in self.scheduler.devices.items():
+                if device.pending:
+                    continue
+                for frame in self.frames[self.caught_up[name] : submitted]:
+                    self.actuated.setdefault(name, []).append(now - frame[1])
+                self.caught_up[name] = max(self.caught_up[name], submitted)
+        return wait
+
+    def on_message(self, client, userdata, message):
+        now = time.perf_counter()
+        with self.lock:
+            self.last_message = time.monotonic()
+            for data in decode_payload(message.payload):
+                sent = self.sent.get(data.get("raw_aprs"))
+                if sent:
+                    index, sent_at = sent.pop(0)
+                    self.frames.append((index, sent_at))
+                    self.delivered.append(now - sent_at)
+                    self.last_delivered = now
+        gauges.on_message(client, userdata, message)
+        with self.lock:
+            self.submitted = len(self.frames)
+        with self.scheduler.condition:
+            self.scheduler.condition.notify()
+
+    def results(self) -> dict:
+        with self.lock:
+            results = {"delivered": latency_summary(self.delivered)}
+            for name, latencies in sorted(self.actuated.items()):
+                results[name] = latency_summary(latencies)
+            results["scheduler"] = self.scheduler.stats()
+        return results
+
+    def close(self):
+        self.scheduler.stop()
+
+
+class ButtonProbe:
+    """Run a buttons.ButtonPanel on simulated LEDs and time its message handling."""
+
+    def __init__(self):
+        import buttons
+
+        self.panel = buttons.ButtonPanel(client=None)
+        self.seconds = []
+
+    def on_message(self, client, userdata, message):
+        started = time.perf_counter()
+        self.panel.on_message(client, userdata, message)
+        self.panel.run_pending()
+        self.seconds.append(time.perf_counter() - started)
+
+    def results(self) -> dict:
+        return {"handler": latency_summary(self.seconds)}
+
+
+def subscribe(host: str, port: int, topic: str, on_message) -> mqtt.Client:
+    subscribed = threading.Event()
+    client = mqtt.Client()
+    client.on_message = on_message
+    client.on_connect = lambda client, *args: client.subscribe(topic)
+    client.on_subscribe = lambda *args: subscribed.set()
+    client.connect(host, port, 60)
+    client.loop_start()
+    if not subscribed.wait(10):
+        raise click.ClickException(f"Couldn't subscribe to {topic} on {host}:{port}")
+    return client
+
+
+def replay(
+    recording: list[tuple[float, str]],
+    speed: float = 1.0,
+    mqtt_host: str | None = None,
+    mqtt_port: int = 1883,
+    mqtt_topic: str = "cubesatsim/data",
+    parser_args: list[str] = (),
+    buttons: bool = True,
+    settle: float = 1.0,
+    startup: float = 2.0,
+    timeout: float = 600.0,
+) -> dict:
+    """Feed a recording through main.py on its timing, divided by speed (0 for no waits)."""
+    broker = None
+    if mqtt_host is None:
+        broker = Broker().start()
+        mqtt_host, mqtt_port = "127.0.0.1", broker.port
+
+    probe = GaugeProbe()
+    clients = [subscribe(mqtt_host, mqtt_port, mqtt_topic, probe.on_message)]
+    button_probe = None
+    results = {}
+    if buttons:
+        try:
+            button_probe = ButtonProbe()
+        except ImportError as e:
+            results["buttons"] = f"skipped: {e}"
+        else:
+            clients.append(subscribe(mqtt_host, mqtt_port, mqtt_topic, button_probe.on_message))
+
+    sessions = len(broker.sessions) if broker is not None else 0
+    parser = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py"),
+         "--mqtt_host", mqtt_host, "--mqtt_port", str(mqtt_port), "--mqtt_topic", mqtt_topic,
+         "--payload_format", "json", *parser_args],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        # Wait for the parser to reach the broker so no frames are lost to startup
+        deadline = time.monotonic() + startup
+        while time.monotonic() < deadline and (broker is None or len(broker.sessions) <= sessions):
+            time.sleep(0.01)
+
+        started = time.perf_counter()
+        for index, (offset, line) in enumerate(recording):
+            if speed:
+                delay = started + offset / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            sent = time.perf_counter()
+            probe.expect(index, line, sent)
+            parser.stdin.write(line.encode("utf-8") + b"\n")
+            parser.stdin.flush()
+        fed = time.perf_counter() - started
+        parser.stdin.close()
+        parser.wait(timeout)
+
+        # Let the last frames reach the subscribers and the devices
+        while time.monotonic() - probe.last_message < settle:
+            time.sleep(0.05)
+    finally:
+        if parser.poll() is None:
+            parser.kill()
+        for client in clients:
+            client.disconnect()
+            client.loop_stop()
+        probe.close()
+        if broker is not None:
+            broker.stop()
+
+    results.update(probe.results())
+    if button_probe is not None:
+        results["buttons"] = button_probe.results()
+    frames = results["delivered"]["frames"]
+    elapsed = probe.last_delivered - started if frames else 0.0
+    results.update(
+        {
+            "lines": len(recording),
+            "speed": speed,
+            "scheduled_seconds": recording[-1][0] / speed if speed else 0.0,
+            "feed_seconds": fed,
+            "delivered_seconds": elapsed,
+            "frames_per_second": frames / elapsed if elapsed else 0.0,
+        }
+    )
+    return results
+
+
+def is_sustained(results: dict, expected_frames: int, max_latency: float) -> bool:
+    """Whether every frame got through as fast as it was offered, within max_latency.
+
+    Once the parser can't keep up, frames are delivered more slowly than
+    they're fed in and queue behind each other, so throughput falls short.
+    """
+    offered = expected_frames / results["scheduled_seconds"] if results["scheduled_seconds"] else 0.0
+    actuated = [value for value in results.values() if isinstance(value, dict) and "p99_ms" in value]
+    return (
+        results["delivered"]["frames"] >= expected_frames
+        and results["frames_per_second"] >= 0.9 * offered
+        and all(summary["p99_ms"] <= max_latency * 1000 for summary in actuated)
+    )
+
+
+def sweep(
+    lines: list[str], frames: int, start_rate: float, max_latency: float, quiet, **replay_options
+) -> tuple[float, list[dict]]:
+    """Double the line rate until the parser and gauges fall behind.
+
+    Returns the highest rate that was sustained and every run's results.
+    """
+    lines = [lines[index % len(lines)] for index in range(frames)]
+    with quiet():
+        expected = replay([(0.0, line) for line in lines], speed=0, **replay_options)["delivered"]["frames"]
+    runs = []
+    best = 0.0
+    rate = start_rate
+    while True:
+        recording = [(index / rate, line) for index, line in enumerate(lines)]
+        with quiet():
+            results = replay(recording, speed=1.0, **replay_options)
+        results["rate"] = rate
+        results["sustained"] = is_sustained(results, expected, max_latency)
+        runs.append(results)
+        if not results["sustained"]:
+            return best, runs
+        best = rate
+        rate *= 2
+
+
+def print_results(results: dict):
+    for name, summary in results.items():
+        if isinstance(summary, dict) and "p50_ms" in summary:
+            print(
+                f"{name:16} {summary['frames']:>7} frames  p50 {summary['p50_ms']:9.2f}ms  "
+                f"p90 {summary['p90_ms']:9.2f}ms  p99 {summary['p99_ms']:9.2f}ms  max {summary['max_ms']:9.2f}ms"
+            )
+    if isinstance(results.get("buttons"), str):
+        print(f"buttons          {results['buttons']}")
+    elif "buttons" in results:
+        summary = results["buttons"]["handler"]
+        print(f"{'buttons':16} {summary['frames']:>7} frames  p99 {summary['p99_ms']:9.2f}ms in on_message")
+    print(f"{results['lines']} lines fed in {results['feed_seconds']:.2f}s, {results['frames_per_second']:.1f} frames/s delivered")
+
+
+@click.command()
+@click.argument("recording_path")
+@click.option("--speed", default=1.0, help="Replay this many times faster than recorded (0 for as fast as possible)")
+@click.option("--max_gap", default=None, type=float, help="Cut silences in the recording to at most this many seconds")
+@click.option("--mqtt_host", default=None, help="Broker to replay against (default: an in-process stand-in)")
+@click.option("--mqtt_port", default=1883, help="MQTT broker port")
+@click.option("--mqtt_topic", default="cubesatsim/data", help="MQTT topic the parser publishes to")
+@click.option(
+    "--parser_args",
+    default="",
+    help="Extra arguments for main.py",
+)
+@click.option("--buttons/--no_buttons", default=True, help="Attach the buttons subscriber on simulated LEDs")
+@click.option("--sweep", "sweep_rates", is_flag=True, help="Find the highest line rate the parser and gauges sustain")
+@click.option("--sweep_frames", default=500, help="Lines per sweep run, repeating the recording as needed")
+@click.option("--sweep_start", default=10.0, help="Lines per second in the first sweep run")
+@click.option("--max_latency", default=1.0, help="Highest p99 latency in seconds a sustained rate may have")
+@click.option("--output", default=None, help="File to write the results to as JSON")
+@click.option("--verbose", is_flag=True, help="Show what the gauges and buttons print")
+def cli(
+    recording_path,
+    speed,
+    max_gap,
+    mqtt_host,
+    mqtt_port,
+    mqtt_topic,
+    parser_args,
+    buttons,
+    sweep_rates,
+    sweep_frames,
+    sweep_start,
+    max_latency,
+    output,
+    verbose,
+):
+    """Replay a recorded pass through the parser and gauges and report latencies."""
+    recording = read_recording(recording_path, max_gap)
+    if not recording:
+        raise click.ClickException(f"No lines in {recording_path}")
+
+    def quiet():
+        if verbose:
+            return contextlib.nullcontext()
+        return contextlib.redirect_stdout(open(os.devnull, "w"))
+
+    options = {
+        "mqtt_host": mqtt_host,
+        "mqtt_port": mqtt_port,
+        "mqtt_topic": mqtt_topic,
+        "parser_args": shlex.split(parser_args),
+        "buttons": buttons,
+    }
+    args = options["parser_args"]
+    if "--payload_format=binary" in args or ("--payload_format", "binary") in zip(args, args[1:]):
+        raise click.BadParameter("replays match frames by raw_aprs, which binary payloads don't carry", param_hint="--parser_args")
+    if sweep_rates:
+        best, runs = sweep([line for _, line in recording], sweep_frames, sweep_start, max_latency, quiet, **options)
+        for results in runs:
+            print(f"--- {results['rate']:g} lines/s: {'sustained' if results['sustained'] else 'fell behind'}")
+            print_results(results)
+        print(f"Highest sustained rate: {best:g} lines/s")
+        results = {"max_sustained_rate": best, "runs": runs}
+    else:
+        with quiet():
+            results = replay(recording, speed, **options)
+        print_results(results)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,3 @@
+#!/bin/bash
+
+uv run feed.py --mqtt_host mosquitto --mqtt_port 1883
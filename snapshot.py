@@ -0,0 +1,151 @@
+"""Keep the latest telemetry per callsign and serve it as retained MQTT state.
+
+Subscribers that (re)connect get the full picture from the broker straight
+away instead of waiting for the next beacon:
+
+    cubesatsim/snapshot/callsigns/<callsign>  retained latest frame of one callsign
+    cubesatsim/latest/<callsign>/<field>      retained latest value of one field,
+                                              other than the timestamp
+    cubesatsim/snapshot/get                   publish here to ask for a snapshot
+
+A frame only republishes its own callsign's topic and the fields that
+changed, so the cost per frame doesn't grow with the number of callsigns.
+The cache holds at most max_callsigns callsigns; the one heard from least
+recently is dropped, and its retained topics cleared, to make room.
+
+A request's payload may be empty or a JSON object with "callsign" to limit
+the reply to one callsign and "reply_to" to choose the reply topic, which
+otherwise is cubesatsim/snapshot/reply. The reply is {callsign: frame}.
+"""
+
+from collections import OrderedDict
+import json
+import threading
+
+from wire import FIELDS
+
+CACHED_FIELDS = (*FIELDS, "timestamp", "source")
+# Every frame has a new timestamp, so it's only kept in the callsign's frame
+FIELD_TOPICS = (*FIELDS, "source")
+MAX_CALLSIGNS = 1000
+
+
+def topic_part(name: str) -> str:
+    # Wildcards and separators can't appear in a topic level
+    return name.translate(str.maketrans("/+#", "___"))
+
+
+class LastValueCache:
+    """The latest known value of every field, per callsign.
+
+    A frame that lacks a section doesn't clear what an earlier frame
+    reported for it, so the cache always holds the fullest picture.
+    """
+
+    def __init__(self, max_callsigns: int = MAX_CALLSIGNS):
+        self.frames = OrderedDict()
+        self.max_callsigns = max_callsigns
+        # (callsign, frame) of each callsign dropped to make room, until taken
+        self.evicted = []
+        self.lock = threading.Lock()
+
+    def update(self, data: dict) -> dict:
+        """Merge a decoded frame in and return the fields whose values changed."""
+        changed = {}
+        callsign = data.get("callsign", "")
+        with self.lock:
+            frame = self.frames.get(callsign)
+            if frame is None:
+                frame = self.frames[callsign] = {}
+                while len(self.frames) > self.max_callsigns:
+                    self.evicted.append(self.frames.popitem(last=False))
+            else:
+                self.frames.move_to_end(callsign)
+            for field in CACHED_FIELDS:
+                value = data.get(field)
+                if value is not None and frame.get(field) != value:
+                    frame[field] = changed[field] = value
+        return changed
+
+    def frame(self, callsign: str) -> dict:
+        with self.lock:
+            return dict(self.frames.get(callsign, {}), callsign=callsign)
+
+    def take_evicted(self) -> list[tuple[str, dict]]:
+        with self.lock:
+            evicted, self.evicted = self.evicted, []
+        return evicted
+
+    def snapshot(self, callsign: str | None = None) -> dict:
+        with self.lock:
+            return {
+                name: dict(frame, callsign=name)
+                for name, frame in self.frames.items()
+                if callsign is None or name == callsign
+            }
+
+
+def encode(value) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+class SnapshotPublisher:
+    """Publish the cache as retained topics and answer snapshot requests."""
+
+    def __init__(
+        self,
+        client,
+        snapshot_topic: str = "cubesatsim/snapshot",
+        field_topic: str = "cubesatsim/latest",
+        max_callsigns: int = MAX_CALLSIGNS,
+        publisher=None,
+    ):
+        # Retained topics go out through publisher, e.g. a main.StartupBuffer,
+        # when given; requests are subscribed to and answered on the client
+        self.client = publisher or client
+        self.cache = LastValueCache(max_callsigns)
+        self.snapshot_topic = snapshot_topic
+        self.field_topic = field_topic
+        self.request_topic = f"{snapshot_topic}/get"
+        self.requests = 0
+        client.message_callback_add(self.request_topic, self.on_request)
+        client.on_connect = self.on_connect
+
+    def on_connect(self, client, userdata, flags, rc):
+        # Subscribe again after every reconnect
+        if rc == 0:
+            client.subscribe(self.request_topic)
+
+    def callsign_topic(self, callsign: str) -> str:
+        return f"{self.snapshot_topic}/callsigns/{topic_part(callsign)}"
+
+    def update(self, data: dict):
+        callsign = data.get("callsign", "")
+        changed = self.cache.update(data)
+        for name, frame in self.cache.take_evicted():
+            # An empty retained message removes the retained copy
+            self.client.publish(self.callsign_topic(name), b"", retain=True)
+            if self.field_topic:
+                for field in frame:
+                    if field in FIELD_TOPICS:
+                        self.client.publish(f"{self.field_topic}/{topic_part(name)}/{field}", b"", retain=True)
+        if not changed:
+            return
+        self.client.publish(self.callsign_topic(callsign), encode(self.cache.frame(callsign)), retain=True)
+        if self.field_topic:
+            prefix = f"{self.field_topic}/{topic_part(callsign)}"
+            for field, value in changed.items():
+                if field in FIELD_TOPICS:
+                    self.client.publish(f"{prefix}/{field}", encode(value), retain=True)
+
+    def on_request(self, client, userdata, message):
+        self.requests += 1
+        try:
+            request = json.loads(message.payload) if message.payload.strip() else {}
+        except (ValueError, UnicodeDecodeError) as e:
+            print(f"Ignoring malformed snapshot request: {e}")
+            return
+        if not isinstance(request, dict):
+            request = {}
+        reply_to = request.get("reply_to") or f"{self.snapshot_topic}/reply"
+        client.publish(reply_to, encode(self.cache.snapshot(request.get("callsign"))))
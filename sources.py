@@ -0,0 +1,162 @@
+"""Input sources for feeding several receivers into one parser.
+
+A source is given as [NAME=]KIND[:ARGUMENT]:
+
+    stdin                   the parser's own stdin
+    pipe:/path/to/fifo      a named pipe, reopened whenever its writer goes away
+    tcp:HOST:PORT           connect to a TCP server that prints lines, reconnecting
+    listen:HOST:PORT        accept any number of TCP clients that send lines
+    udp:HOST:PORT           receive datagrams of one or more lines
+    cmd:COMMAND             run a shell command, e.g. an rtl_fm | multimon-ng pipe
+
+Every source reads independently and yields lines; the pipeline tags each
+frame with the source's name, which defaults to the spec itself.
+"""
+
+import asyncio
+import os
+import stat
+import sys
+from typing import AsyncIterator
+
+KINDS = ("stdin", "pipe", "tcp", "listen", "udp", "cmd")
+RETRY_INTERVAL = 5.0
+# Bytes of lines to read at a time from a file the event loop can't watch
+FILE_READ_BYTES = 64 * 1024
+
+
+def split_address(argument: str) -> tuple[str, int]:
+    host, _, port = argument.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Expected HOST:PORT, got {argument!r}")
+    return host, int(port)
+
+
+def decode_line(line: bytes) -> str:
+    return line.decode("utf-8", errors="replace").strip()
+
+
+class Source:
+    def __init__(self, name: str, kind: str, argument: str = ""):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown source kind {kind}")
+        self.name = name
+        self.kind = kind
+        self.argument = argument
+        if kind in ("tcp", "listen", "udp"):
+            self.address = split_address(argument)
+
+    def __repr__(self):
+        return f"Source({self.name!r}, {self.kind!r}, {self.argument!r})"
+
+    def lines(self) -> AsyncIterator[str]:
+        return getattr(self, f"read_{self.kind}")()
+
+    async def read_stdin(self):
+        loop = asyncio.get_running_loop()
+        mode = os.fstat(sys.stdin.fileno()).st_mode
+        if not (stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode) or stat.S_ISCHR(mode)):
+            # A regular file, e.g. `< capture.log`: the event loop can't
+            # watch one, so read it from a thread a block at a time
+            while lines := await loop.run_in_executor(None, sys.stdin.buffer.readlines, FILE_READ_BYTES):
+                for line in lines:
+                    yield decode_line(line)
+            return
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        while line := await reader.readline():
+            yield decode_line(line)
+
+    async def read_pipe(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Opening a FIFO blocks until something opens it for writing
+            pipe = await loop.run_in_executor(None, open, self.argument, "rb", 0)
+            reader = asyncio.StreamReader()
+            transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+            try:
+                while line := await reader.readline():
+                    yield decode_line(line)
+            finally:
+                transport.close()
+            sys.stderr.write(f"Source {self.name}: writer closed {self.argument}, reopening\n")
+
+    async def read_tcp(self):
+        host, port = self.address
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+            except OSError as e:
+                sys.stderr.write(f"Source {self.name}: {e}. Retrying in {RETRY_INTERVAL}s\n")
+                await asyncio.sleep(RETRY_INTERVAL)
+                continue
+            try:
+                while line := await reader.readline():
+                    yield decode_line(line)
+            except OSError as e:
+                sys.stderr.write(f"Source {self.name}: {e}\n")
+            finally:
+                writer.close()
+            sys.stderr.write(f"Source {self.name}: connection closed, reconnecting\n")
+
+    async def read_listen(self):
+        host, port = self.address
+        lines = asyncio.Queue()
+
+        async def client(reader, writer):
+            try:
+                while line := await reader.readline():
+                    await lines.put(decode_line(line))
+            except OSError:
+                pass
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(client, host, port)
+        async with server:
+            while True:
+                yield await lines.get()
+
+    async def read_udp(self):
+        loop = asyncio.get_running_loop()
+        lines = asyncio.Queue()
+
+        class Protocol(asyncio.DatagramProtocol):
+            def datagram_received(self, data, address):
+                for line in data.splitlines():
+                    lines.put_nowait(decode_line(line))
+
+        transport, _ = await loop.create_datagram_endpoint(Protocol, local_addr=self.address)
+        try:
+            while True:
+                yield await lines.get()
+        finally:
+            transport.close()
+
+    async def read_cmd(self):
+        process = await asyncio.create_subprocess_shell(
+            self.argument, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE
+        )
+        try:
+            while line := await process.stdout.readline():
+                yield decode_line(line)
+        finally:
+            if process.returncode is None:
+                process.terminate()
+            code = await process.wait()
+            sys.stderr.write(f"Source {self.name}: command exited with code {code}\n")
+
+
+def parse_source(spec: str) -> Source:
+    """Parse a [NAME=]KIND[:ARGUMENT] source spec."""
+    name, separator, rest = spec.partition("=")
+    if not separator or ":" in name or " " in name or rest.partition(":")[0] not in KINDS:
+        name, rest = spec, spec
+    kind, _, argument = rest.partition(":")
+    if kind == "pipe" and not argument:
+        raise ValueError("A pipe source needs a path")
+    if kind == "cmd" and not argument.strip():
+        raise ValueError("A cmd source needs a command")
+    if kind == "pipe":
+        argument = os.path.expanduser(argument)
+    return Source(name, kind, argument)
@@ -0,0 +1,332 @@
+"""Append-only, day-partitioned columnar store for decoded frames.
+
+Each UTC day gets a directory holding one raw little-endian array per
+column: timestamp.bin (int64 microseconds), callsign.bin (uint32 index
+into callsigns.txt) and a float64 file per telemetry field, with NaN for
+values the frame didn't carry. Reads memory-map the columns, so range
+queries and downsampling touch only the rows they need.
+
+Rows within a day are expected in arrival order, which lets range queries
+binary search the timestamp column. A day that receives an out of order
+frame is marked with an "unsorted" file and scanned in full instead.
+
+When a day's files are closed, callsign_index.bin is written with the
+rows of each callsign, so a query for one callsign reads only its rows.
+It holds uint32s: the number of callsigns n, n + 1 offsets, then row
+numbers grouped by callsign, in row order; callsign i's rows lie between
+offsets i and i + 1. Rows appended since the index was built are scanned.
+"""
+
+from array import array
+import bisect
+from datetime import UTC, datetime, timedelta
+import math
+import mmap
+import os
+import struct
+import time
+from typing import Generator, Iterable
+
+from wire import FIELDS, decode_timestamp, encode_timestamp
+
+TIMESTAMP = struct.Struct("<q")
+CALLSIGN = struct.Struct("<I")
+VALUE = struct.Struct("<d")
+
+NAN = float("nan")
+DAY = timedelta(days=1)
+
+
+def to_microseconds(moment: datetime | str) -> int:
+    if isinstance(moment, str):
+        return encode_timestamp(moment)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=UTC)
+    return (moment - datetime(1970, 1, 1, tzinfo=UTC)) // datetime.resolution
+
+
+def partition_name(microseconds: int) -> str:
+    return (datetime(1970, 1, 1) + microseconds * datetime.resolution).strftime("%Y-%m-%d")
+
+
+class Column:
+    """A memory-mapped read-only view of one column file."""
+
+    def __init__(self, path: str, fmt: str):
+        self.file = None
+        self.map = None
+        self.view = memoryview(b"").cast(fmt)
+        if os.path.exists(path) and os.path.getsize(path):
+            self.file = open(path, "rb")
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            usable = len(self.map) - len(self.map) % struct.calcsize(fmt)
+            self.view = memoryview(self.map)[:usable].cast(fmt)
+
+    def value(self, row: int) -> float:
+        return self.view[row] if row < len(self.view) else NAN
+
+    def close(self):
+        self.view.release()
+        if self.map is not None:
+            self.map.close()
+            self.file.close()
+
+
+class Partition:
+    """One day of frames, opened for reading."""
+
+    def __init__(self, path: str, fields: Iterable[str]):
+        self.path = path
+        self.columns = {"timestamp": Column(os.path.join(path, "timestamp.bin"), "q")}
+        self.columns["callsign"] = Column(os.path.join(path, "callsign.bin"), "I")
+        for field in fields:
+            self.columns[field] = Column(os.path.join(path, f"{field}.bin"), "d")
+        # A crash mid-append can leave columns of different lengths; rows
+        # count once their timestamp and callsign are written, and field
+        # values missing past the end of a shorter column read as NaN.
+        self.rows = min(len(self.columns["timestamp"].view), len(self.columns["callsign"].view))
+        self.sorted = not os.path.exists(os.path.join(path, "unsorted"))
+        with open(os.path.join(path, "callsigns.txt"), encoding="utf-8") as f:
+            self.callsigns = f.read().splitlines()
+
+        self.index = Column(os.path.join(path, "callsign_index.bin"), "I")
+        self.indexed = 0
+        index = self.index.view
+        if len(index):
+            count = index[0]
+            # An index that doesn't add up, e.g. from an older layout, is ignored
+            if len(index) >= count + 2 and len(index) == count + 2 + index[count + 1] <= count + 2 + self.rows:
+                self.indexed = index[count + 1]
+
+    def rows_between(self, start: int, end: int) -> range:
+        if not self.sorted:
+            return range(self.rows)
+        with self.columns["timestamp"].view[: self.rows] as timestamps:
+            return range(bisect.bisect_left(timestamps, start), bisect.bisect_left(timestamps, end))
+
+    def callsign_rows(self, code: int, start: int, end: int) -> Generator[int]:
+        """Yield the rows of one callsign, in row order, that may fall in [start, end)."""
+        timestamps = self.columns["timestamp"].view
+        if self.indexed:
+            index = self.index.view
+            count = index[0]
+            if code < count:
+                first, last = count + 2 + index[1 + code], count + 2 + index[2 + code]
+                positions = range(first, last)
+                if self.sorted:
+                    key = lambda position: timestamps[index[position]]
+                    positions = range(
+                        bisect.bisect_left(positions, start, key=key) + first,
+                        bisect.bisect_left(positions, end, key=key) + first,
+                    )
+                for position in positions:
+                    yield index[position]
+        callsigns = self.columns["callsign"].view
+        between = self.rows_between(start, end)
+        for row in range(max(self.indexed, between.start), between.stop):
+            if callsigns[row] == code:
+                yield row
+
+    def close(self):
+        for column in self.columns.values():
+            column.close()
+        self.index.close()
+
+
+def build_index(path: str):
+    """Write callsign_index.bin for a day partition from its callsign column."""
+    partition = Partition(path, ())
+    try:
+        rows = [array("I") for _ in partition.callsigns]
+        callsigns = partition.columns["callsign"].view
+        for row in range(partition.rows):
+            rows[callsigns[row]].append(row)
+    finally:
+        partition.close()
+
+    index = array("I", [len(rows), 0])
+    for callsign_rows in rows:
+        index.append(index[-1] + len(callsign_rows))
+    for callsign_rows in rows:
+        index.extend(callsign_rows)
+    # Replace the old index in one step, so a reader never sees half of one
+    temporary = os.path.join(path, "callsign_index.bin.tmp")
+    with open(temporary, "wb") as f:
+        index.tofile(f)
+    os.replace(temporary, os.path.join(path, "callsign_index.bin"))
+
+
+class TelemetryStore:
+    def __init__(self, root: str):
+        self.root = root
+        self.writers = {}
+        self.last_timestamp = {}
+        self.callsign_ids = {}
+        os.makedirs(root, exist_ok=True)
+
+    def writer(self, name: str) -> dict:
+        if name not in self.writers:
+            # Frames arrive in time order, so a new day means the previous
+            # one is finished; an out of order frame just reopens its day.
+            self.close()
+            path = os.path.join(self.root, name)
+            os.makedirs(path, exist_ok=True)
+            files = {"timestamp": open(os.path.join(path, "timestamp.bin"), "ab")}
+            files["callsign"] = open(os.path.join(path, "callsign.bin"), "ab")
+            for field in FIELDS:
+                files[field] = open(os.path.join(path, f"{field}.bin"), "ab")
+            files["callsigns"] = open(os.path.join(path, "callsigns.txt"), "a+", encoding="utf-8")
+            files["callsigns"].seek(0)
+            self.callsign_ids[name] = {
+                callsign: index for index, callsign in enumerate(files["callsigns"].read().splitlines())
+            }
+            partition = Partition(path, FIELDS)
+            rows = partition.rows
+            self.last_timestamp[name] = partition.columns["timestamp"].view[rows - 1] if rows else 0
+            lengths = {field: len(partition.columns[field].view) for field in FIELDS}
+            partition.close()
+
+            # Line every column up with the timestamps before appending, so a
+            # field added to the schema, or one cut short by a crash, stays aligned.
+            files["timestamp"].truncate(rows * TIMESTAMP.size)
+            files["callsign"].truncate(rows * CALLSIGN.size)
+            for field in FIELDS:
+                if lengths[field] < rows:
+                    files[field].write(VALUE.pack(NAN) * (rows - lengths[field]))
+                else:
+                    files[field].truncate(rows * VALUE.size)
+            self.writers[name] = files
+        return self.writers[name]
+
+    def append(self, data: dict):
+        """Append one decoded frame to its day's partition.
+
+        Rows are buffered; call flush() once per batch to make them visible.
+        A frame without a timestamp is stored at the time it arrives here.
+        """
+        timestamp = encode_timestamp(data.get("timestamp")) or time.time_ns() // 1000
+        name = partition_name(timestamp)
+        files = self.writer(name)
+
+        ids = self.callsign_ids[name]
+        callsign = data.get("callsign", "")
+        if callsign not in ids:
+            ids[callsign] = len(ids)
+            files["callsigns"].write(callsign + "\n")
+            files["callsigns"].flush()
+
+        if timestamp < self.last_timestamp[name]:
+            open(os.path.join(self.root, name, "unsorted"), "w").close()
+        self.last_timestamp[name] = max(timestamp, self.last_timestamp[name])
+
+        files["timestamp"].write(TIMESTAMP.pack(timestamp))
+        files["callsign"].write(CALLSIGN.pack(ids[callsign]))
+        for field in FIELDS:
+            value = data.get(field)
+            files[field].write(VALUE.pack(NAN if value is None else float(value)))
+
+    def flush(self, sync: bool = False):
+        """Flush buffered rows to disk, and fsync them too if sync is set."""
+        for files in self.writers.values():
+            for f in files.values():
+                f.flush()
+                if sync:
+                    os.fsync(f.fileno())
+
+    def close(self):
+        self.flush(sync=True)
+        for files in self.writers.values():
+            for f in files.values():
+                f.close()
+        for name in self.writers:
+            build_index(os.path.join(self.root, name))
+        self.writers = {}
+        self.last_timestamp = {}
+        self.callsign_ids = {}
+
+    def partitions(self, start: int, end: int) -> Generator[str]:
+        day = datetime(1970, 1, 1) + start * datetime.resolution
+        last = partition_name(end - 1)
+        while (name := day.strftime("%Y-%m-%d")) <= last:
+            if os.path.exists(os.path.join(self.root, name, "callsigns.txt")):
+                yield os.path.join(self.root, name)
+            day += DAY
+
+    def scan(self, start, end, callsign: str | None, fields: Iterable[str]) -> Generator[tuple[Partition, int]]:
+        """Yield (partition, row) for every stored frame in [start, end)."""
+        start, end = to_microseconds(start), to_microseconds(end)
+        self.flush()
+        for path in self.partitions(start, end):
+            partition = Partition(path, fields)
+            try:
+                if callsign is None:
+                    rows = partition.rows_between(start, end)
+                elif callsign in partition.callsigns:
+                    rows = partition.callsign_rows(partition.callsigns.index(callsign), start, end)
+                else:
+                    continue
+                timestamps = partition.columns["timestamp"].view
+                for row in rows:
+                    if start <= timestamps[row] < end:
+                        yield partition, row
+            finally:
+                partition.close()
+
+    def query(
+        self,
+        start: datetime | str,
+        end: datetime | str,
+        callsign: str | None = None,
+        fields: Iterable[str] = FIELDS,
+    ) -> Generator[dict]:
+        """Yield the stored frames with start <= timestamp < end."""
+        fields = tuple(fields)
+        for partition, row in self.scan(start, end, callsign, fields):
+            data = {
+                "callsign": partition.callsigns[partition.columns["callsign"].view[row]],
+                "timestamp": decode_timestamp(partition.columns["timestamp"].view[row]),
+            }
+            for field in fields:
+                value = partition.columns[field].value(row)
+                data[field] = None if math.isnan(value) else value
+            yield data
+
+    def downsample(
+        self,
+        field: str,
+        start: datetime | str,
+        end: datetime | str,
+        bucket: timedelta,
+        callsign: str | None = None,
+    ) -> Generator[dict]:
+        """Yield min, max, mean and count of a field for each bucket that has data.
+
+        Buckets come out in time order, except on days marked unsorted.
+        """
+        width = bucket // datetime.resolution
+        current = None
+        for partition, row in self.scan(start, end, callsign, (field,)):
+            value = partition.columns[field].value(row)
+            if math.isnan(value):
+                continue
+            index = partition.columns["timestamp"].view[row] // width
+            if current is None or index != current["index"]:
+                if current is not None:
+                    yield summarise(current, width)
+                current = {"index": index, "min": value, "max": value, "total": 0.0, "count": 0}
+            current["min"] = min(current["min"], value)
+            current["max"] = max(current["max"], value)
+            current["total"] += value
+            current["count"] += 1
+        if current is not None:
+            yield summarise(current, width)
+
+
+def summarise(bucket: dict, width: int) -> dict:
+    return {
+        "timestamp": decode_timestamp(bucket["index"] * width),
+        "min": bucket["min"],
+        "max": bucket["max"],
+        "mean": bucket["total"] / bucket["count"],
+        "count": bucket["count"],
+    }
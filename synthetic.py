@@ -0,0 +1,76 @@
+"""Generate realistic synthetic APRS lines as multimon-ng would print them."""
+
+import random
+from typing import Generator
+
+from main import SECTIONS
+
+# Plausible ranges for each telemetry field
+RANGES = {
+    "battery_voltage": (3.2, 4.3),
+    "battery_current": (-600.0, 400.0),
+    "bme_temperature": (-10.0, 45.0),
+    "bme_pressure": (950.0, 1050.0),
+    "bme_altitude": (-50.0, 500.0),
+    "bme_humidity": (5.0, 95.0),
+    "mpu_yaw": (-180.0, 180.0),
+    "mpu_pitch": (-90.0, 90.0),
+    "mpu_roll": (-180.0, 180.0),
+    "gps_latitude": (-90.0, 90.0),
+    "gps_longitude": (-180.0, 180.0),
+    "gps_altitude": (0.0, 500.0),
+    "mcu_temperature": (20.0, 70.0),
+}
+VOLTAGE_RANGE = (0.0, 5.0)
+
+# The kinds of line generate_line can produce and how often each turns up
+KINDS = {
+    "full": 0.75,
+    "partial": 0.1,
+    "truncated": 0.05,
+    "bad_header": 0.03,
+    "no_position": 0.03,
+    "noise": 0.04,
+}
+
+
+def format_section(rng: random.Random, tag: str) -> str:
+    values = []
+    for field in SECTIONS[tag]:
+        low, high = RANGES.get(field, VOLTAGE_RANGE)
+        values.append(f"{rng.uniform(low, high):.2f}")
+    return " ".join([tag, *values])
+
+
+def format_position(rng: random.Random) -> str:
+    latitude = f"{rng.randint(0, 89):02d}{rng.randint(0, 59):02d}.{rng.randint(0, 99):02d}{rng.choice('NS')}"
+    longitude = f"{rng.randint(0, 179):03d}{rng.randint(0, 59):02d}.{rng.randint(0, 99):02d}{rng.choice('EW')}"
+    return f"{latitude}\\{longitude}"
+
+
+def generate_line(rng: random.Random, kind: str = "full", callsign: str | None = None) -> str:
+    """Generate one APRS line of the given kind."""
+    callsign = callsign or f"AMSAT-{rng.randint(1, 15)}"
+    sections = list(SECTIONS)
+    if kind == "partial":
+        sections = rng.sample(sections, rng.randint(1, len(sections) - 1))
+    body = " ".join(format_section(rng, tag) for tag in sections)
+    line = f"APRS: {callsign}>APCSS:={format_position(rng)}Shi hi {body} OK"
+
+    if kind == "truncated":
+        line = line[: rng.randint(len(line) // 3, len(line) - 4)]
+    elif kind == "bad_header":
+        line = line.replace(">", " ", 1)
+    elif kind == "no_position":
+        line = f"APRS: {callsign}>APCSS:>Shi hi {body} OK"
+    elif kind == "noise":
+        line = "APRS: " + "".join(chr(rng.randint(0x20, 0x7E)) for _ in range(rng.randint(5, 120)))
+    return line
+
+
+def generate_lines(count: int, seed: int = 0, kinds: dict[str, float] = KINDS) -> Generator[str]:
+    """Generate a reproducible mix of well formed, partial and malformed lines."""
+    rng = random.Random(seed)
+    names, weights = list(kinds), list(kinds.values())
+    for _ in range(count):
+        yield generate_line(rng, rng.choices(names, weights)[0])
@@ -0,0 +1,61 @@
+from actuators import Scheduler
+from devices import SimulatedLcd, SimulatedServoKit
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_scheduler_coalesces_and_rate_limits():
+    clock = Clock()
+    kit = SimulatedServoKit()
+    writes = []
+
+    def write_servo(channel, angle):
+        writes.append((channel, angle))
+        kit.servo[channel].angle = angle
+
+    scheduler = Scheduler(clock)
+    scheduler.add_device("servos", write_servo, max_rate=2)
+
+    for angle in (10, 20, 30):
+        scheduler.submit("servos", 0, angle)
+    scheduler.submit("servos", 1, 45)
+    assert scheduler.run_pending() is None
+    assert writes == [(0, 30), (1, 45)]
+
+    # Too soon for another write, so it waits and keeps only the latest value
+    scheduler.submit("servos", 0, 40)
+    scheduler.submit("servos", 0, 50)
+    assert scheduler.run_pending() == 0.5
+    clock.now = 0.5
+    scheduler.run_pending()
+    assert writes[-1] == (0, 50)
+    assert kit.servo[0].angle == 50
+
+    # Unchanged values are not written again
+    clock.now = 1.0
+    scheduler.submit("servos", 1, 45)
+    scheduler.run_pending()
+    assert len(writes) == 3
+    assert scheduler.stats()["servos"] == {"pending": 0, "writes": 3, "coalesced": 3, "unchanged": 1}
+
+
+def test_scheduler_thread_writes_lcd_rows():
+    lcd = SimulatedLcd()
+
+    def write_row(row, text):
+        lcd.cursor_position(0, row)
+        lcd.message = text.ljust(20)
+
+    scheduler = Scheduler().start()
+    scheduler.add_device("lcd", write_row)
+    scheduler.submit("lcd", 0, "AMSAT-11")
+    scheduler.submit("lcd", 1, "4.5V -394.2mA")
+    scheduler.stop()
+    assert lcd.rows[0].rstrip() == "AMSAT-11"
+    assert lcd.rows[1].rstrip() == "4.5V -394.2mA"
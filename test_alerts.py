@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from alerts import AlertEngine, RollingExtremes, parse_rule
+
+
+def test_rolling_extremes_match_a_full_window_scan():
+    values = [random.uniform(-10, 10) for _ in range(500)]
+    extremes = RollingExtremes(7)
+    for index, value in enumerate(values):
+        extremes.add(value)
+        window = values[max(0, index - 6) : index + 1]
+        assert extremes.minimum == min(window)
+        assert extremes.maximum == max(window)
+
+
+def test_rolling_extremes_of_int_values():
+    extremes = RollingExtremes(5)
+    for value in (1, 9, 3):
+        extremes.add(value)
+    assert (extremes.minimum, extremes.maximum) == (1.0, 9.0)
+
+
+def test_thresholds_raise_once_and_clear():
+    engine = AlertEngine([parse_rule("battery_voltage:3.5::0.5")], zscore=0)
+    voltages = [4.0, 3.9, 3.4, 3.3, 3.6, 4.2]
+    events = []
+    for voltage in voltages:
+        events += engine.update({"callsign": "AMSAT-11", "battery_voltage": voltage, "mpu_roll": 100.0})
+    assert [(event["kind"], event["status"], event["value"]) for event in events] == [
+        ("below", "raised", 3.4),
+        ("below", "cleared", 3.6),
+        ("change", "raised", 4.2),
+    ]
+    assert events[0]["limit"] == 3.5
+    assert events[-1]["minimum"] == 3.3
+
+
+def test_anomalies_after_warmup():
+    engine = AlertEngine(warmup=10)
+    events = []
+    for index in range(50):
+        events += engine.update({"callsign": "AMSAT-11", "bme_temperature": 20.0 + (index % 2) * 0.1})
+    assert events == []
+    events = engine.update({"callsign": "AMSAT-11", "bme_temperature": 35.0})
+    assert [(event["field"], event["kind"], event["status"]) for event in events] == [
+        ("bme_temperature", "anomaly", "raised")
+    ]
+
+
+def test_bad_rules_are_rejected():
+    with pytest.raises(ValueError):
+        parse_rule("battery_voltage")
+    with pytest.raises(ValueError):
+        parse_rule("battery_voltage:low:4.2")
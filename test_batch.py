@@ -0,0 +1,85 @@
+import gzip
+import io
+import json
+
+from click.testing import CliRunner
+
+import batch
+
+from batch import decode_capture, decode_recording, open_capture, write_csv, write_jsonl
+from parallel import capture_paths, decode_parallel, decode_range, plan_chunks
+
+capture = (
+    "AFSK1200: fm AMSAT-11 to APCSS UI  pid=F0\n"
+    "APRS: AMSAT-11>APCSS:=3901.39N\\07704.41WShi hi BAT 4.50 -394.2 VOL 0.54 3.33 2.38 2.71 4.49 2.81 4.50 OK\n"
+    "APRS: garbage\n"
+)
+
+
+def test_decode_capture_gzip(tmp_path):
+    path = tmp_path / "capture.log.gz"
+    with gzip.open(path, "wt") as f:
+        f.write(capture)
+    with open_capture(str(path)) as f:
+        frames = list(decode_capture(f, chunk_size=16))
+    assert len(frames) == 1
+    assert frames[0]["callsign"] == "AMSAT-11"
+    assert frames[0]["battery_voltage"] == 4.5
+
+
+def test_write_jsonl_and_csv():
+    frames = list(decode_capture(io.StringIO(capture)))
+    jsonl = io.StringIO()
+    assert write_jsonl(frames, jsonl) == 1
+    assert json.loads(jsonl.getvalue())["BAT_voltage"] == 4.5
+
+    table = io.StringIO()
+    assert write_csv(frames, table) == 1
+    header, row = table.getvalue().splitlines()
+    assert header.startswith("callsign,latitude,longitude,battery_voltage")
+    assert row.startswith("AMSAT-11,")
+
+
+def test_decode_recording_keeps_arrival_times():
+    line = capture.splitlines()[1]
+    recording = io.StringIO(
+        json.dumps({"time": 1748779200.25, "line": line}) + "\n" + json.dumps({"time": 1748779260.0, "line": "APRS: garbage"}) + "\n"
+    )
+    frames = list(decode_recording(recording))
+    assert [data["timestamp"] for data in frames] == ["2025-06-01T12:00:00.250000Z"]
+    assert frames[0]["callsign"] == "AMSAT-11"
+
+
+def test_decode_parallel_preserves_order(tmp_path):
+    lines = [
+        f"APRS: SAT-{i}>APCSS:=3901.39N\\07704.41WShi hi BAT 4.{i % 10}0 -394.2 \n"
+        for i in range(200)
+    ]
+    path = tmp_path / "capture.log"
+    path.write_text("".join(lines))
+
+    chunks = plan_chunks(capture_paths(str(tmp_path)), chunk_bytes=1000)
+    assert len(chunks) > 1
+
+    frames = list(decode_parallel(str(tmp_path), workers=2, chunk_bytes=1000))
+    assert [frame["callsign"] for frame in frames] == [f"SAT-{i}" for i in range(200)]
+
+
+def test_decode_range_keeps_indented_lines_like_read_capture(tmp_path):
+    text = capture.replace("\nAPRS: ", "\n  APRS: ")
+    path = tmp_path / "capture.log"
+    path.write_text(text)
+    with open_capture(str(path)) as f:
+        expected = [frame["callsign"] for frame in decode_capture(f)]
+    assert expected == ["AMSAT-11"]
+    assert [frame["callsign"] for frame in decode_range(str(path), 0, len(text))] == expected
+
+
+def test_stdin_decodes_serially_with_workers_and_stays_open():
+    result = CliRunner().invoke(batch.main, ["--input", "-", "--workers", "2"], input=capture)
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.stdout.splitlines()[0])["callsign"] == "AMSAT-11"
+
+    with open_capture("-") as f:
+        pass
+    assert not f.closed
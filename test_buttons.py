@@ -0,0 +1,118 @@
+import json
+import time
+
+import paho.mqtt.client as mqtt
+
+from buttons import RESET_LED_SECONDS, ButtonPanel, create_buttons
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeClient:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload, qos=0):
+        self.published.append((topic, json.loads(payload)["action"], qos))
+        return mqtt.MQTTMessageInfo(len(self.published))
+
+
+class Message:
+    def __init__(self, topic):
+        self.topic = topic
+
+
+def drain(panel):
+    while panel.run_pending():
+        pass
+
+
+def test_presses_publish_in_order_and_bounces_are_dropped():
+    clock = FakeClock()
+    client = FakeClient()
+    panel = ButtonPanel(client, qos=1, debounce=0.2, clock=clock)
+    buttons = create_buttons("simulated")
+    panel.attach(buttons)
+
+    buttons["aprs"].press()
+    clock.now = 0.05
+    buttons["aprs"].press()  # contact bounce
+    buttons["sstv"].press()
+    drain(panel)
+
+    assert client.published == [("cubesatsim/actions", "aprs", 1), ("cubesatsim/actions", "sstv", 1)]
+    assert panel.state == "sstv_requested"
+    assert panel.leds["sstv"].state == "blinking"
+    assert panel.leds["telem"].state == "off"
+    assert panel.stats()["debounced"] == 1
+
+    # The broker acknowledges the first action
+    panel.on_publish(client, None, 1)
+    drain(panel)
+    assert panel.stats()["acknowledged"] == 1
+    assert panel.stats()["unacknowledged"] == 1
+
+
+def test_mode_messages_set_leds_and_clear_requests():
+    panel = ButtonPanel(FakeClient(), clock=FakeClock())
+    panel.pressed("aprs")
+    panel.on_message(None, None, Message("cubesatsim/photos"))
+    drain(panel)
+    assert panel.state == "idle"
+    assert (panel.leds["telem"].state, panel.leds["sstv"].state) == ("on", "off")
+
+    panel.on_message(None, None, Message("cubesatsim/data"))
+    drain(panel)
+    assert (panel.leds["telem"].state, panel.leds["sstv"].state) == ("off", "on")
+
+
+def test_reset_led_turns_off_on_a_timer():
+    clock = FakeClock()
+    panel = ButtonPanel(FakeClient(), clock=clock)
+    panel.pressed("reset")
+    panel.released("reset")
+    drain(panel)
+    assert panel.leds["reset"].state == "on"
+
+    clock.now = RESET_LED_SECONDS + 0.01
+    panel.run_pending()
+    assert panel.leds["reset"].state == "off"
+
+
+def test_worker_thread_handles_simulated_presses():
+    client = FakeClient()
+    panel = ButtonPanel(client, debounce=0).start()
+    buttons = create_buttons("simulated")
+    panel.attach(buttons)
+    for _ in range(100):
+        buttons["aprs"].press()
+        buttons["aprs"].release()
+    panel.stop()
+    assert len(client.published) == 100
+
+
+def test_worker_thread_runs_timers_and_keeps_going():
+    client = FakeClient()
+    panel = ButtonPanel(client, debounce=0).start()
+    buttons = create_buttons("simulated")
+    panel.attach(buttons)
+    buttons["reset"].press()
+    buttons["reset"].release()
+    deadline = time.monotonic() + 5
+    while panel.leds["reset"].state != "off" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert panel.leds["reset"].state == "off"
+    assert panel.thread.is_alive()
+
+    # Events after the timer are still handled
+    buttons["aprs"].press()
+    panel.on_publish(client, None, 2)
+    panel.stop()
+    assert [action for _, action, _ in client.published] == ["reset", "aprs"]
+    assert panel.stats()["acknowledged"] == 1
@@ -0,0 +1,51 @@
+import io
+import math
+
+import numpy as np
+
+from columns import FrameColumns, decode_columns
+from main import decode_aprs
+from synthetic import generate_lines
+from wire import FIELDS
+
+
+def test_columns_match_decode_aprs():
+    lines = list(generate_lines(2000, seed=1))
+    columns = decode_columns(lines, chunk_lines=300)
+    frames = [data for data in map(decode_aprs, lines) if data]
+    assert len(columns) == len(frames)
+    assert list(columns["callsign"]) == [data["callsign"] for data in frames]
+    for field in FIELDS:
+        expected = [math.nan if data[field] is None else float(data[field]) for data in frames]
+        np.testing.assert_array_equal(columns[field], expected)
+
+
+def test_columns_round_trip_npz():
+    lines = [
+        "APRS: AMSAT-11>APCSS:=3901.39N\\07704.41WShi hi BAT 4.50 -394.2 OK",
+        "APRS: garbage",
+        "APRS: AMSAT-12>APCSS:=3901.39N\\07704.41WShi hi TMP 31.50 OK",
+    ]
+    columns = decode_columns(lines)
+    assert list(columns["callsign"]) == ["AMSAT-11", "AMSAT-12"]
+    assert columns["battery_voltage"][0] == 4.5 and math.isnan(columns["battery_voltage"][1])
+    assert columns["mcu_temperature"][1] == 31.5
+
+    output = io.BytesIO()
+    columns.save_npz(output)
+    output.seek(0)
+    saved = np.load(output)
+    assert list(saved["callsigns"]) == columns.callsigns
+    np.testing.assert_array_equal(saved["latitude"], columns["latitude"])
+    assert len(FrameColumns.concatenate([])) == 0
+
+
+def test_columns_take_per_line_timestamps():
+    lines = [
+        "APRS: AMSAT-11>APCSS:=3901.39N\\07704.41WShi hi BAT 4.50 -394.2 OK",
+        "APRS: garbage",
+        "APRS: AMSAT-12>APCSS:=3901.39N\\07704.41WShi hi TMP 31.50 OK",
+    ]
+    timestamps = np.array(["2025-06-01T12:00:00", "2025-06-01T12:00:01", "2025-06-01T12:00:02"], "datetime64[us]")
+    columns = decode_columns(lines, chunk_lines=2, timestamps=timestamps)
+    assert [row["timestamp"] for row in columns.rows()] == ["2025-06-01T12:00:00Z", "2025-06-01T12:00:02Z"]
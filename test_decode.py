@@ -1,13 +1,21 @@
+import random
+
 from main import (
+    DiagnosticLog,
     decode_aprs,
     decode_position,
+    decode_position_strings,
     decode_battery,
     decode_bme_sensor,
     decode_mpu6050,
-    decode_voltages
+    decode_sections,
+    decode_voltages,
+    SECTION_FIELDS,
 )
+from metrics import FRAMES_FAILED, FRAMES_PARTIAL
+from synthetic import generate_line, generate_lines
 
-sample = "APRS: AMSAT-11>APCSS:=3901.39N\\07704.41WShi hi BAT 4.50 -394.2 VOL 0.54 3.33 2.38 2.71 4.49 2.81 4.50 OK BME280 33.33 992.57 173.64 31.07 MPU6050 -55.51 -0.17 0.10 "
+sample = "APRS: 2E0JJI-11>APCSS:=5324.08N\\00132.20WShi hi BAT 4.32 -514.7 VOL 4.25 1.71 3.33 1.49 2.64 0.86 4.49 0.00 OK BME280 27.55 998.38 124.55 27.48 MPU6050 -2.06 0.16 0.00"
 
 def test_with_sample():
     result = decode_aprs(sample)
@@ -40,6 +48,19 @@ def test_decode_position():
     assert result.lon.to_string("D") == "-1.5388888888888888"
 
 
+def test_decode_position_strings_matches_latloncalc():
+    for position in ("5324.08N\\00132.20W", "3901.39N\\07704.41W", "0000.00S\\00059.99E"):
+        latlng = decode_position(position)
+        assert decode_position_strings(position) == (
+            latlng.lat.to_string("D"),
+            latlng.lon.to_string("D"),
+        )
+
+    hits = decode_position_strings.cache_info().hits
+    decode_position_strings("5324.08N\\00132.20W")
+    assert decode_position_strings.cache_info().hits == hits + 1
+
+
 def test_decode_battery():
     battery_details = decode_battery(sample)
     assert battery_details["battery_voltage"] == 4.32
@@ -80,3 +101,71 @@ def test_decode_voltages():
     assert result["MINUS_Z_voltage"] == 0.86
     assert result["BAT_voltage"] == 4.49
     assert result["BUS_voltage"] == 0.00
+
+
+def test_decode_voltages_without_bus_voltage():
+    # Older firmware sends seven VOL values; BUS_voltage is optional
+    result = decode_voltages("VOL 0.54 3.33 2.38 2.71 4.49 2.81 4.50 OK")
+    assert result["PLUS_X_voltage"] == 0.54
+    assert result["BAT_voltage"] == 4.50
+    assert result["BUS_voltage"] is None
+    # Six values are still a truncated section
+    assert decode_voltages("VOL 0.54 3.33 2.38 2.71 4.49 2.81 OK")["PLUS_X_voltage"] is None
+
+
+def test_decode_sections():
+    result = decode_sections("BAT 4.32 -514.7 GPS 53.40 -1.53 120.5 TMP 41.2 VOL 4.25 1.71")
+    assert result["battery_voltage"] == 4.32
+    assert result["battery_current"] == -514.7
+    assert result["gps_latitude"] == 53.40
+    assert result["gps_longitude"] == -1.53
+    assert result["gps_altitude"] == 120.5
+    assert result["mcu_temperature"] == 41.2
+    # Truncated sections are left empty rather than partially filled
+    assert result["PLUS_X_voltage"] is None
+    assert result["bme_temperature"] is None
+
+
+def test_synthetic_full_frames_decode_every_field():
+    for line in generate_lines(50, seed=1, kinds={"full": 1.0}):
+        result = decode_aprs(line)
+        assert all(result[field] is not None for field in SECTION_FIELDS)
+
+
+def test_malformed_frames_are_classified_without_raising():
+    rng = random.Random(3)
+    for kind, reason in (("bad_header", "bad_header"), ("noise", "noise")):
+        failed = FRAMES_FAILED.value(reason)
+        assert decode_aprs(generate_line(rng, kind, callsign="AMSAT-11")) == {}
+        assert FRAMES_FAILED.value(reason) == failed + 1
+
+
+def test_partial_frames_keep_what_decoded():
+    partial = FRAMES_PARTIAL.value("no_position")
+    result = decode_aprs("APRS: AMSAT-11>APCSS:>Shi hi BAT 4.50 -394.2 OK")
+    assert (result["latitude"], result["longitude"]) == (None, None)
+    assert result["battery_voltage"] == 4.5
+    assert FRAMES_PARTIAL.value("no_position") == partial + 1
+    # Without a position or any section there's nothing to keep
+    assert decode_aprs("APRS: AMSAT-11>APCSS:>Shi hi OK") == {}
+
+    truncated = FRAMES_PARTIAL.value("truncated_sections")
+    result = decode_aprs("APRS: AMSAT-11>APCSS:=3901.39N\\07704.41WShi hi BAT 4.50 -394.2 TMP 31.50 VOL 4.25 1.")
+    assert result["latitude"] is not None and result["mcu_temperature"] == 31.5
+    assert result["PLUS_X_voltage"] is None
+    assert FRAMES_PARTIAL.value("truncated_sections") == truncated + 1
+
+
+def test_diagnostics_are_rate_limited(capsys):
+    now = [0.0]
+    log = DiagnosticLog(interval=10, clock=lambda: now[0])
+    for _ in range(5):
+        log.report("noise", "xyz")
+    log.report("bad_header", "abc")
+    now[0] = 11
+    log.report("noise", "xyz")
+    assert capsys.readouterr().err.splitlines() == [
+        "Malformed APRS data, noise: 'xyz'",
+        "Malformed APRS data, bad header: 'abc'",
+        "Malformed APRS data, noise (and 4 more since the last): 'xyz'",
+    ]
@@ -0,0 +1,38 @@
+from dedup import Deduplicator, normalize
+
+DIRECT = "APRS: AMSAT-11>APCSS:=3901.39N\\07704.41WShi hi BAT 4.50 -394.2 OK"
+DIGIPEATED = "APRS: AMSAT-11>APCSS,WIDE1-1*,WIDE2-1:=3901.39N\\07704.41WShi hi  BAT 4.50 -394.2 OK "
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalize_strips_digipeater_path():
+    assert normalize(DIRECT) == normalize(DIGIPEATED) == "AMSAT-11>APCSS:=3901.39N\\07704.41WShi hi BAT 4.50 -394.2 OK"
+    assert normalize(DIGIPEATED.encode()) == normalize(DIRECT).encode()
+
+
+def test_duplicates_within_window_are_counted_not_passed():
+    clock = Clock()
+    dedup = Deduplicator(window=10, clock=clock)
+    assert not dedup.is_duplicate(DIRECT)
+    assert dedup.is_duplicate(DIGIPEATED)
+    assert dedup.is_duplicate(DIRECT)
+    assert not dedup.is_duplicate(DIRECT.replace("4.50", "4.49"))
+
+    clock.now = 10
+    assert not dedup.is_duplicate(DIRECT)
+    assert dedup.stats() == {"unique": 3, "duplicates": 2, "tracked": 1}
+
+
+def test_memory_is_bounded():
+    dedup = Deduplicator(window=60, max_entries=2, clock=Clock())
+    for callsign in ("A", "B", "C"):
+        dedup.is_duplicate(DIRECT.replace("AMSAT-11", callsign))
+    assert len(dedup.seen) == 2
+    assert not dedup.is_duplicate(DIRECT.replace("AMSAT-11", "A"))
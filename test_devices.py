@@ -0,0 +1,83 @@
+import threading
+import time
+
+from actuators import Scheduler
+from devices import Hardware
+from frame import TelemetryFrame
+import gauges
+
+
+def use_simulated_hardware(monkeypatch, **kwargs):
+    hardware = Hardware("simulated", **kwargs)
+    monkeypatch.setattr(gauges, "hardware", hardware)
+    monkeypatch.setattr(gauges, "scheduler", Scheduler())
+    monkeypatch.setattr(gauges, "servo_targets", {})
+    monkeypatch.setattr(gauges, "frame_count", 0)
+    gauges.add_devices(0, 0, 0)
+    return hardware
+
+
+def test_show_frame_on_simulated_hardware(monkeypatch):
+    hardware = use_simulated_hardware(monkeypatch, record=True)
+    hardware.initialize().join()
+
+    gauges.show_frame(TelemetryFrame("AMSAT-11", battery_voltage=4.5, BAT_voltage=3.0))
+    gauges.scheduler.run_pending()
+
+    assert hardware.frame_display.text == "00000001"
+    assert hardware.lcd.rows[0].rstrip() == "AMSAT-11"
+    assert hardware.servo_kit.servo[4].angle == 45
+    assert ("servo_kit.servo[4]", "set angle", [45]) in [entry[1:] for entry in hardware.log]
+
+
+def test_sweep_does_not_block_and_restores_telemetry(monkeypatch):
+    hardware = use_simulated_hardware(monkeypatch)
+    scheduler = gauges.scheduler.start()
+
+    started = time.monotonic()
+    gauges.init_servos(sweep=True, step_seconds=0.05)
+    assert time.monotonic() - started < 0.05
+    gauges.show_frame(TelemetryFrame(BAT_voltage=3.0))
+
+    time.sleep(0.3)
+    scheduler.stop()
+    assert hardware.servo_kit.servo[0].angle == 45
+    assert hardware.servo_kit.servo[1].angle == 0
+    assert hardware.servo_kit.servo[4].angle == 45
+
+
+def test_show_frame_does_not_wait_for_devices_initializing(monkeypatch):
+    hardware = use_simulated_hardware(monkeypatch)
+    # A display still coming up holds its lock
+    initializing = hardware.locks.setdefault("frame_display", threading.Lock())
+    initializing.acquire()
+    try:
+        shown = threading.Thread(target=gauges.show_frame, args=(TelemetryFrame("AMSAT-11", BAT_voltage=3.0),))
+        shown.start()
+        shown.join(1.0)
+        assert not shown.is_alive()
+    finally:
+        initializing.release()
+
+    gauges.scheduler.run_pending()
+    assert hardware.frame_display.text == "00000001"
+
+
+def test_displays_failed():
+    hardware = Hardware("simulated")
+    assert not hardware.displays_failed
+    hardware.devices["rx_freq_display"] = None
+    assert hardware.displays_failed
+
+
+def test_waiting_screen_shows_zeros_for_missing_values():
+    lines = gauges.lcd_lines(TelemetryFrame("WAITING"))
+    assert lines[:3] == ["WAITING", "0.0V 0.0mA", "0.0, 0.0, 0.0"]
+
+
+def test_frequency_displays_are_written_by_the_scheduler(monkeypatch):
+    hardware = use_simulated_hardware(monkeypatch)
+    gauges.scheduler.submit("freq_displays", "rx_freq_display", "434900")
+    assert "rx_freq_display" not in hardware.devices
+    gauges.scheduler.run_pending()
+    assert hardware.rx_freq_display.text == "00434900"
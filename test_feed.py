@@ -0,0 +1,45 @@
+from feed import DashboardFeed
+from frame import TelemetryFrame
+
+
+def test_feed_sends_only_changes_and_summarises_bursts():
+    feed = DashboardFeed(precision=1)
+    feed.add(TelemetryFrame("AMSAT-11", battery_voltage=4.51, mpu_roll=10.0))
+    delta = feed.tick()
+    assert delta["seq"] == 1
+    assert delta["callsigns"] == {"AMSAT-11": {"battery_voltage": 4.5, "mpu_roll": 10.0}}
+
+    # Nothing new, and then only noise below the display precision
+    assert feed.tick() is None
+    feed.add(TelemetryFrame("AMSAT-11", battery_voltage=4.49, mpu_roll=10.0))
+    assert feed.tick() is None
+
+    # Several samples in one interval become [min, max, mean]
+    for roll in (10.0, 20.0, 30.0):
+        feed.add(TelemetryFrame("AMSAT-11", battery_voltage=4.5, mpu_roll=roll))
+    delta = feed.tick()
+    assert delta["seq"] == 2
+    assert delta["callsigns"] == {"AMSAT-11": {"battery_voltage": [4.5, 4.5, 4.5], "mpu_roll": [10.0, 30.0, 20.0]}}
+
+    assert feed.snapshot()["callsigns"] == {
+        "AMSAT-11": {"battery_voltage": [4.5, 4.5, 4.5], "mpu_roll": [10.0, 30.0, 20.0]}
+    }
+
+
+def test_feed_drops_the_least_recently_heard_callsign():
+    feed = DashboardFeed(precision=1, max_callsigns=2)
+    feed.add(TelemetryFrame("AMSAT-1", battery_voltage=4.5))
+    feed.add(TelemetryFrame("AMSAT-2", battery_voltage=4.5))
+    feed.tick()
+    feed.add(TelemetryFrame("AMSAT-1", battery_voltage=4.4))
+    feed.tick()
+
+    # AMSAT-2 was heard from least recently, so clients are told to drop it
+    feed.add(TelemetryFrame("AMSAT-3", battery_voltage=4.3))
+    assert feed.tick()["callsigns"] == {"AMSAT-2": None, "AMSAT-3": {"battery_voltage": 4.3}}
+    assert list(feed.snapshot()["callsigns"]) == ["AMSAT-1", "AMSAT-3"]
+
+    # Within one interval, too, only the latest callsigns are kept
+    for index in range(10):
+        feed.add(TelemetryFrame(f"AMSAT-{index + 10}", battery_voltage=4.0))
+    assert len(feed.series) == 2
@@ -0,0 +1,26 @@
+import pytest
+
+from frame import SCHEMA, TelemetryFrame
+import gauges
+from main import decode_aprs
+from synthetic import generate_lines
+from wire import FIELDS
+
+
+def test_schema_covers_every_producer_and_consumer_field():
+    data = decode_aprs(next(generate_lines(1, kinds={"full": 1.0})))
+    assert set(data) <= set(SCHEMA)
+    assert set(FIELDS) <= set(SCHEMA)
+    assert set(gauges.servos) <= set(SCHEMA)
+    with pytest.raises(TypeError):
+        TelemetryFrame(battery_volts=4.5)
+
+
+def test_frames_round_trip_through_every_form():
+    frames = [TelemetryFrame.from_dict(data) for data in map(decode_aprs, generate_lines(100, seed=3)) if data]
+    assert frames[0].to_dict() == decode_aprs("APRS: " + frames[0].raw_aprs) | {"timestamp": frames[0].timestamp}
+    assert [TelemetryFrame.from_json(frame.to_json()) for frame in frames] == frames
+
+    without_raw = [TelemetryFrame.from_dict(frame.to_dict() | {"raw_aprs": None}) for frame in frames]
+    assert TelemetryFrame.from_payload(TelemetryFrame.to_payload(frames, "binary")) == without_raw
+    assert TelemetryFrame.from_columns(TelemetryFrame.to_columns(frames)) == without_raw
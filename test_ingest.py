@@ -0,0 +1,25 @@
+import io
+
+from ingest import capture_stdin_bytes, decode_aprs_bytes
+from main import decode_aprs
+from synthetic import generate_lines
+
+
+def test_byte_path_matches_text_path():
+    lines = [
+        *generate_lines(200, seed=7),
+        "not a frame",
+        "  APRS: AMSAT-11>APCSS:=3901.39N\\07704.41WShi hi BAT 4.50 -394.2 OK\r",
+        "APRS: AMSAT-11>APCSS:=3901.39N\x1f07704.41WShi hi BAT 4.50 -394.2 OK",
+        "APRS: AMSAT-11 no header",
+    ]
+    stream = io.BufferedReader(io.BytesIO("\n".join(lines).encode("utf-8")))
+    captured = list(capture_stdin_bytes(stream, block_bytes=256))
+    expected = [line.strip() for line in lines if line.strip().startswith("APRS:")]
+    assert [line.decode("utf-8") for line in captured] == expected
+
+    for line, text in zip(captured, expected):
+        data, text_data = decode_aprs_bytes(line), decode_aprs(text)
+        data.pop("timestamp", None)
+        text_data.pop("timestamp", None)
+        assert data == text_data
@@ -0,0 +1,52 @@
+from main import decode_aprs
+from metrics import FRAMES_DECODED, FRAMES_FAILED, Histogram, REGISTRY, render
+
+
+def test_decode_outcomes_are_counted():
+    decoded = FRAMES_DECODED.value()
+    failed = FRAMES_FAILED.value("bad_header")
+    decode_aprs("APRS: AMSAT-11>APCSS:=3901.39N\\07704.41WShi hi BAT 4.50 -394.2 OK")
+    decode_aprs("APRS: AMSAT-11 no header")
+    assert FRAMES_DECODED.value() == decoded + 1
+    assert FRAMES_FAILED.value("bad_header") == failed + 1
+    assert 'cubesatsim_frames_failed_total{reason="bad_header"}' in render()
+
+
+def test_histogram_render():
+    histogram = Histogram("test_seconds", "A test histogram", "stage", buckets=(0.1, 1.0))
+    REGISTRY.remove(histogram)
+    histogram.observe(0.05, "decode")
+    histogram.observe(0.5, "decode")
+    histogram.observe(5.0, "decode")
+    assert histogram.render()[2:] == [
+        'test_seconds_bucket{stage="decode",le="0.1"} 1',
+        'test_seconds_bucket{stage="decode",le="1.0"} 2',
+        'test_seconds_bucket{stage="decode",le="+Inf"} 3',
+        'test_seconds_sum{stage="decode"} 5.55',
+        'test_seconds_count{stage="decode"} 3',
+    ]
+
+
+def test_publish_tracker_counts_only_tracked_messages():
+    import paho.mqtt.client as mqtt
+
+    from metrics import PublishTracker
+
+    class Client:
+        on_publish = None
+
+    tracker = PublishTracker(Client())
+    tracker.track(mqtt.MQTTMessageInfo(1))
+    tracker.track(mqtt.MQTTMessageInfo(2))
+    # Snapshot and alert publishes share the client but aren't tracked
+    tracker.on_publish(None, None, 7)
+    tracker.on_publish(None, None, 1)
+    assert tracker.pending == {2}
+    assert not tracker.wait_sent(0.01)
+
+    # Reported sent before track() saw it
+    tracker.on_publish(None, None, 3)
+    tracker.track(mqtt.MQTTMessageInfo(3))
+    tracker.on_publish(None, None, 2)
+    assert tracker.pending == set()
+    assert tracker.wait_sent(0.01)
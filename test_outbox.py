@@ -0,0 +1,83 @@
+import paho.mqtt.client as mqtt
+
+from outbox import Outbox
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Info:
+    def __init__(self, rc, mid):
+        self.rc = rc
+        self.mid = mid
+
+
+class FakeClient:
+    def __init__(self):
+        self.connected = False
+        self.sent = []
+        self.on_publish = None
+
+    def is_connected(self):
+        return self.connected
+
+    def publish(self, topic, payload, qos):
+        if not self.connected:
+            return Info(mqtt.MQTT_ERR_NO_CONN, 0)
+        self.sent.append(payload)
+        return Info(mqtt.MQTT_ERR_SUCCESS, len(self.sent))
+
+
+def test_outbox_replays_in_order_across_restarts_at_a_limited_rate(tmp_path):
+    clock = Clock()
+    client = FakeClient()
+    outbox = Outbox(str(tmp_path), client, rate=2, clock=clock, segment_bytes=64)
+    for index in range(5):
+        outbox.publish("cubesatsim/data", f"frame {index}")
+    assert outbox.pump() == 0.5
+    assert client.sent == []
+    outbox.close()
+
+    # The broker is back after a restart: nothing was lost, and the backlog
+    # drains at two messages a second
+    client = FakeClient()
+    client.connected = True
+    outbox = Outbox(str(tmp_path), client, rate=2, clock=clock, segment_bytes=64)
+    outbox.attach()
+    assert outbox.stats()["pending"] == 5
+    outbox.pump()
+    assert client.sent == [b"frame 0"]
+    clock.now += 1
+    outbox.pump()
+    assert client.sent == [b"frame 0", b"frame 1", b"frame 2"]
+
+    for mid in (2, 1):
+        client.on_publish(client, None, mid)
+    assert outbox.stats()["acked"] == 2
+    outbox.close()
+
+    # Only the unacknowledged messages come back, still in order
+    client = FakeClient()
+    client.connected = True
+    outbox = Outbox(str(tmp_path), client, rate=100, clock=clock)
+    clock.now += 1
+    outbox.pump()
+    assert client.sent == [b"frame 2", b"frame 3", b"frame 4"]
+    outbox.close()
+
+
+def test_outbox_drops_oldest_when_full(tmp_path):
+    client = FakeClient()
+    outbox = Outbox(str(tmp_path), client, segment_bytes=40, max_bytes=80, clock=Clock())
+    for index in range(6):
+        outbox.publish("t", f"frame {index}")
+    stats = outbox.stats()
+    assert stats["dropped"] == 3
+    assert stats["bytes"] <= 80
+    assert [record[2] for record in outbox.pending] == [b"frame 3", b"frame 4", b"frame 5"]
+    outbox.close()
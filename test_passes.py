@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+from passes import PassAggregator, PassPublisher, read_passes, rollup
+from wire import decode_timestamp
+
+START = 1_700_000_000_000_000  # 2023-11-14T22:13:20Z
+
+
+def frame(seconds, callsign="AMSAT-11", battery=4.0, panels=(1.0, 0.0, 1.5, 0.0, 2.0, 0.5), temperature=20.0):
+    return {
+        "callsign": callsign,
+        "timestamp": decode_timestamp(START + int(seconds * 1e6)),
+        "battery_voltage": battery,
+        **dict(zip(("PLUS_X_voltage", "MINUS_X_voltage", "PLUS_Y_voltage", "MINUS_Y_voltage", "PLUS_Z_voltage", "MINUS_Z_voltage"), panels)),
+        "bme_temperature": temperature,
+        "mcu_temperature": None,
+    }
+
+
+def test_passes_split_on_gaps_and_summarise():
+    aggregator = PassAggregator(gap=300)
+    closed = []
+    # A pass beaconing every 10s with two beacons missing, then another after an hour
+    for seconds in (0, 10, 20, 50, 60):
+        closed += aggregator.update(frame(seconds, battery=3.9 + seconds / 100, temperature=seconds))
+    assert closed == []
+    closed += aggregator.update(frame(3600))
+
+    [summary] = closed
+    assert summary["frames"] == 5
+    assert summary["expected_frames"] == 7
+    assert summary["loss_rate"] == pytest.approx(2 / 7)
+    assert summary["beacon_interval"] == 10
+    assert summary["duration_seconds"] == 60
+    assert (summary["battery_voltage"]["min"], summary["battery_voltage"]["max"]) == (3.9, 4.5)
+    assert summary["solar_voltage"]["mean"] == 5.0
+    assert (summary["bme_temperature"]["min"], summary["bme_temperature"]["max"]) == (0, 60)
+    assert summary["mcu_temperature"]["count"] == 0
+
+    [last] = aggregator.close()
+    assert last["frames"] == 1 and last["loss_rate"] == 0
+
+
+def test_callsigns_have_their_own_passes():
+    aggregator = PassAggregator(gap=300)
+    aggregator.update(frame(0, "AMSAT-11"))
+    aggregator.update(frame(200, "AMSAT-12"))
+    closed = aggregator.update(frame(400, "AMSAT-12"))
+    assert [summary["callsign"] for summary in closed] == ["AMSAT-11"]
+
+
+def test_rollups_from_saved_summaries_match_the_frames(tmp_path):
+    class Client:
+        def __init__(self):
+            self.published = []
+
+        def publish(self, topic, payload):
+            self.published.append((topic, payload))
+
+    path = tmp_path / "passes.jsonl"
+    client = Client()
+    publisher = PassPublisher(client, PassAggregator(gap=300), path=str(path))
+    batteries = []
+    for pass_number in range(4):
+        for index in range(6):
+            battery = 3.5 + pass_number * 0.1 + index * 0.01
+            batteries.append(battery)
+            publisher.update(frame(pass_number * 5400 + index * 10, battery=battery))
+    publisher.close()
+
+    summaries = read_passes(str(path))
+    assert len(summaries) == len(client.published) == 4
+    assert json.loads(client.published[0][1]) == summaries[0]
+
+    [month] = rollup(summaries)
+    assert month["period"] == "2023-11"
+    assert (month["passes"], month["frames"], month["loss_rate"]) == (4, 24, 0)
+    assert month["battery_voltage"]["min"] == min(batteries)
+    assert month["battery_voltage"]["max"] == max(batteries)
+    assert month["battery_voltage"]["mean"] == pytest.approx(sum(batteries) / len(batteries))
+    assert [day["period"] for day in rollup(summaries, 10)] == ["2023-11-14", "2023-11-15"]
+
+
+def test_summaries_closed_at_eof_are_waited_for():
+    import paho.mqtt.client as mqtt
+
+    from metrics import PublishTracker
+
+    class Client:
+        on_publish = None
+
+        def __init__(self):
+            self.mid = 0
+
+        def publish(self, topic, payload):
+            self.mid += 1
+            return mqtt.MQTTMessageInfo(self.mid)
+
+    client = Client()
+    tracker = PublishTracker(client)
+    publisher = PassPublisher(client, PassAggregator(gap=300))
+    for seconds in (0, 10, 5400, 5410):
+        publisher.update(frame(seconds))
+    publisher.close(tracker)
+
+    # The first pass closed mid-run and isn't waited for; the one open at EOF is
+    assert tracker.pending == {2}
+    assert not tracker.wait_sent(0.01)
+    tracker.on_publish(None, None, 2)
+    assert tracker.wait_sent(0.01)
@@ -0,0 +1,57 @@
+import asyncio
+
+from pipeline import StageQueue, decode_stage, read_stage
+from sources import Source, parse_source
+
+
+def test_stage_queue_drop_oldest():
+    async def fill():
+        queue = StageQueue("lines", 2, "drop_oldest")
+        for line in ("one", "two", "three"):
+            await queue.put(line)
+        return queue, [await queue.get(), await queue.get()]
+
+    queue, items = asyncio.run(fill())
+    assert items == ["two", "three"]
+    assert queue.stats()["dropped"] == 1
+    assert queue.stats()["high_watermark"] == 2
+
+
+def test_parse_source():
+    assert repr(parse_source("2m=cmd:rtl_fm -f 144.8M - | multimon-ng -a AFSK1200 -")) == (
+        "Source('2m', 'cmd', 'rtl_fm -f 144.8M - | multimon-ng -a AFSK1200 -')"
+    )
+    assert parse_source("udp:0.0.0.0:7000").address == ("0.0.0.0", 7000)
+    assert parse_source("stdin").name == "stdin"
+
+
+def test_sources_feed_one_tagged_decode_stage():
+    line = "APRS: AMSAT-11>APCSS:=3901.39N\\\\07704.41WShi hi BAT 4.50 -394.2 OK"
+    sources = [
+        parse_source(f"north=cmd:echo '{line}'"),
+        parse_source(f"south=cmd:echo noise; echo '{line.replace('4.50', '4.49')}'"),
+    ]
+
+    async def collect():
+        lines = StageQueue("lines", 10)
+        frames = StageQueue("frames", 10)
+        await asyncio.gather(read_stage(lines, sources), decode_stage(lines, frames))
+        decoded = []
+        while (data := await frames.get()) is not None:
+            decoded.append(data)
+        return decoded
+
+    decoded = sorted(asyncio.run(collect()), key=lambda data: data["source"])
+    assert [(data["source"], data["battery_voltage"]) for data in decoded] == [("north", 4.5), ("south", 4.49)]
+
+
+def test_stdin_source_reads_a_regular_file(tmp_path, monkeypatch):
+    path = tmp_path / "capture.log"
+    path.write_text("APRS: one\nnot a frame\nAPRS: two\n")
+
+    async def read():
+        return [line async for line in Source("stdin", "stdin").lines()]
+
+    with open(path) as stdin:
+        monkeypatch.setattr("sys.stdin", stdin)
+        assert asyncio.run(read()) == ["APRS: one", "not a frame", "APRS: two"]
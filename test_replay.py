@@ -0,0 +1,43 @@
+import io
+
+from click.testing import CliRunner
+
+from main import capture_stdin
+from recorder import LineRecorder, read_recording
+from replay import cli, replay
+
+LINE = "APRS: AMSAT-11>APCSS:=3901.39N\\07704.41WShi hi BAT 4.50 -394.2 VOL 4.25 1.71 3.33 1.49 2.64 0.86 4.49 0.00 OK"
+
+
+def test_recording_keeps_arrival_times(tmp_path, monkeypatch):
+    path = str(tmp_path / "pass.jsonl")
+    recorder = LineRecorder(path)
+    monkeypatch.setattr("sys.stdin", io.StringIO(f"noise\n{LINE}\n{LINE}\n"))
+    times = iter([100.0, 160.5])
+    monkeypatch.setattr("recorder.time.time", lambda: next(times))
+    assert list(capture_stdin(recorder)) == [LINE, LINE]
+    recorder.close()
+
+    assert read_recording(path) == [(0.0, LINE), (60.5, LINE)]
+    assert read_recording(path, max_gap=2.0) == [(0.0, LINE), (2.0, LINE)]
+
+
+def test_replay_reaches_the_gauges():
+    recording = [(index * 0.01, LINE.replace("4.50", f"4.{index:02d}")) for index in range(20)]
+    recording.append((0.2, "APRS: not a frame"))
+    results = replay(recording, speed=0, buttons=False, settle=0.3)
+    assert results["delivered"]["frames"] == 20
+    assert results["servos"]["frames"] == 20
+    assert results["servos"]["p50_ms"] >= results["delivered"]["p50_ms"]
+
+
+def test_replay_publishes_json_whatever_the_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv("CUBESATSIM_PAYLOAD_FORMAT", "binary")
+    results = replay([(0.0, LINE)], speed=0, buttons=False, settle=0.3)
+    assert results["delivered"]["frames"] == 1
+
+    path = tmp_path / "pass.jsonl"
+    path.write_text('{"time": 0.0, "line": "x"}\n')
+    result = CliRunner().invoke(cli, [str(path), "--parser_args", "--payload_format binary"])
+    assert result.exit_code == 2
+    assert "raw_aprs" in result.output
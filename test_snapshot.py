@@ -0,0 +1,129 @@
+import json
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+from broker import Broker
+from snapshot import LastValueCache, SnapshotPublisher
+
+
+def test_cache_keeps_fields_missing_from_later_frames():
+    cache = LastValueCache()
+    assert cache.update({"callsign": "AMSAT-11", "battery_voltage": 4.5, "mpu_roll": 1.0}) == {
+        "battery_voltage": 4.5,
+        "mpu_roll": 1.0,
+    }
+    assert cache.update({"callsign": "AMSAT-11", "battery_voltage": 4.4, "mpu_roll": None}) == {"battery_voltage": 4.4}
+    assert cache.update({"callsign": "AMSAT-11", "battery_voltage": 4.4}) == {}
+    assert cache.snapshot() == {"AMSAT-11": {"callsign": "AMSAT-11", "battery_voltage": 4.4, "mpu_roll": 1.0}}
+
+
+def test_cache_drops_the_least_recently_heard_callsign():
+    cache = LastValueCache(max_callsigns=2)
+    cache.update({"callsign": "AMSAT-1", "battery_voltage": 4.5})
+    cache.update({"callsign": "AMSAT-2", "battery_voltage": 4.5})
+    cache.update({"callsign": "AMSAT-1", "battery_voltage": 4.4})
+    cache.update({"callsign": "AMSAT-3", "battery_voltage": 4.3})
+    assert list(cache.snapshot()) == ["AMSAT-1", "AMSAT-3"]
+    assert cache.take_evicted() == [("AMSAT-2", {"battery_voltage": 4.5})]
+    assert cache.take_evicted() == []
+
+
+def test_each_frame_publishes_only_its_callsign_and_changed_fields():
+    class Client:
+        def __init__(self):
+            self.published = []
+
+        def message_callback_add(self, topic, callback):
+            pass
+
+        def publish(self, topic, payload, retain=False):
+            self.published.append((topic, payload, retain))
+
+    client = Client()
+    snapshots = SnapshotPublisher(client, max_callsigns=100)
+    for index in range(200):
+        snapshots.update({"callsign": f"AMSAT-{index}", "battery_voltage": 4.5, "mpu_roll": 1.0})
+    client.published.clear()
+    snapshots.update({"callsign": "AMSAT-199", "battery_voltage": 4.4, "mpu_roll": 1.0})
+    assert [topic for topic, _, _ in client.published] == [
+        "cubesatsim/snapshot/callsigns/AMSAT-199",
+        "cubesatsim/latest/AMSAT-199/battery_voltage",
+    ]
+    assert json.loads(client.published[0][1]) == {"callsign": "AMSAT-199", "battery_voltage": 4.4, "mpu_roll": 1.0}
+    assert len(snapshots.cache.frames) == 100
+
+
+def test_timestamps_only_go_in_the_callsign_frame():
+    class Client:
+        def __init__(self):
+            self.published = []
+
+        def message_callback_add(self, topic, callback):
+            pass
+
+        def publish(self, topic, payload, retain=False):
+            self.published.append((topic, payload, retain))
+
+    client = Client()
+    snapshots = SnapshotPublisher(client, max_callsigns=1)
+    snapshots.update({"callsign": "AMSAT-1", "battery_voltage": 4.5, "timestamp": "2025-01-01T00:00:00Z"})
+    client.published.clear()
+    snapshots.update({"callsign": "AMSAT-1", "battery_voltage": 4.5, "timestamp": "2025-01-01T00:01:00Z"})
+    [(topic, payload, _)] = client.published
+    assert topic == "cubesatsim/snapshot/callsigns/AMSAT-1"
+    assert json.loads(payload)["timestamp"] == "2025-01-01T00:01:00Z"
+
+    # Evicting a callsign clears only the field topics it had
+    client.published.clear()
+    snapshots.update({"callsign": "AMSAT-2", "battery_voltage": 4.5})
+    assert [topic for topic, payload, _ in client.published if payload == b""] == [
+        "cubesatsim/snapshot/callsigns/AMSAT-1",
+        "cubesatsim/latest/AMSAT-1/battery_voltage",
+    ]
+
+
+def test_new_subscribers_get_retained_state_and_requests_are_answered():
+    broker = Broker().start()
+    publisher = mqtt.Client()
+    snapshots = SnapshotPublisher(publisher)
+    connected = threading.Event()
+    publisher.on_connect = lambda *args: (snapshots.on_connect(*args), connected.set())
+    publisher.connect("127.0.0.1", broker.port)
+    publisher.loop_start()
+    try:
+        assert connected.wait(5)
+        snapshots.update({"callsign": "AMSAT-11", "battery_voltage": 4.5, "timestamp": "2025-01-01T00:00:00Z"})
+        deadline = time.monotonic() + 5
+        while len(broker.retained) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        received = {}
+        done = threading.Event()
+
+        def on_message(client, userdata, message):
+            received[message.topic] = (json.loads(message.payload), message.retain)
+            if "reply" in received:
+                done.set()
+
+        subscriber = mqtt.Client()
+        subscriber.on_message = on_message
+        subscriber.on_connect = lambda client, *args: (
+            client.subscribe([("cubesatsim/snapshot/callsigns/+", 0), ("cubesatsim/latest/#", 0), ("reply", 0)]),
+            client.publish("cubesatsim/snapshot/get", json.dumps({"reply_to": "reply"})),
+        )
+        subscriber.connect("127.0.0.1", broker.port)
+        subscriber.loop_start()
+        assert done.wait(5)
+        subscriber.disconnect()
+        subscriber.loop_stop()
+    finally:
+        publisher.disconnect()
+        publisher.loop_stop()
+        broker.stop()
+
+    frame = {"callsign": "AMSAT-11", "battery_voltage": 4.5, "timestamp": "2025-01-01T00:00:00Z"}
+    assert received["cubesatsim/snapshot/callsigns/AMSAT-11"] == (frame, True)
+    assert received["cubesatsim/latest/AMSAT-11/battery_voltage"] == (4.5, True)
+    assert received["reply"] == ({"AMSAT-11": frame}, False)
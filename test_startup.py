@@ -0,0 +1,76 @@
+import subprocess
+import sys
+
+from benchmark import benchmark_startup
+from main import StartupBuffer
+from metrics import STARTUP_DROPPED
+
+
+class FakeClient:
+    def __init__(self):
+        self.published = []
+        self.retained = []
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.published.append((topic, payload, qos))
+        if retain:
+            self.retained.append(topic)
+        return "sent"
+
+
+class FakeTracker:
+    def __init__(self):
+        self.tracked = []
+
+    def track(self, info):
+        self.tracked.append(info)
+        return info
+
+
+def test_startup_buffer_holds_frames_until_connected():
+    client = FakeClient()
+    buffer = StartupBuffer(client)
+    assert buffer.publish("cubesatsim/data", b"1") is None
+    assert buffer.publish("cubesatsim/data", b"2", 1) is None
+    assert client.published == []
+
+    buffer.on_connect(client, None, {}, 5)  # refused
+    assert client.published == []
+    buffer.on_connect(client, None, {}, 0)
+    assert client.published == [("cubesatsim/data", b"1", 0), ("cubesatsim/data", b"2", 1)]
+    assert buffer.publish("cubesatsim/data", b"3") == "sent"
+
+
+def test_startup_buffer_tracks_flushed_frames_and_counts_drops():
+    client = FakeClient()
+    tracker = FakeTracker()
+    buffer = StartupBuffer(client, max_messages=2)
+    dropped = STARTUP_DROPPED.value()
+    buffer.publish("cubesatsim/data", b"1", tracker=tracker)
+    buffer.publish("cubesatsim/snapshot/callsigns/AMSAT-11", b"{}", retain=True)
+    buffer.publish("cubesatsim/data", b"2", tracker=tracker)
+    assert tracker.tracked == []
+    assert buffer.dropped == 1 and STARTUP_DROPPED.value() == dropped + 1
+
+    buffer.on_connect(client, None, {}, 0)
+    assert buffer.flushed.is_set()
+    assert client.published == [("cubesatsim/snapshot/callsigns/AMSAT-11", b"{}", 0), ("cubesatsim/data", b"2", 0)]
+    assert client.retained == ["cubesatsim/snapshot/callsigns/AMSAT-11"]
+    assert tracker.tracked == ["sent"]
+    buffer.publish("cubesatsim/data", b"3", tracker=tracker)
+    assert tracker.tracked == ["sent", "sent"]
+
+
+def test_importing_main_skips_optional_dependencies():
+    loaded = subprocess.run(
+        [sys.executable, "-c", "import sys, main; print(*sorted({'latloncalc', 'paho', 'http.server'} & set(sys.modules)))"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split()
+    assert loaded == []
+
+
+def test_first_frame_after_a_restart_is_published():
+    results = benchmark_startup(runs=1, seed=0, timeout=10)
+    assert results["published"] == 1
@@ -0,0 +1,106 @@
+from datetime import UTC, datetime, timedelta
+
+from store import TelemetryStore
+
+
+def frame(callsign, timestamp, battery_voltage):
+    return {
+        "callsign": callsign,
+        "timestamp": timestamp.isoformat() + "Z",
+        "latitude": "39.0275",
+        "longitude": "-77.0780",
+        "battery_voltage": battery_voltage,
+    }
+
+
+def test_range_query_across_days(tmp_path):
+    store = TelemetryStore(str(tmp_path))
+    start = datetime(2025, 6, 1, 23, 0)
+    for minute in range(120):
+        store.append(frame("AMSAT-11", start + timedelta(minutes=minute), 4.0 + minute / 100))
+    # Only the day being written keeps its files open
+    assert list(store.writers) == ["2025-06-02"]
+    store.append(frame("OTHER-1", start + timedelta(minutes=30), 3.0))
+    assert list(store.writers) == ["2025-06-01"]
+    store.close()
+
+    store = TelemetryStore(str(tmp_path))
+    frames = list(
+        store.query(
+            datetime(2025, 6, 1, 23, 50),
+            datetime(2025, 6, 2, 0, 10),
+            callsign="AMSAT-11",
+            fields=("battery_voltage", "bme_temperature"),
+        )
+    )
+    assert len(frames) == 20
+    assert frames[0]["timestamp"] == "2025-06-01T23:50:00Z"
+    assert frames[-1]["timestamp"] == "2025-06-02T00:09:00Z"
+    assert frames[0]["battery_voltage"] == 4.5
+    assert frames[0]["bme_temperature"] is None
+
+    # The out of order frame still turns up in a range query
+    others = list(store.query("2025-06-01T23:00:00Z", "2025-06-02T01:00:00Z", callsign="OTHER-1"))
+    assert [other["battery_voltage"] for other in others] == [3.0]
+
+
+def test_downsample(tmp_path):
+    store = TelemetryStore(str(tmp_path))
+    start = datetime(2025, 6, 1, 12, 0)
+    for minute in range(30):
+        store.append(frame("AMSAT-11", start + timedelta(minutes=minute), float(minute)))
+
+    buckets = list(store.downsample("battery_voltage", start, start + timedelta(hours=1), timedelta(minutes=10)))
+    assert [bucket["timestamp"] for bucket in buckets] == [
+        "2025-06-01T12:00:00Z",
+        "2025-06-01T12:10:00Z",
+        "2025-06-01T12:20:00Z",
+    ]
+    assert buckets[1] == {
+        "timestamp": "2025-06-01T12:10:00Z",
+        "min": 10.0,
+        "max": 19.0,
+        "mean": 14.5,
+        "count": 10,
+    }
+
+
+def test_new_field_column_stays_aligned(tmp_path):
+    store = TelemetryStore(str(tmp_path))
+    start = datetime(2025, 6, 1, 12, 0)
+    store.append(frame("AMSAT-11", start, 4.0))
+    store.close()
+    # A store written before BUS_voltage existed has no column for it
+    (tmp_path / "2025-06-01" / "BUS_voltage.bin").unlink()
+
+    store = TelemetryStore(str(tmp_path))
+    later = frame("AMSAT-11", start + timedelta(minutes=1), 4.1)
+    later["BUS_voltage"] = 5.0
+    store.append(later)
+
+    frames = list(store.query(start, start + timedelta(hours=1)))
+    assert [(f["battery_voltage"], f["BUS_voltage"]) for f in frames] == [(4.0, None), (4.1, 5.0)]
+
+
+def test_callsign_queries_use_the_index_and_rows_added_since(tmp_path):
+    store = TelemetryStore(str(tmp_path))
+    start = datetime(2025, 6, 1, 12, 0)
+    for minute in range(60):
+        store.append(frame(f"AMSAT-{minute % 3}", start + timedelta(minutes=minute), float(minute)))
+    store.close()
+    assert (tmp_path / "2025-06-01" / "callsign_index.bin").exists()
+
+    # Appended after the index was written, so found by scanning
+    store.append(frame("AMSAT-1", start + timedelta(minutes=60), 60.0))
+    frames = list(store.query(start + timedelta(minutes=10), start + timedelta(hours=2), callsign="AMSAT-1"))
+    assert [f["battery_voltage"] for f in frames] == [float(minute) for minute in range(10, 60) if minute % 3 == 1] + [60.0]
+
+
+def test_frames_without_a_timestamp_are_stored_as_they_arrive(tmp_path):
+    store = TelemetryStore(str(tmp_path))
+    data = frame("AMSAT-11", datetime(2025, 6, 1), 4.0)
+    del data["timestamp"]
+    store.append(data)
+    store.close()
+    assert not (tmp_path / "1970-01-01").exists()
+    assert [path.name for path in tmp_path.iterdir()] == [datetime.now(UTC).strftime("%Y-%m-%d")]
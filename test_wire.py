@@ -0,0 +1,51 @@
+from main import decode_aprs
+import pytest
+
+from wire import HEADER, MAGIC, SCHEMA_VERSION, Batcher, decode_payload, encode_payload, pack_frames, unpack_frames
+
+sample = "APRS: AMSAT-11>APCSS:=3901.39N\\07704.41WShi hi BAT 4.50 -394.2 VOL 0.54 3.33 2.38 2.71 4.49 2.81 4.50 OK"
+
+
+def test_binary_round_trip():
+    data = decode_aprs(sample)
+    payload = pack_frames([data, data])
+    assert len(payload) < len(encode_payload([data, data]))
+
+    frames = unpack_frames(payload)
+    assert len(frames) == 2
+    frame = frames[1]
+    assert frame["callsign"] == "AMSAT-11"
+    assert frame["timestamp"] == data["timestamp"]
+    assert frame["latitude"] == float(data["latitude"])
+    assert frame["battery_current"] == -394.2
+    assert frame["BAT_voltage"] == 4.5
+    assert frame["bme_temperature"] is None
+
+
+def test_bus_voltage_round_trips_and_old_schema_is_rejected():
+    data = decode_aprs(sample.replace(" 4.50 OK", " 4.50 5.02 OK"))
+    assert unpack_frames(pack_frames([data]))[0]["BUS_voltage"] == 5.02
+    assert unpack_frames(pack_frames([decode_aprs(sample)]))[0]["BUS_voltage"] is None
+
+    # Version 1 payloads had no BUS_voltage, so their bitmaps don't line up
+    payload = pack_frames([data])
+    old = HEADER.pack(MAGIC, SCHEMA_VERSION - 1, 1) + payload[HEADER.size :]
+    with pytest.raises(ValueError, match="schema version 1"):
+        unpack_frames(old)
+
+
+def test_decode_payload_accepts_json_and_batches():
+    data = decode_aprs(sample)
+    assert decode_payload(encode_payload([data]).encode()) == [data]
+    assert decode_payload(encode_payload([data, data]).encode()) == [data, data]
+    assert decode_payload(encode_payload([data], "binary"))[0]["battery_voltage"] == 4.5
+
+
+def test_batcher_flushes_full_batches():
+    batches = []
+    batcher = Batcher(batches.append, batch_size=2)
+    for i in range(5):
+        batcher.add({"n": i})
+    assert batches == [[{"n": 0}, {"n": 1}], [{"n": 2}, {"n": 3}]]
+    batcher.drain()
+    assert batches[-1] == [{"n": 4}]
@@ -0,0 +1,149 @@
+"""Compact wire formats for publishing decoded frames over MQTT.
+
+A binary payload is a header followed by one or more packed frames:
+
+    header: magic b"CS", schema version (uint8), frame count (uint16)
+    frame:  timestamp in microseconds since the epoch (int64),
+            bitmask of the FIELDS present (uint64),
+            callsign length (uint8) and UTF-8 callsign,
+            one float64 per present field, in FIELDS order
+
+Everything is little-endian. The field list is part of the schema: any
+change to it must bump SCHEMA_VERSION.
+"""
+
+from datetime import UTC, datetime
+import json
+import struct
+import threading
+from typing import Callable
+
+from main import SECTION_FIELDS
+
+MAGIC = b"CS"
+SCHEMA_VERSION = 2
+FIELDS = ("latitude", "longitude", *SECTION_FIELDS)
+
+HEADER = struct.Struct("<2sBH")
+FRAME_HEADER = struct.Struct("<qQB")
+VALUE = struct.Struct("<d")
+
+
+def is_binary(payload: bytes) -> bool:
+    return payload[:2] == MAGIC
+
+
+def encode_timestamp(timestamp: str | None) -> int:
+    if not timestamp:
+        return 0
+    moment = datetime.fromisoformat(timestamp.removesuffix("Z")).replace(tzinfo=UTC)
+    return (moment - datetime(1970, 1, 1, tzinfo=UTC)) // datetime.resolution
+
+
+def decode_timestamp(microseconds: int) -> str | None:
+    if not microseconds:
+        return None
+    moment = datetime.fromtimestamp(0, UTC) + microseconds * datetime.resolution
+    return moment.replace(tzinfo=None).isoformat() + "Z"
+
+
+def pack_frames(frames: list[dict]) -> bytes:
+    """Pack decoded frames into one binary payload. raw_aprs is not carried."""
+    parts = [HEADER.pack(MAGIC, SCHEMA_VERSION, len(frames))]
+    for data in frames:
+        present = 0
+        values = []
+        for bit, field in enumerate(FIELDS):
+            value = data.get(field)
+            if value is not None:
+                present |= 1 << bit
+                values.append(float(value))
+        callsign = data.get("callsign", "").encode("utf-8")[:255]
+        parts.append(FRAME_HEADER.pack(encode_timestamp(data.get("timestamp")), present, len(callsign)))
+        parts.append(callsign)
+        parts.append(struct.pack(f"<{len(values)}d", *values))
+    return b"".join(parts)
+
+
+def unpack_frames(payload: bytes) -> list[dict]:
+    magic, version, count = HEADER.unpack_from(payload)
+    if magic != MAGIC:
+        raise ValueError("Not a binary telemetry payload")
+    if version != SCHEMA_VERSION:
+        raise ValueError(f"Unsupported telemetry schema version {version}")
+
+    frames = []
+    offset = HEADER.size
+    for _ in range(count):
+        timestamp, present, length = FRAME_HEADER.unpack_from(payload, offset)
+        offset += FRAME_HEADER.size
+        data = {"callsign": payload[offset : offset + length].decode("utf-8", errors="replace")}
+        offset += length
+        for bit, field in enumerate(FIELDS):
+            if present & (1 << bit):
+                data[field] = VALUE.unpack_from(payload, offset)[0]
+                offset += VALUE.size
+            else:
+                data[field] = None
+        data["timestamp"] = decode_timestamp(timestamp)
+        frames.append(data)
+    return frames
+
+
+def encode_payload(frames: list[dict], payload_format: str = "json") -> bytes | str:
+    """Encode frames for publishing. A single JSON frame stays a plain object."""
+    if payload_format == "binary":
+        return pack_frames(frames)
+    if len(frames) == 1:
+        return json.dumps(frames[0])
+    return json.dumps(frames)
+
+
+def decode_payload(payload: bytes) -> list[dict]:
+    """Decode any payload published on the data topic into a list of frames."""
+    if is_binary(payload):
+        return unpack_frames(payload)
+    data = json.loads(payload.decode("utf-8"))
+    return data if isinstance(data, list) else [data]
+
+
+class Batcher:
+    """Collect frames and hand them on in batches.
+
+    A batch is flushed once it holds batch_size frames, or batch_ms
+    milliseconds after its first frame arrived, whichever comes first.
+    The timed flush runs on a timer thread, so flush must be thread safe.
+    """
+
+    def __init__(self, flush: Callable[[list[dict]], None], batch_size: int = 1, batch_ms: int = 0):
+        self.flush = flush
+        self.batch_size = max(1, batch_size)
+        self.batch_ms = batch_ms
+        self.frames = []
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def add(self, data: dict):
+        with self.lock:
+            self.frames.append(data)
+            if len(self.frames) < self.batch_size:
+                if self.batch_ms and self.timer is None:
+                    self.timer = threading.Timer(self.batch_ms / 1000, self.drain)
+                    self.timer.daemon = True
+                    self.timer.start()
+                return
+            frames = self.take()
+        self.flush(frames)
+
+    def take(self) -> list[dict]:
+        frames, self.frames = self.frames, []
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        return frames
+
+    def drain(self):
+        with self.lock:
+            frames = self.take()
+        if frames:
+            self.flush(frames)